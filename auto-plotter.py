@@ -1,54 +1,40 @@
 import os
 import sys
-import time
-import openai
+import queue
 import tkinter as tk
 from tkinter import ttk
 from datetime import datetime
-from dotenv import load_dotenv
 
-from ingest import get_natural_language_summary
+import pipeline
+from llm_client import configure_openai
+from pipeline import PipelineWorker, build_data_viz_system_description
+from executor import ScriptExecutor
+from summary_provider import SummaryProvider
+from tracing import TRACER, format_table
 
-load_dotenv()
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
+VERBOSE = False
+FIRST_MESSAGE_SENT = False
+EVENT_POLL_INTERVAL = 30  # milliseconds between checks for pipeline events
+traced_spans = 0  # spans already shown in a timing table
 
-def read_file_contents(filename):
+def get_data_viz_system_description(query):
     """
-    Read the content of a file and return it as a string.
-    :param filename: The name of the file to read.
-    :return: The content of the file.
+    Return the data viz system description with the metadata summary of the files relevant to query filled in.
+    Called on the pipeline worker thread, so waiting for the background summary does not freeze the GUI.
     """
-    with open(filename, 'r') as file:
-        content = file.read().strip()  # strip() removes any leading/trailing whitespace including newline chars
-    return content
-
-# define the file paths
-AGENTS_DIR = 'agents'
-DATA_VIZ_SYSTEM_DESCRIPTION_FILE = os.path.join(
-    AGENTS_DIR, 'data_viz_agent.txt')
-ERROR_HANDLING_SYSTEM_DESCRIPTION_FILE =  os.path.join(
-    AGENTS_DIR, 'error_handling_agent.txt')
-CODE_SAFETY_SYSTEM_DESCRIPTION_FILE =  os.path.join(
-    AGENTS_DIR, 'code_safety_agent.txt')
+    if not summary_provider.ready():
+        print('Waiting for data summary...')
+    return build_data_viz_system_description(summary_provider.relevant(query))
 
-# read the descriptions from the files
-DATA_VIZ_SYSTEM_DESCRIPTION = read_file_contents(
-    DATA_VIZ_SYSTEM_DESCRIPTION_FILE)
-DATA_VIZ_SYSTEM_DESCRIPTION = DATA_VIZ_SYSTEM_DESCRIPTION.replace(
-    '[METADATA_SUMMARY]', str(get_natural_language_summary()))
-ERROR_HANDLING_SYSTEM_DESCRIPTION = read_file_contents(
-    ERROR_HANDLING_SYSTEM_DESCRIPTION_FILE)
-CODE_SAFETY_SYSTEM_DESCRIPTION = read_file_contents(
-    CODE_SAFETY_SYSTEM_DESCRIPTION_FILE)
-
-DATA_VIZ_MODEL = 'gpt-4'
-ERROR_HANDLING_MODEL = 'gpt-3.5-turbo'
-CODE_SAFETY_MODEL = 'gpt-3.5-turbo'
-
-VERBOSE = False
-MAX_RETRIES = 3
-FIRST_MESSAGE_SENT = False
+def update_summary_status():
+    """
+    Show the state of the background data summary and the message queue in the status bar, polling for changes.
+    """
+    status = summary_provider.status()
+    if worker.pending():
+        status += f' {worker.pending()} message(s) queued.'
+    status_label['text'] = status
+    root.after(200 if not summary_provider.ready() else 1000, update_summary_status)
 
 def check_file_exists():
     """
@@ -59,94 +45,188 @@ def check_file_exists():
         execute_button['state'] = 'disabled'
     else:
         view_button['state'] = 'normal'
-        execute_button['state'] = 'normal'
+        execute_button['state'] = 'disabled' if executor.busy() else 'normal'
 
-def process_openai_response(response):
+def show_status(speaker, status):
     """
-    Process the OpenAI response and return the assistant's response as a string.
-    :param response: The response from OpenAI API.
-    :return: The content from the assistant's response.
+    Start a new line in the conversation with a speaker and a temporary status,
+    which replace_status and append_token will overwrite.
+    :param speaker: The name shown in bold.
+    :param status: The status text.
     """
-    assistant_response = response.choices[0].message["content"]
-    assistant_lines = assistant_response.split('\n')
+    global streaming
+    streaming = False
+    conversation.configure(state='normal')
+    conversation.insert(tk.END, f"{speaker}: ", "bold")
+    conversation.mark_set('status', 'end - 1 chars')
+    conversation.mark_gravity('status', tk.LEFT)
+    conversation.insert(tk.END, status)
+    conversation.configure(state='disabled')
+    conversation.see(tk.END)
 
-    # Strip any leading preamble before import statements
-    idx = 0
-    for i, line in enumerate(assistant_lines):
-        if line.startswith('import ') or line.startswith('from '):
-            idx = i
-            break
-    assistant_lines = assistant_lines[idx:]
+def replace_status(text):
+    """
+    Replace the current status (or streamed text) with the given text.
+    :param text: The text to show instead.
+    """
+    conversation.configure(state='normal')
+    if 'status' in conversation.mark_names():
+        conversation.delete('status', 'end - 1 chars')
+    conversation.insert(tk.END, text)
+    conversation.configure(state='disabled')
+    conversation.see(tk.END)
 
-    # Strip any trailing commentary after the ``` markdown closer
-    try:
-        end = assistant_lines.index('```')
-    except ValueError:
-        end = -1
-    if end != -1:
-        assistant_lines = assistant_lines[:end]
+def append_token(token):
+    """
+    Show a streamed piece of the current agent's answer, replacing the status on the first one.
+    :param token: The new text.
+    """
+    global streaming
+    if not streaming:
+        replace_status('\n')
+        streaming = True
+    conversation.configure(state='normal')
+    conversation.insert(tk.END, token)
+    conversation.configure(state='disabled')
+    conversation.see(tk.END)
 
-    # Reassemble the content
-    assistant_response = '\n'.join(assistant_lines)
+def show_timings():
+    """
+    In verbose mode, show a table of the time, tokens and cache hits of each stage since the last table.
+    """
+    global traced_spans
+    if not VERBOSE:
+        return
+    records = TRACER.spans(since=traced_spans)
+    traced_spans += len(records)
+    if not records:
+        return
+    conversation.configure(state='normal')
+    conversation.insert(tk.END, "Timings:\n", "bold")
+    conversation.insert(tk.END, format_table(records), "mono")
+    conversation.configure(state='disabled')
+    conversation.see(tk.END)
 
-    return assistant_response
+def handle_event(event):
+    """
+    Update the GUI for one event from the pipeline worker.
+    :param event: A (kind, *args) tuple, see PipelineWorker.
+    """
+    kind, *args = event
 
-def write_file(filename, content):
+    if kind == 'started':
+        message, = args
+        conversation.configure(state='normal')
+        conversation.insert(tk.END, "You: ", "bold")
+        conversation.insert(tk.END, message + "\n")
+        conversation.configure(state='disabled')
+        cancel_button['state'] = 'normal'
+
+    elif kind == 'status':
+        speaker, status = args
+        show_status(speaker, status)
+
+    elif kind == 'token':
+        append_token(args[0])
+
+    elif kind == 'data_viz_done':
+        assistant_response, = args
+        if VERBOSE:
+            replace_status("Done thinking. Preliminary code was written to output.py.\n" + "\n" + assistant_response + "\n")
+        else:
+            replace_status("Done thinking. Preliminary code was written to output.py.\n")
+
+    elif kind == 'error_handling_done':
+        error_handling_response, = args
+        if VERBOSE:
+            replace_status('Done adding error handling. Polished code was written to error-handling-output.py.' + '\n' + error_handling_response + '\n')
+        else:
+            replace_status("Done adding error handling. Polished code was written to error-handling-output.py.\n")
+
+    elif kind == 'safety_done':
+        safe, safety_response = args
+
+        # Dangerous case
+        if not safe:
+            if VERBOSE:
+                replace_status("WARNING: Code deemed dangerous. Deleting output.py and error-handling-output.py." + '\n' + safety_response + "\n")
+            else:
+                replace_status("WARNING: Code deemed dangerous. Deleting output.py and error-handling-output.py.")
+
+        # All clear case
+        else:
+            if VERBOSE:
+                replace_status("Code deemed safe." + '\n' + safety_response + "\n")
+            else:
+                replace_status("Code deemed safe.\n")
+
+    elif kind == 'cancelled':
+        replace_status("Cancelled.\n")
+
+    elif kind == 'failed':
+        _, err = args
+        replace_status("\n")
+        conversation.configure(state='normal')
+        conversation.insert(tk.END, "Halting process due to error: \n", "bold")
+        conversation.insert(tk.END, str(err) + "\n")
+        conversation.configure(state='disabled')
+
+    if kind in ('finished', 'cancelled', 'failed'):
+        conversation.mark_unset('status')
+        show_timings()
+        check_file_exists()
+        if not worker.busy():
+            cancel_button['state'] = 'disabled'
+
+def handle_execution_event(event):
     """
-    Write a given content to a file.
-    :param filename: The name of the file to write to.
-    :param content: The content to write to the file.
+    Update the GUI for one event from the script executor.
+    :param event: A (kind, *args) tuple, see ScriptExecutor.
     """
-    
-    with open(filename, 'w') as file:
-        file.write(content)
+    kind, *args = event
+
+    if kind == 'output':
+        stream, text = args
+        if not streaming:
+            append_token('')
+        conversation.configure(state='normal')
+        conversation.insert(tk.END, text, 'stderr' if stream == 'stderr' else ())
+        conversation.configure(state='disabled')
+        conversation.see(tk.END)
 
-def delete_files(*filenames):
+    elif kind == 'executed':
+        result, = args
+        if VERBOSE:
+            print(result)
+        if streaming:
+            append_token(str(result) + '\n')
+        else:
+            replace_status(str(result) + '\n')
+        conversation.mark_unset('status')
+        show_timings()
+        check_file_exists()
+        if not worker.busy():
+            cancel_button['state'] = 'disabled'
+
+def process_events():
     """
-    Delete specified files.
-    :param filenames: File names to delete.
+    Apply all pending pipeline and executor events to the GUI, then check again shortly.
+    Runs on the Tk thread; the worker threads never touch widgets themselves.
     """
-    for filename in filenames:
+    for events, handle in ((worker.events, handle_event), (executor.events, handle_execution_event)):
         try:
-            os.remove(filename)
-        except FileNotFoundError as err:
-            print(err)
-
-def get_response(model: str, system_description: str, prev_msgs: list, msg: str, retries: int):
-    """
-    Get a response from the openai API
-    :param model: model to use in API call
-    :param system_description: description to use in model configuration
-    :param prev_msgs: list of previous messages
-    :param msg: message to send as user this time
-    :param retries: number of times this function has been called recursively, 
-        used to not exceed MAX_RETRIES
-    """
-    try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {'role':'system', 'content':system_description},
-                *prev_msgs,
-                {'role':'user', 'content':msg}
-            ]
-        )
-        return response
-    except openai.error.RateLimitError:
-        if retries < MAX_RETRIES:
-            print('Encountered a RateLimitError. Retrying.')
-            return get_response(model, system_description, prev_msgs, msg, retries+1)
-        else:
-            print(f'Could not access the API at this time. Maximum retries ({MAX_RETRIES}) reached.')
-            return 'Could not access the API at this time.'
+            while True:
+                handle(events.get_nowait())
+        except queue.Empty:
+            pass
+    root.after(EVENT_POLL_INTERVAL, process_events)
 
 def send_message():
     """
-    Function to manage user messages, perform OpenAI completions, process responses, and update GUI accordingly.
+    Function to queue the user's message for the agent pipeline, which runs on a worker thread.
     """
     message = user_input.get()
-    message_copy = message
-    print(previous_messages)
+    print(worker.previous_messages)
 
     #if not previous_messages:
     #    message = """
@@ -167,132 +247,17 @@ def send_message():
     #    message += '[METADATA_SUMMARY]\n'.replace('[METADATA_SUMMARY]', str(get_natural_language_summary()))
     #message_copy = 'USER PROMPT: ' + message_copy + '\n' + message
 
-    # Update GUI
-    conversation.configure(state='normal')
-    conversation.insert(tk.END, "You: ", "bold")
-    conversation.insert(tk.END, message_copy + "\n")
-    conversation.configure(state='disabled')
     user_input.delete(0, tk.END)
-    
-    root.update_idletasks()
-
-    time.sleep(1)
-
-    # Print status
-    conversation.configure(state='normal')
-    conversation.insert(tk.END, "Data Viz Assistant: ", "bold")
-    conversation.insert(tk.END, "Thinking...")
-    conversation.configure(state='disabled')
-
-    root.update()
-
-    print('Thinking...')
-
-    # Pass message to data viz assistant and get response, writing to output.py
-    response = get_response(
-        DATA_VIZ_MODEL, DATA_VIZ_SYSTEM_DESCRIPTION, previous_messages, message, 0)
-    assistant_response = process_openai_response(response)
-    write_file('output.py', assistant_response)
-    print('Done thinking. Preliminary code written to output.py.')
-
-    # Print status
-    if VERBOSE:
-        conversation.configure(state='normal')
-        conversation.delete("end - 12 chars", "end")
-        conversation.insert(tk.END, "Done thinking. Preliminary code was written to output.py.\n")
-        conversation.insert(tk.END, "\n" + assistant_response + "\n")
-        conversation.insert(tk.END, "Error Handling Assistant: ", "bold")
-        conversation.insert(tk.END, "Now polishing code with error handling...")
-        conversation.configure(state='disabled')
-    else:
-        conversation.configure(state='normal')
-        conversation.delete("end - 12 chars", "end")
-        conversation.insert(tk.END, "Done thinking. Preliminary code was written to output.py.\n")
-        conversation.insert(tk.END, "Error Handling Assistant: ", "bold")
-        conversation.insert(tk.END, "Now polishing code with error handling...")
-        conversation.configure(state='disabled')
-
-    root.update_idletasks()
-
-    print('Now polishing code with error handling...')
-
-    # Pass data viz code to error handling code
-    response = get_response(
-        ERROR_HANDLING_MODEL, ERROR_HANDLING_SYSTEM_DESCRIPTION, [], assistant_response, 0)
-    error_handling_response = process_openai_response(response)
-    write_file('error-handling-output.py', error_handling_response)
-    print('Done adding error handling. Polished code was written to error-handling-output.py.')
-
-    # Display status
-    if VERBOSE:
-        conversation.configure(state='normal')
-        conversation.delete("end - 42 chars", "end")
-        conversation.insert(tk.END, 'Done adding error handling. Polished code was written to error-handling-output.py.')
-        conversation.insert(tk.END, '\n' + error_handling_response + '\n')
-        conversation.insert(tk.END, "Code Safety Assistant: ", "bold")
-        conversation.insert(tk.END, "Now analyzing code safety...")
-        conversation.configure(state='disabled')
-    else:
-        conversation.configure(state='normal')
-        conversation.delete("end - 42 chars", "end")
-        conversation.insert(tk.END, "Done adding error handling. Polished code was written to error-handling-output.py.\n")
-        conversation.insert(tk.END, "Code Safety Assistant: ", "bold")
-        conversation.insert(tk.END, "Now analyzing code safety...")
-        conversation.configure(state='disabled')
-
-    root.update_idletasks()
-
-    print('Now analyzing code safety...')
-
-    # Pass error-handling code to safety analyst
-    response = get_response(
-        CODE_SAFETY_MODEL, CODE_SAFETY_SYSTEM_DESCRIPTION, [], error_handling_response, 0)
-    safety_response = response.choices[0].message["content"]
-
-    # Display status
-
-    # Dangerous case
-    if not safety_response.startswith('All clear'):
-        print('WARNING: Code deemed dangerous. Removing python files from disk.')
-        delete_files('output.py', 'error-handling-output.py')
-
-        if VERBOSE:
-            conversation.configure(state='normal')
-            conversation.delete("end - 29 chars", "end")
-            conversation.insert(tk.END, "WARNING: Code deemed dangerous. Deleting output.py and error-handling-output.py.")
-            conversation.insert(tk.END, '\n' + safety_response + "\n")
-            conversation.configure(state='disabled')
-        else:
-            conversation.configure(state='normal')
-            conversation.delete("end - 29 chars", "end")
-            conversation.insert(tk.END, "WARNING: Code deemed dangerous. Deleting output.py and error-handling-output.py.")
-            conversation.configure(state='disabled')
-   
-   # All clear case
-    else:
-        print('All clear.')
-
-        if VERBOSE:
-            conversation.configure(state='normal')
-            conversation.delete("end - 29 chars", "end")
-            conversation.insert(tk.END, "Code deemed safe.")
-            conversation.insert(tk.END, '\n' + safety_response + "\n")
-            conversation.configure(state='disabled')
-        else:
-            conversation.configure(state='normal')
-            conversation.delete("end - 29 chars", "end")
-            conversation.insert(tk.END, "Code deemed safe.\n")
-            conversation.configure(state='disabled')
+    worker.submit(message)
+    if worker.busy():
+        cancel_button['state'] = 'normal'
 
-    root.update_idletasks()
-
-    # Update previous messages
-    previous_messages.extend([
-        {"role": "user", "content": message_copy},
-        {"role": "system", "content": assistant_response},
-    ])
-
-    check_file_exists()
+def cancel_message():
+    """
+    Function to cancel the message the pipeline is currently working on, and any running code.
+    """
+    worker.cancel()
+    executor.cancel()
 
 def view_output():
     """
@@ -307,33 +272,18 @@ def view_output():
 
 def execute_output():
     """
-    Function to execute the code in the 'error-handling-output.py' file.
+    Function to execute the code in the 'error-handling-output.py' file in a separate worker process,
+    streaming its output into the conversation.
     """
-    with open("error-handling-output.py", "r") as f:
-        script_code = f.read()
-    try:
-        exec(script_code, {}, {})
+    if worker.busy():
         conversation.configure(state='normal')
-        conversation.insert(tk.END, "Executed error-handling-output.py.\n")
+        conversation.insert(tk.END, "Wait for the current message to finish before executing code.\n")
         conversation.configure(state='disabled')
-        if VERBOSE:
-            print('Used exec')
-    except Exception as err:
-        print(err)
-        # Sometimes exec fails, maybe not as robust as full python interpreter
-        try:
-            os.system("python3 error-handling-output.py")
-            conversation.configure(state='normal')
-            conversation.insert(tk.END, "Executed error-handling-output.py.\n")
-            conversation.configure(state='disabled')
-            if VERBOSE:
-                print('Used os.system')
-        except Exception as err2:
-            print('Halting process due to error: ', err2)
-            conversation.configure(state='normal')
-            conversation.insert(tk.END, "Halting process due to error: \n", "bold")
-            conversation.insert(tk.END, str(err2) + "\n")
-            conversation.configure(state='disabled')
+        return
+    execute_button['state'] = 'disabled'
+    cancel_button['state'] = 'normal'
+    show_status('Executor', 'Running error-handling-output.py...')
+    executor.execute('error-handling-output.py')
 
 def save_chat_history():
     """
@@ -358,6 +308,7 @@ def exit_program():
     Function to save chat history and close the application.
     """
     save_chat_history()
+    executor.shutdown()
     root.quit()
     root.destroy()
 
@@ -375,11 +326,19 @@ if __name__ == '__main__':
 
     print('Booting up...')
 
+    configure_openai()
+
+    # Profile the data folder in the background while the user answers the prompts below.
+    # This runs under the __main__ guard so that spawned ingest worker processes
+    # can re-import this module without starting it again.
+    # It then keeps watching the folder, so files added during the session reach the next prompt.
+    summary_provider = SummaryProvider().start().watch()
+
     gpt_4_access = input('Do you have access to the GPT4 OpenAI API? ([y]/n) ')
     if gpt_4_access.lower() in ['', 'y', 'yes']:
-        DATA_VIZ_MODEL = 'gpt-4'
+        pipeline.DATA_VIZ_MODEL = 'gpt-4'
     else:
-        DATA_VIZ_MODEL = 'gpt-3.5-turbo'
+        pipeline.DATA_VIZ_MODEL = 'gpt-3.5-turbo'
 
     verbose = input('Do you want to run in verbose mode? (y/[n]) ')
     if verbose.lower() in ['y', 'yes']:
@@ -398,7 +357,9 @@ if __name__ == '__main__':
 
     conversation = tk.Text(frame, wrap=tk.WORD, width=75, height=20, font=("TkDefaultFont", 12))
     conversation.tag_configure("bold", font=("TkDefaultFont", 12, "bold"))
-    conversation.grid(row=0, column=0, columnspan=4, sticky=(tk.W, tk.E, tk.N, tk.S))
+    conversation.tag_configure("stderr", foreground="firebrick")
+    conversation.tag_configure("mono", font=("TkFixedFont", 10))
+    conversation.grid(row=0, column=0, columnspan=5, sticky=(tk.W, tk.E, tk.N, tk.S))
     conversation.configure(state='disabled')
 
     user_input = ttk.Entry(frame, width=70, font=("TkDefaultFont", 12))
@@ -414,9 +375,20 @@ if __name__ == '__main__':
     execute_button = ttk.Button(frame, text="Execute Code", command=execute_output, state='disabled')
     execute_button.grid(row=1, column=3, sticky=(tk.W, tk.E, tk.N, tk.S))
 
+    cancel_button = ttk.Button(frame, text="Cancel", command=cancel_message, state='disabled')
+    cancel_button.grid(row=1, column=4, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+    status_label = ttk.Label(frame, text=summary_provider.status(), foreground='grey')
+    status_label.grid(row=2, column=0, columnspan=5, sticky=(tk.W, tk.E))
+
+    streaming = False
+    worker = PipelineWorker(get_data_viz_system_description)
+    executor = ScriptExecutor()
+
     check_file_exists()
 
-    previous_messages = []
+    update_summary_status()
+    process_events()
 
     root.protocol("WM_DELETE_WINDOW", exit_program)
 
@@ -0,0 +1,290 @@
+"""
+Headless batch mode: run every prompt in a file through the agent pipeline and execute the results.
+
+The data folder is profiled once and shared by every prompt. Pipelines run concurrently, at most
+BATCH_CONCURRENCY at a time (API calls still go through the shared rate limiter), and each script
+that passes the safety check runs in one of BATCH_EXECUTION_WORKERS parallel worker processes.
+Every prompt gets its own folder with the generated code, the files its script wrote and
+its output, and manifest.json records the outcome of each prompt and the time spent in each stage.
+The spans of the run are also written to trace.jsonl in the output folder.
+
+Usage:
+    python batch.py prompts.txt --output reports/nightly
+"""
+
+import os
+import sys
+import json
+import queue
+import shutil
+import logging
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import pipeline
+from llm_client import configure_openai
+from pipeline import PipelineCancelled, build_data_viz_system_description, run_pipeline
+from executor import ScriptExecutor
+from summary_provider import SummaryProvider
+from ingest import DATA_FOLDER
+from metadata_cache import CACHE_DIR
+from tracing import TRACER, span, summarize
+
+BATCH_OUTPUT_FOLDER = Path('batch_output')
+BATCH_CONCURRENCY = 4  # pipelines running at the same time
+BATCH_EXECUTION_WORKERS = min(4, os.cpu_count() or 1)  # scripts running at the same time
+BATCH_MPL_BACKEND = 'Agg'  # batch runs have no display, so plt.show() must not try to open windows
+MANIFEST_FILE = 'manifest.json'
+TRACE_FILE = 'trace.jsonl'
+EXECUTION_LOG_FILE = 'execution.log'
+SCRIPT_FILES = ('output.py', 'error-handling-output.py', EXECUTION_LOG_FILE)
+# Folders the summary refers to with relative paths, linked into each prompt's folder so its script finds them
+SHARED_FOLDERS = (DATA_FOLDER, CACHE_DIR)
+
+def read_prompts(path):
+    """
+    Read a prompts file: one prompt per line, skipping blank lines and lines starting with #.
+    :return: list of prompts
+    """
+    with open(path, 'r') as file:
+        lines = [line.strip() for line in file]
+    return [line for line in lines if line and not line.startswith('#')]
+
+def slugify(text, max_length=40):
+    """Short file-system-safe name for a prompt"""
+    slug = ''.join(c if c.isalnum() else '-' for c in text.lower())
+    slug = '-'.join(part for part in slug.split('-') if part)
+    return slug[:max_length].rstrip('-') or 'prompt'
+
+def new_job(index, prompt, output_dir):
+    """The manifest entry of a prompt, which the pipeline and the executor fill in"""
+    return {
+        'index': index,
+        'prompt': prompt,
+        'folder': str(Path(output_dir) / f'{index:03d}-{slugify(prompt)}'),
+        'status': 'pending',  # then 'generated', 'dangerous', 'failed', 'ok', 'execution failed' or 'cancelled'
+        'safe': None,
+        'safety': None,
+        'error': None,
+        'trace': None,
+        'pipeline_seconds': None,
+        'execution': None,
+        'outputs': [],
+    }
+
+def generate(job, summary_provider, cancel):
+    """
+    Run a job's prompt through the agent pipeline, writing the code to the job's folder.
+    Exceptions are recorded in the job rather than raised.
+    """
+    if cancel.is_set():
+        job['status'] = 'cancelled'
+        return job
+
+    def emit(kind, *args):
+        if kind == 'safety_done':
+            job['safe'], job['safety'] = args
+
+    start = datetime.now()
+    os.makedirs(job['folder'], exist_ok=True)
+    try:
+        with span('pipeline', index=job['index']) as root:
+            job['trace'] = root.trace
+            with span('prompt.build'):
+                system_description = build_data_viz_system_description(summary_provider.relevant(job['prompt']))
+            run_pipeline(job['prompt'], [], system_description, emit, cancel, job['folder'])
+    except PipelineCancelled:
+        job['status'] = 'cancelled'
+    except Exception as err:
+        job['status'] = 'failed'
+        job['error'] = str(err)
+    else:
+        job['status'] = 'generated' if job['safe'] else 'dangerous'
+    job['pipeline_seconds'] = round((datetime.now() - start).total_seconds(), 3)
+    print(f"[{job['index']:03d}] {job['status']}: {job['prompt']}")
+    return job
+
+def link_shared_folders(folder):
+    """
+    Link the data and cache folders into a job's folder, so scripts can run there and still
+    open 'data/...' like the summary tells them to.
+    :return: the links created; if one cannot be created, those made before it are removed
+    """
+    links = []
+    try:
+        for shared in SHARED_FOLDERS:
+            if shared.is_absolute() or not shared.exists():
+                continue
+            link = Path(folder) / shared
+            link.parent.mkdir(parents=True, exist_ok=True)
+            os.symlink(shared.resolve(), link, target_is_directory=True)
+            links.append(link)
+    except OSError:
+        unlink_all(links)
+        raise
+    return links
+
+def unlink_all(links):
+    """Remove links, ignoring those already gone"""
+    for link in links:
+        try:
+            link.unlink()
+        except FileNotFoundError:
+            pass
+
+def list_outputs(folder, skip):
+    """Files a script wrote to its folder, relative to it"""
+    outputs = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [name for name in dirs if not os.path.islink(os.path.join(root, name))]
+        for name in files:
+            path = os.path.relpath(os.path.join(root, name), folder)
+            if path not in skip:
+                outputs.append(Path(path).as_posix())
+    return sorted(outputs)
+
+def execute(job, executors, cancel):
+    """
+    Run a job's checked script with an executor from the pool, in the job's folder.
+    Its output goes to execution.log next to it.
+    """
+    if cancel.is_set():
+        job['status'] = 'cancelled'
+        return job
+
+    folder = job['folder']
+    executor = executors.get()
+    log_lock = threading.Lock()
+    links = []
+    try:
+        with open(os.path.join(folder, EXECUTION_LOG_FILE), 'w') as log:
+            def on_output(stream, text):
+                with log_lock:
+                    log.write(text if stream == 'stdout' else f'[stderr] {text}')
+
+            links = link_shared_folders(folder)
+            result = executor.run(os.path.join(folder, 'error-handling-output.py'), on_output, cwd=folder)
+    except OSError as err:
+        job['status'] = 'execution failed'
+        job['error'] = f'Could not run the script: {err}'
+        return job
+    finally:
+        executors.put(executor)
+        unlink_all(links)
+
+    job['execution'] = {'status': result.status, 'returncode': result.returncode, 'seconds': round(result.duration, 3)}
+    job['status'] = 'ok' if result.ok else 'cancelled' if result.status == 'cancelled' else 'execution failed'
+    job['outputs'] = list_outputs(folder, SCRIPT_FILES)
+    print(f"[{job['index']:03d}] {result}")
+    return job
+
+def run_batch(prompts, output_dir, concurrency=BATCH_CONCURRENCY, execution_workers=BATCH_EXECUTION_WORKERS,
+              run_scripts=True, cancel=None):
+    """
+    Generate, check and (optionally) execute code for every prompt.
+    Scripts start running as soon as their pipeline finishes, while other pipelines are still going.
+    :param prompts: list of prompts, each handled on its own, without a conversation history
+    :param output_dir: folder for the per-prompt folders and the manifest
+    :param concurrency: pipelines running at the same time
+    :param execution_workers: scripts running at the same time
+    :param run_scripts: whether to execute the scripts that pass the safety check
+    :param cancel: optional threading.Event; set it to stop, e.g. on Ctrl-C
+    :return: the manifest, as written to output_dir/manifest.json
+    """
+    cancel = cancel or threading.Event()
+    started = datetime.now()
+    os.makedirs(output_dir, exist_ok=True)
+    TRACER.path = Path(output_dir) / TRACE_FILE
+    traced = TRACER.finished
+    jobs = [new_job(index, prompt, output_dir) for index, prompt in enumerate(prompts, 1)]
+
+    summary_provider = SummaryProvider().start()
+    executors = queue.Queue()
+    pool = [ScriptExecutor(mpl_backend=BATCH_MPL_BACKEND) for _ in range(execution_workers if run_scripts else 0)]
+    for executor in pool:
+        executors.put(executor)
+
+    try:
+        with ThreadPoolExecutor(concurrency, thread_name_prefix='batch-pipeline') as pipelines, \
+                ThreadPoolExecutor(max(1, execution_workers), thread_name_prefix='batch-executor') as runners:
+            generating = [pipelines.submit(generate, job, summary_provider, cancel) for job in jobs]
+            executing = []
+            try:
+                for future in as_completed(generating):
+                    job = future.result()
+                    if run_scripts and job['status'] == 'generated':
+                        executing.append(runners.submit(execute, job, executors, cancel))
+                wait(executing)
+            except KeyboardInterrupt:
+                print('Cancelling...')
+                cancel.set()
+                for executor in pool:
+                    executor.cancel()
+                pipelines.shutdown(cancel_futures=True)
+                runners.shutdown(cancel_futures=True)
+    finally:
+        for executor in pool:
+            executor.shutdown()
+
+    for job in jobs:
+        if job['status'] == 'pending' or (cancel.is_set() and job['status'] == 'generated' and run_scripts):
+            job['status'] = 'cancelled'
+
+    manifest = {
+        'started': started.isoformat(timespec='seconds'),
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'data_viz_model': pipeline.DATA_VIZ_MODEL,
+        'executed': run_scripts,
+        'counts': {status: sum(job['status'] == status for job in jobs) for status in sorted({job['status'] for job in jobs})},
+        'stages': summarize(TRACER.spans(since=traced)),
+        'results': jobs,
+    }
+    write_manifest(manifest, output_dir)
+    return manifest
+
+def write_manifest(manifest, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('prompts', help='file with one prompt per line')
+    parser.add_argument('--output', help=f'output folder, by default a new timestamped folder in {BATCH_OUTPUT_FOLDER}')
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help='pipelines running at the same time')
+    parser.add_argument('--jobs', type=int, default=BATCH_EXECUTION_WORKERS, help='scripts running at the same time')
+    parser.add_argument('--model', default=pipeline.DATA_VIZ_MODEL, help='model of the data viz agent')
+    parser.add_argument('--no-execute', action='store_true', help='only generate and check the code')
+    parser.add_argument('--overwrite', action='store_true', help='clear the output folder first if it exists')
+    args = parser.parse_args()
+
+    logging.basicConfig(filename='summary.log', level=logging.INFO)
+    configure_openai()
+    pipeline.DATA_VIZ_MODEL = args.model
+
+    prompts = read_prompts(args.prompts)
+    if not prompts:
+        sys.exit(f'No prompts in {args.prompts}.')
+    output_dir = Path(args.output) if args.output else BATCH_OUTPUT_FOLDER / datetime.now().strftime('%Y%m%d_%H%M%S')
+    if output_dir.exists() and any(output_dir.iterdir()):
+        if not args.overwrite:
+            sys.exit(f'{output_dir} is not empty; pass --overwrite to replace it.')
+        shutil.rmtree(output_dir)
+
+    print(f'Running {len(prompts)} prompt(s) into {output_dir}...')
+    manifest = run_batch(prompts, output_dir, args.concurrency, args.jobs, not args.no_execute)
+    print(', '.join(f'{count} {status}' for status, count in manifest['counts'].items()))
+    print('Manifest written to', output_dir / MANIFEST_FILE)
+
+    expected = 'generated' if args.no_execute else 'ok'
+    sys.exit(0 if all(job['status'] == expected for job in manifest['results']) else 1)
+
+if __name__ == '__main__':
+    main()
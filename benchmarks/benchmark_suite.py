@@ -0,0 +1,326 @@
+"""
+Reproducible benchmarks of ingest and the agent pipeline, compared against saved baselines.
+
+A synthetic data folder is generated from a fixed seed: CSV, TSV, JSON lines and XLSX files with
+varying row, column and sheet counts, with the header row of the CSV, TSV and XLSX files pushed down
+by a few title and blank rows, padded to the table's width in some files and single-field lines in others.
+The benchmark then times summarize_csvs and summarize_excels (without and with the metadata
+cache), get_summary, get_natural_language_summary and the compact summary on it, and checks
+that every detected header row is the right one. Finally it sends messages through the PipelineWorker, as
+send_message does, against a local fake OpenAI server with the given latency.
+
+Results are written as JSON. With --save-baseline (or --update-baseline) they become the baseline;
+otherwise they are compared with it, and the run exits with status 1 if a benchmark got slower than
+the baseline by more than --tolerance, or if a header row was detected wrongly, and with status 2
+if there is no baseline for its settings. benchmarks/baselines.json holds a baseline of the default
+settings, but timings are only comparable on the same machine, so save one before making a change.
+
+Usage:
+    python benchmarks/benchmark_suite.py --save-baseline
+    python benchmarks/benchmark_suite.py
+    python benchmarks/benchmark_suite.py --corpus small --first-token-latency 0.5 --token-delay 0.01
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(REPO_DIR / 'benchmarks'))
+
+import numpy as np
+import pandas as pd
+
+os.chdir(REPO_DIR)  # the agent descriptions are read relative to the repo when pipeline is imported
+import ingest
+import pipeline
+import tracing
+from ingest import summarize_csvs, summarize_excels, get_summary, get_natural_language_summary, build_summary
+from metadata_cache import MetadataCache
+from pipeline import PipelineWorker, build_data_viz_system_description
+from fake_openai import FakeOpenAIServer
+
+BASELINE_FILE = Path(__file__).resolve().parent / 'baselines.json'
+TOLERANCE = 0.25  # a benchmark regresses when it is this much slower than its baseline
+MIN_REGRESSION_SECONDS = 0.005  # slowdowns smaller than this are noise, whatever their ratio
+SEED = 1234
+
+# (rows, columns, header offset) of each CSV and TSV file, (rows, columns) of each JSON lines file,
+# and (rows, columns, sheets, header offset) of each workbook
+CORPORA = {
+    'small': {
+        'csv': [(1000, 5, 0), (1000, 20, 2), (5000, 10, 4)],
+        'tsv': [(2000, 6, 2)],
+        'jsonl': [(2000, 6)],
+        'xlsx': [(500, 5, 1, 0), (500, 10, 3, 2)],
+    },
+    'full': {
+        'csv': [(1000, 5, 0), (10000, 20, 2), (100000, 10, 4), (20000, 100, 1), (200000, 8, 0), (5000, 300, 3)],
+        'tsv': [(50000, 12, 3)],
+        'jsonl': [(100000, 8)],
+        'xlsx': [(1000, 5, 1, 0), (5000, 10, 3, 2), (20000, 8, 1, 4), (2000, 40, 6, 1)],
+    },
+}
+
+# Hand-written CSV files whose title lines have fewer fields than the table, or whose header names
+# pandas would otherwise read as missing ('NA', 'null', ...), with their header row
+# (blank and whitespace-only lines do not count, as with pandas' header=)
+RAGGED_CSVS = {
+    'ragged_title.csv': ('Sales report 2023\n\nregion,units,price\nnorth,12,3.5\nsouth,7,4.25\neast,3,1.0\n', 1),
+    'ragged_two_titles.csv': ('Exported by logger\nSite: north\ntime,depth,temperature\n0,1.5,12.1\n1,1.6,12.3\n2,1.7,12.2\n', 2),
+    'ragged_quoted_title.csv': ('"Report, final"\nid,name,score\n1,ann,3\n2,bob,4\n3,cid,5\n', 1),
+    'ragged_whitespace_lines.csv': ('Survey\n   \n\t\nsite,count,share\na,1,0.5\nb,2,0.25\nc,3,0.25\n', 1),
+    'na_names.csv': ('Assay,,\nNA,null,N/A\n1.5,2,3\n1.7,2,4\n1.9,3,5\n', 1),
+    'na_names_titled.csv': ('Exported,,,\nsample,None,#N/A,NA\nx,1,2.5,3\ny,2,3.5,4\nz,3,4.5,5\n', 1),
+}
+
+MESSAGES = [
+    'Plot value_0 against value_1 for the first file.',
+    'Make a histogram of value_2 in each file with more than 10 columns.',
+    'Now use a log scale on the y axis.',
+]
+
+def make_frame(rows, columns, rng):
+    """A DataFrame with numeric, categorical and date columns"""
+    data = {}
+    for j in range(columns):
+        kind = j % 4
+        if kind == 0:
+            data[f'value_{j}'] = rng.standard_normal(rows).round(4)
+        elif kind == 1:
+            data[f'count_{j}'] = rng.integers(0, 1000, rows)
+        elif kind == 2:
+            data[f'category_{j}'] = rng.choice(['alpha', 'beta', 'gamma', 'delta'], rows)
+        else:
+            data[f'date_{j}'] = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    return pd.DataFrame(data)
+
+def preamble(offset, columns, padded=True):
+    """
+    Rows above the header: a title and blank rows padded to the table's width like an instrument
+    export, or, unpadded, title lines of a single field, which a strict CSV parser rejects
+    """
+    if not padded:
+        return [[f'Exported by the synthetic benchmark, part {i + 1}'] for i in range(offset)]
+    rows = [['Exported by the synthetic benchmark'] + [''] * (columns - 1)]
+    rows += [[''] * columns for _ in range(offset - 1)]
+    return rows[:offset]
+
+def make_corpus(folder, corpus, seed=SEED):
+    """
+    Write a synthetic data folder.
+    :return: {(file name, sheet name or None): expected header row}
+    """
+    rng = np.random.default_rng(seed)
+    random.seed(seed)
+    expected = {}
+    for extension, delimiter in (('csv', ','), ('tsv', '\t')):
+        for i, (rows, columns, offset) in enumerate(corpus.get(extension, [])):
+            name = f'table_{i}_{rows}x{columns}.{extension}'
+            with open(folder / name, 'w', newline='') as file:
+                for row in preamble(offset, columns, padded=i % 2 == 0):
+                    file.write(delimiter.join(row) + '\n')
+                make_frame(rows, columns, rng).to_csv(file, index=False, sep=delimiter)
+            expected[(name, None)] = offset
+
+    for name, (text, header_row) in RAGGED_CSVS.items():
+        (folder / name).write_text(text)
+        expected[(name, None)] = header_row
+
+    for i, (rows, columns) in enumerate(corpus.get('jsonl', [])):
+        make_frame(rows, columns, rng).to_json(folder / f'records_{i}_{rows}x{columns}.jsonl', orient='records', lines=True,
+                                                       date_format='iso')
+
+    for i, (rows, columns, sheets, offset) in enumerate(corpus['xlsx']):
+        name = f'workbook_{i}_{rows}x{columns}x{sheets}.xlsx'
+        with pd.ExcelWriter(folder / name) as writer:
+            for s in range(sheets):
+                sheet_name = f'Sheet{s + 1}'
+                make_frame(rows, columns, rng).to_excel(writer, sheet_name=sheet_name, index=False, startrow=offset)
+                if offset:
+                    writer.sheets[sheet_name].cell(row=1, column=1, value='Exported by the synthetic benchmark')
+                expected[(name, sheet_name)] = offset
+    return expected
+
+def timed(func, repeat):
+    """Run func repeat times; returns (last result, {'median', 'min'} seconds)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, {'median': statistics.median(timings), 'min': min(timings)}
+
+def header_errors(summaries, expected):
+    """Files and sheets whose detected header row is not the one they were written with"""
+    csv_summary, xlsx_summary = summaries
+    errors = []
+    for (name, sheet_name), offset in expected.items():
+        file = ingest.DATA_FOLDER / name
+        summary = csv_summary.get(file) if sheet_name is None else xlsx_summary.get(file, {}).get(sheet_name)
+        detected = summary.get('header row') if summary else None
+        if detected != offset:
+            errors.append(f'{name}{"" if sheet_name is None else f" [{sheet_name}]"}: expected {offset}, detected {detected}')
+    return errors
+
+def benchmark_ingest(corpus, repeat, workers):
+    """Times ingest on a synthetic data folder, run from a temporary directory"""
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            ingest.DATA_FOLDER.mkdir()
+            expected = make_corpus(ingest.DATA_FOLDER, corpus)
+            args = (ingest.DATA_FOLDER, ingest.MAX_ROWS_SCAN, ingest.MAX_COLS_SUMMARY)
+            stats_rows = ingest.stats_rows()
+
+            csv_summary, results['summarize_csvs'] = timed(
+                lambda: summarize_csvs(*args, None, workers, stats_rows=stats_rows), repeat)
+            xlsx_summary, results['summarize_excels'] = timed(lambda: summarize_excels(*args, None, workers), repeat)
+
+            cache = MetadataCache(path=Path(folder) / 'metadata.json')
+            summarize_csvs(*args, cache, workers, stats_rows=stats_rows)
+            summarize_excels(*args, cache, workers)
+            _, results['summarize_csvs (cached)'] = timed(
+                lambda: summarize_csvs(*args, cache, workers, stats_rows=stats_rows), repeat)
+            _, results['summarize_excels (cached)'] = timed(lambda: summarize_excels(*args, cache, workers), repeat)
+
+            summaries = (csv_summary, xlsx_summary)
+            _, results['get_summary'] = timed(lambda: get_summary(summaries), repeat)
+            natural_language, results['get_natural_language_summary'] = timed(
+                lambda: get_natural_language_summary(summaries), repeat)
+            model, results['build_summary'] = timed(lambda: build_summary(summaries), repeat)
+            _, results['compact summary'] = timed(model.to_compact, repeat)
+            errors = header_errors(summaries, expected)
+        finally:
+            os.chdir(REPO_DIR)
+    return results, errors, natural_language
+
+def benchmark_pipeline(metadata_summary, first_token_latency, token_delay):
+    """Sends MESSAGES through a PipelineWorker against the fake server, one after the other"""
+    import openai
+
+    results = {}
+    pipeline.USE_RESPONSE_CACHE = False  # every message must reach the (fake) API
+    system_description = build_data_viz_system_description(metadata_summary)
+    with FakeOpenAIServer(first_token_latency=first_token_latency, token_delay=token_delay) as server, \
+            tempfile.TemporaryDirectory() as folder:
+        openai.api_key, openai.api_base = 'benchmark', server.api_base
+        os.chdir(folder)  # output.py and error-handling-output.py are written to the current directory
+        try:
+            worker = PipelineWorker(lambda query: system_description)
+            totals, first_tokens = [], []
+            for message in MESSAGES:
+                start = time.perf_counter()
+                first_token = None
+                worker.submit(message)
+                while True:
+                    kind, *args = worker.events.get(timeout=120)
+                    if kind == 'token' and first_token is None:
+                        first_token = time.perf_counter() - start
+                    if kind == 'failed':
+                        raise RuntimeError(f'Pipeline failed: {args[1]}')
+                    if kind in ('finished', 'cancelled'):
+                        break
+                totals.append(time.perf_counter() - start)
+                first_tokens.append(first_token)
+        finally:
+            os.chdir(REPO_DIR)
+        results['pipeline message'] = {'median': statistics.median(totals), 'min': min(totals)}
+        results['pipeline first token'] = {'median': statistics.median(first_tokens), 'min': min(first_tokens)}
+        api_requests = server.requests
+    return results, api_requests
+
+def compare(results, baseline, tolerance):
+    """
+    Print each benchmark next to its baseline.
+    :return: names of the benchmarks that regressed
+    """
+    regressions = []
+    print(f'{"benchmark":<32} {"baseline s":>11} {"current s":>10} {"change":>8}')
+    for name, timing in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f'{name:<32} {"-":>11} {timing["median"]:>10.4f} {"new":>8}')
+            continue
+        change = timing['median'] / base['median'] - 1 if base['median'] else 0.0
+        regressed = change > tolerance and timing['median'] - base['median'] > MIN_REGRESSION_SECONDS
+        if regressed:
+            regressions.append(name)
+        flag = '  REGRESSION' if regressed else ''
+        print(f'{name:<32} {base["median"]:>11.4f} {timing["median"]:>10.4f} {change:>+8.0%}{flag}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', choices=sorted(CORPORA), default='full')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each ingest benchmark; the median counts')
+    parser.add_argument('--workers', type=int, default=1, help='ingest worker processes (1 is the most reproducible)')
+    parser.add_argument('--first-token-latency', type=float, default=0.2, help='seconds before the fake API answers')
+    parser.add_argument('--token-delay', type=float, default=0.002, help='seconds between streamed tokens')
+    parser.add_argument('--skip-pipeline', action='store_true')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', '--update-baseline', action='store_true',
+                        help='record these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--output', type=Path, help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    tracing.TRACER.path = None  # keep benchmark runs out of the trace file
+
+    timings, errors, natural_language = benchmark_ingest(CORPORA[args.corpus], args.repeat, args.workers)
+    api_requests = None
+    if not args.skip_pipeline:
+        pipeline_timings, api_requests = benchmark_pipeline(natural_language, args.first_token_latency, args.token_delay)
+        timings.update(pipeline_timings)
+
+    # Each benchmark is keyed by its settings, so baselines of different settings are not compared
+    settings = f'{args.corpus}, {args.workers} worker(s), latency {args.first_token_latency}/{args.token_delay}'
+    results = {
+        'settings': settings,
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'timings': timings,
+        'header_errors': errors,
+        'api_requests': api_requests,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        baselines[settings] = results
+        args.baseline.write_text(json.dumps(baselines, indent=2))
+        print(f'Baseline for "{settings}" saved to {args.baseline}.')
+        regressions = []
+        compare(timings, {}, args.tolerance)
+    elif settings in baselines:
+        regressions = compare(timings, baselines[settings]['timings'], args.tolerance)
+    else:
+        regressions = None
+        compare(timings, {}, args.tolerance)
+
+    for error in errors:
+        print(f'Wrong header row: {error}')
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}: {", ".join(regressions)}')
+    if regressions is None:
+        print(f'No baseline for "{settings}" in {args.baseline}, so regressions could not be checked; '
+              f'run with --save-baseline to record one.', file=sys.stderr)
+        sys.exit(1 if errors else 2)
+    sys.exit(1 if regressions or errors else 0)
+
+if __name__ == '__main__':
+    main()
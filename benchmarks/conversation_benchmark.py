@@ -0,0 +1,48 @@
+"""
+Request size per turn over a long simulated session, with and without the conversation budget.
+
+Each turn sends a follow-up prompt and gets back a full script, as the data viz agent does.
+Without budgeting, every request carries the whole history; with the ConversationManager
+it carries at most HISTORY_TOKEN_BUDGET tokens of it.
+
+Usage:
+    python benchmarks/conversation_benchmark.py --turns 40
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from conversation import ConversationManager, count_message_tokens, count_tokens, HISTORY_TOKEN_BUDGET
+
+SYSTEM_DESCRIPTION = 'You are a helpful data visualization assistant. ' * 40
+
+def generated_script(turn):
+    """A script of realistic size that changes a little every turn"""
+    lines = ['import pandas as pd', 'import matplotlib.pyplot as plt', '', "df = pd.read_csv('data/data.csv')"]
+    for i in range(25):
+        lines.append(f"plt.plot(df['x{i}'], df['y{i}'], label='series {i} (revision {turn})')")
+    lines += ["plt.legend()", f"plt.savefig('plot_{turn}.png', dpi=300)"]
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=40)
+    parser.add_argument('--budget', type=int, default=HISTORY_TOKEN_BUDGET)
+    parser.add_argument('--model', default='gpt-4')
+    args = parser.parse_args()
+
+    conversation = ConversationManager(budget=args.budget)
+    fixed = count_tokens(SYSTEM_DESCRIPTION, args.model)
+    print(f'{"turn":>4} {"unbounded":>10} {"budgeted":>10}')
+    for turn in range(1, args.turns + 1):
+        message = f'Now make the lines in plot {turn} thicker and use a log scale for the y axis.'
+        unbounded = fixed + count_message_tokens(conversation.history, args.model)
+        budgeted = fixed + count_message_tokens(conversation.messages(args.model, SYSTEM_DESCRIPTION, message), args.model)
+        print(f'{turn:>4} {unbounded:>10} {budgeted:>10}')
+        conversation.add_turn(message, generated_script(turn))
+
+if __name__ == '__main__':
+    main()
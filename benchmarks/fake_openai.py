@@ -0,0 +1,199 @@
+"""
+A local stand-in for the OpenAI chat completions endpoint.
+
+It answers every request with a canned data viz script (or "All clear" for
+the code safety agent), optionally streamed token by token with configurable
+latency, so the agent pipeline can be exercised without network access or API spend.
+It can also answer some requests with 429 rate limit errors, to exercise retries.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8765 --first-token-latency 0.5 --token-delay 0.02
+    python benchmarks/fake_openai.py --rate-limit-first 2 --rate-limit-every 5 --retry-after 1
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1 python auto-plotter.py
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CODE_REPLY = '''Here is the code you asked for:
+```python
+import pandas as pd
+import plotly.express as px
+
+df = pd.read_csv('data/data.csv', header=0)
+fig = px.scatter(df, x=df.columns[0], y=df.columns[1], title='Scatter plot')
+fig.write_html('scatter_plot.html')
+```
+This script reads the data and saves an interactive scatter plot.'''
+
+SAFETY_REPLY = 'All clear'
+
+def split_tokens(text):
+    """Splits text into word-sized pieces, roughly like a tokenizer would"""
+    return re.findall(r'\s*\S+|\s+', text)
+
+def pick_reply(messages):
+    """Returns the canned reply for a list of chat messages"""
+
+    system = messages[0]['content'] if messages and messages[0]['role'] == 'system' else ''
+    if 'code safety' in system.lower():
+        return SAFETY_REPLY
+    if 'error handling' in system.lower():
+        # Echo the code back the way the error handling agent would
+        return messages[-1]['content']
+    return CODE_REPLY
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if self.server.should_rate_limit():
+            self.send_rate_limit()
+            return
+
+        reply = pick_reply(request.get('messages', []))
+        model = request.get('model', 'fake-model')
+
+        time.sleep(self.server.first_token_latency)
+
+        if request.get('stream'):
+            self.send_stream(model, reply)
+        else:
+            self.send_completion(model, reply)
+
+    def send_rate_limit(self):
+        body = json.dumps({
+            'error': {'message': 'Rate limit reached (fake server).', 'type': 'requests', 'param': None, 'code': None},
+        }).encode()
+        self.send_response(429)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.retry_after is not None:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_completion(self, model, reply):
+        body = json.dumps({
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': len(split_tokens(reply)), 'total_tokens': len(split_tokens(reply))},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, model, reply):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        deltas = [{'role': 'assistant'}] + [{'content': token} for token in split_tokens(reply)]
+        try:
+            for i, delta in enumerate(deltas):
+                chunk = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}],
+                }
+                self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                self.wfile.flush()
+                if i:
+                    time.sleep(self.server.token_delay)
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading, e.g. once the code block closed
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Fake chat completions server; use as a context manager to run it in a background thread"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, first_token_latency=0.0, token_delay=0.0,
+                 rate_limit_first=0, rate_limit_every=0, retry_after=None):
+        """
+        :param rate_limit_first: answer this many requests with 429 before serving any
+        :param rate_limit_every: after that, answer every n-th request with 429 (0 for never)
+        :param retry_after: value of the Retry-After header sent with 429s, if any
+        """
+        super().__init__(('127.0.0.1', port), FakeOpenAIHandler)
+        self.first_token_latency = first_token_latency
+        self.token_delay = token_delay
+        self.rate_limit_first = rate_limit_first
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self._counter_lock = threading.Lock()
+        self._thread = None
+
+    def should_rate_limit(self):
+        """Counts a request and decides whether it gets a 429"""
+        with self._counter_lock:
+            self.requests += 1
+            limited = (
+                self.requests <= self.rate_limit_first
+                or (self.rate_limit_every and (self.requests - self.rate_limit_first) % self.rate_limit_every == 0)
+            )
+            if limited:
+                self.rate_limited += 1
+            return bool(limited)
+
+    @property
+    def api_base(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--first-token-latency', type=float, default=0.5, help='seconds before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='seconds between streamed tokens')
+    parser.add_argument('--rate-limit-first', type=int, default=0, help='answer the first n requests with 429')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='then answer every n-th request with 429')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After header value for 429s')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.port, args.first_token_latency, args.token_delay,
+        args.rate_limit_first, args.rate_limit_every, args.retry_after)
+    print(f'Fake OpenAI API listening on {server.api_base}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
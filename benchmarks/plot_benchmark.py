@@ -0,0 +1,128 @@
+"""
+Render time and output size of large plots, drawn from the full data and after plot_helpers.
+
+Each case plots a synthetic DataFrame the way generated scripts do: line and scatter plots
+with matplotlib (PNG) and plotly (HTML), and bar charts with seaborn (PNG) and plotly (HTML).
+Times include the reduction itself.
+
+Usage:
+    python benchmarks/plot_benchmark.py --rows 1000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+import plotly.express as px
+
+import plot_helpers
+
+def make_data(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'time': pd.date_range('2023-01-01', periods=rows, freq='s'),
+        'signal': np.cumsum(rng.standard_normal(rows)),
+        'x': rng.standard_normal(rows),
+        'y': rng.standard_normal(rows),
+        'station': rng.choice([f'station {i}' for i in range(120)], rows),
+        'sensor': rng.choice(['a', 'b', 'c'], rows),
+    })
+
+def save_matplotlib(path):
+    plt.savefig(path, dpi=150)
+    plt.close('all')
+
+def line_matplotlib(df, reduce, path):
+    if reduce:
+        df = plot_helpers.reduce_line(df, 'time', 'signal')
+    plt.figure(figsize=(12, 4))
+    plt.plot(df['time'], df['signal'])
+    save_matplotlib(path + '.png')
+    return path + '.png'
+
+def line_plotly(df, reduce, path):
+    if reduce:
+        df = plot_helpers.reduce_line(df, 'time', 'signal', by='sensor')
+    px.line(df, x='time', y='signal', color='sensor').write_html(path + '.html', include_plotlyjs='cdn')
+    return path + '.html'
+
+def scatter_matplotlib(df, reduce, path):
+    plt.figure(figsize=(6, 6))
+    if reduce:
+        df = plot_helpers.reduce_scatter(df, 'x', 'y')
+        plt.scatter(df['x'], df['y'], c=df['count'], s=4)
+    else:
+        plt.scatter(df['x'], df['y'], s=4)
+    save_matplotlib(path + '.png')
+    return path + '.png'
+
+def scatter_plotly(df, reduce, path):
+    if reduce:
+        df = plot_helpers.reduce_scatter(df, 'x', 'y', by='sensor')
+    px.scatter(df, x='x', y='y', color='sensor').write_html(path + '.html', include_plotlyjs='cdn')
+    return path + '.html'
+
+def bar_seaborn(df, reduce, path):
+    plt.figure(figsize=(14, 4))
+    if reduce:
+        df = plot_helpers.aggregate_bars(df, 'station', 'signal', agg='mean')
+    sns.barplot(data=df, x='station', y='signal')
+    save_matplotlib(path + '.png')
+    return path + '.png'
+
+def bar_plotly(df, reduce, path):
+    if reduce:
+        df = plot_helpers.aggregate_bars(df, 'station', by='sensor')
+        figure = px.bar(df, x='station', y='count', color='sensor')
+    else:
+        figure = px.histogram(df, x='station', color='sensor')
+    figure.write_html(path + '.html', include_plotlyjs='cdn')
+    return path + '.html'
+
+CASES = {
+    'line / matplotlib': line_matplotlib,
+    'line / plotly': line_plotly,
+    'scatter / matplotlib': scatter_matplotlib,
+    'scatter / plotly': scatter_plotly,
+    'bar / seaborn': bar_seaborn,
+    'bar / plotly': bar_plotly,
+}
+
+def measure(case, df, reduce, folder):
+    start = time.perf_counter()
+    output = case(df, reduce, os.path.join(folder, f'{case.__name__}-{int(reduce)}'))
+    return time.perf_counter() - start, os.path.getsize(output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--cases', nargs='*', choices=sorted(CASES), help='cases to run, all by default')
+    parser.add_argument('--reduced-only', action='store_true', help='skip rendering the full data, which can take minutes')
+    args = parser.parse_args()
+
+    df = make_data(args.rows)
+    print(f'{args.rows} rows')
+    print(f'{"case":<22} {"full s":>8} {"full MB":>9} {"reduced s":>10} {"reduced MB":>11}')
+    with tempfile.TemporaryDirectory() as folder:
+        for name in args.cases or CASES:
+            reduced_time, reduced_size = measure(CASES[name], df, True, folder)
+            if args.reduced_only:
+                full = f'{"-":>8} {"-":>9}'
+            else:
+                full_time, full_size = measure(CASES[name], df, False, folder)
+                full = f'{full_time:>8.2f} {full_size / 1e6:>9.2f}'
+            print(f'{name:<22} {full} {reduced_time:>10.2f} {reduced_size / 1e6:>11.2f}', flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark of the static code safety analyzer over a corpus of generated scripts.
+
+Every script in the corpus folder is named after the verdict it should get
+(safe_*.py, dangerous_*.py, ambiguous_*.py). The benchmark reports each verdict,
+how long the analysis took, how many scripts would still be sent to the code
+safety agent, and, with --llm, how long the agent takes for the same scripts.
+
+Usage:
+    python benchmarks/safety_benchmark.py
+    python benchmarks/safety_benchmark.py --repeat 200
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1 python benchmarks/safety_benchmark.py --llm
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from safety import analyze_code, SAFE, DANGEROUS, AMBIGUOUS
+
+CORPUS_DIR = Path(__file__).resolve().parent / 'safety_corpus'
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """Returns [(name, expected verdict, code)] for every script in the corpus"""
+
+    corpus = []
+    for file in sorted(corpus_dir.glob('*.py')):
+        expected = file.stem.split('_')[0]
+        if expected not in (SAFE, DANGEROUS, AMBIGUOUS):
+            print(f'Skipping {file.name}: name does not start with a verdict')
+            continue
+        corpus.append((file.stem, expected, file.read_text()))
+    return corpus
+
+def time_analysis(code, repeat):
+    """Returns the verdict and the median time of one analysis in milliseconds"""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        verdict = analyze_code(code)
+        timings.append((time.perf_counter() - start) * 1000)
+    return verdict, statistics.median(timings)
+
+def time_llm(code):
+    """Returns whether the code safety agent deemed code safe, and how long it took in milliseconds"""
+
+    import openai
+    import pipeline
+
+    openai.api_base = os.environ.get('OPENAI_API_BASE', openai.api_base)
+    start = time.perf_counter()
+    response = pipeline.get_response(pipeline.CODE_SAFETY_MODEL, pipeline.CODE_SAFETY_SYSTEM_DESCRIPTION, [], code)
+    elapsed = (time.perf_counter() - start) * 1000
+    answer = pipeline.check_completion(response).choices[0].message['content']
+    return answer.startswith('All clear'), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', type=Path, default=CORPUS_DIR)
+    parser.add_argument('--repeat', type=int, default=50, help='analyses per script, for stable timings')
+    parser.add_argument('--llm', action='store_true', help='also time the code safety agent on every script')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if args.llm:
+        os.chdir(Path(__file__).resolve().parent.parent)  # the agent descriptions are read relative to the repo
+
+    timings, llm_timings, mismatches = [], [], []
+    print(f'{"script":<36} {"expected":<10} {"verdict":<10} {"ms":>8}' + (f' {"llm":>6} {"llm ms":>8}' if args.llm else ''))
+    for name, expected, code in corpus:
+        verdict, elapsed = time_analysis(code, args.repeat)
+        timings.append(elapsed)
+        if verdict.verdict != expected:
+            mismatches.append((name, expected, verdict))
+        line = f'{name:<36} {expected:<10} {verdict.verdict:<10} {elapsed:>8.3f}'
+        if args.llm:
+            llm_safe, llm_elapsed = time_llm(code)
+            llm_timings.append(llm_elapsed)
+            line += f' {"safe" if llm_safe else "unsafe":>6} {llm_elapsed:>8.1f}'
+        print(line)
+
+    counts = {kind: sum(1 for _, expected, _ in corpus if expected == kind) for kind in (SAFE, DANGEROUS, AMBIGUOUS)}
+    ambiguous = sum(1 for name, expected, code in corpus if analyze_code(code).ambiguous)
+    print()
+    print(f'Scripts: {len(corpus)} ({", ".join(f"{count} {kind}" for kind, count in counts.items())})')
+    print(f'Verdicts matching the corpus labels: {len(corpus) - len(mismatches)}/{len(corpus)}')
+    print(f'Agent calls avoided: {len(corpus) - ambiguous}/{len(corpus)}')
+    print(f'Static analysis: median {statistics.median(timings):.3f} ms, max {max(timings):.3f} ms per script')
+    if llm_timings:
+        print(f'Code safety agent: median {statistics.median(llm_timings):.1f} ms, max {max(llm_timings):.1f} ms per script')
+
+    for name, expected, verdict in mismatches:
+        print(f'\n{name}: expected {expected}, got {verdict.describe()}')
+
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
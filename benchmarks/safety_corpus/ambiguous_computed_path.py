@@ -0,0 +1,7 @@
+import sys
+import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_csv('data/data.csv')
+df.plot(x='FeOT', y='SiO2', kind='scatter')
+plt.savefig(sys.argv[1])
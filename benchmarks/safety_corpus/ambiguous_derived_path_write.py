@@ -0,0 +1,3 @@
+from pathlib import Path
+
+Path('ok.png').joinpath('../../x').write_text('')
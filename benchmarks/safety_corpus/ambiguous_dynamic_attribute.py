@@ -0,0 +1,8 @@
+import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_csv('data/data.csv')
+kind = input('Plot kind (line, bar, hist): ')
+ax = getattr(df['SiO2'].plot, kind)()
+ax.set_title(f'SiO2 ({kind})')
+plt.savefig('sio2.png')
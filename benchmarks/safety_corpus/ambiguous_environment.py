@@ -0,0 +1,8 @@
+import os
+import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_csv(os.path.join('data', 'data.csv'))
+df.plot(x='FeOT', y='SiO2', kind='scatter')
+plt.title(os.environ.get('PLOT_TITLE', 'SiO2 vs FeOT'))
+plt.savefig('scatter.png')
@@ -0,0 +1,5 @@
+import pandas as pd
+from pathlib import Path
+
+for f in Path('data').iterdir():
+    pd.DataFrame().to_csv(f)
@@ -0,0 +1,4 @@
+import os
+
+shell = os
+shell.system('ls')
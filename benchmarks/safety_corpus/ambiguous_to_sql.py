@@ -0,0 +1,4 @@
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+df.to_sql('data', 'sqlite:///data.db')
@@ -0,0 +1,9 @@
+import pandas as pd
+from sklearn.decomposition import PCA
+import matplotlib.pyplot as plt
+
+df = pd.read_csv('data/data.csv').select_dtypes('number').dropna()
+components = PCA(n_components=2).fit_transform(df)
+plt.scatter(components[:, 0], components[:, 1], s=5)
+plt.title('PCA of the chemistry columns')
+plt.savefig('pca.png', dpi=300)
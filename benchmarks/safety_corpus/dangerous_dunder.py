@@ -0,0 +1,4 @@
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+loader = ().__class__.__bases__[0].__subclasses__()
@@ -0,0 +1,6 @@
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+expression = input('Column expression: ')
+df['derived'] = eval(expression)
+df.plot(y='derived').get_figure().savefig('derived.png')
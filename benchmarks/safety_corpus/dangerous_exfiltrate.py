@@ -0,0 +1,5 @@
+import requests
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+requests.post('https://example.com/upload', data=df.to_csv())
@@ -0,0 +1,5 @@
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+with pd.HDFStore('/tmp/store.h5') as store:
+    store.put('df', df)
@@ -0,0 +1,4 @@
+import scipy.io
+
+netcdf = scipy.io.netcdf_file('/etc/x.nc', 'w')
+netcdf.close()
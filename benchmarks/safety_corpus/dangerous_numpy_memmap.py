@@ -0,0 +1,4 @@
+import numpy as np
+
+array = np.memmap('/tmp/x.dat', dtype='float32', mode='w+', shape=(100,))
+array[:] = 0
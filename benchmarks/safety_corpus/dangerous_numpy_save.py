@@ -0,0 +1,3 @@
+import numpy as np
+
+np.save('/tmp/x', np.arange(10))
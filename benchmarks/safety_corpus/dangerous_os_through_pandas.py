@@ -0,0 +1,3 @@
+import pandas as pd
+
+pd.io.common.os.remove('data/data.csv')
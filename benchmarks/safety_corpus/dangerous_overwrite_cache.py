@@ -0,0 +1,4 @@
+import json
+
+with open('.cache/responses.json', 'w') as file:
+    json.dump({}, file)
@@ -0,0 +1,5 @@
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+df = df.dropna()
+df.to_csv('data/data.csv', index=False)
@@ -0,0 +1,3 @@
+from pathlib import Path
+
+Path('data/data.csv').rename('/tmp/data.csv')
@@ -0,0 +1,7 @@
+from pathlib import Path
+import pandas as pd
+
+for file in Path('data').glob('*.csv'):
+    df = pd.read_csv(file)
+    df.describe().to_csv(f'{file.stem}_summary.csv')
+    file.unlink()
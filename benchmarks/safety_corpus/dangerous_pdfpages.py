@@ -0,0 +1,6 @@
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+with PdfPages('/etc/report.pdf') as pdf:
+    plt.plot([1, 2, 3])
+    pdf.savefig()
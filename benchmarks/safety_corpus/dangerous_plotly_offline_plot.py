@@ -0,0 +1,7 @@
+import pandas as pd
+import plotly.express as px
+import plotly.offline
+
+df = pd.read_csv('data/data.csv')
+fig = px.scatter(df, x='FeOT', y='SiO2')
+plotly.offline.plot(fig, filename='/etc/x.html', auto_open=False)
@@ -0,0 +1,6 @@
+import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_csv('https://example.com/data.csv')
+df.plot()
+plt.savefig('remote.png')
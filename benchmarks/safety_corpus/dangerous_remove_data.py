@@ -0,0 +1,8 @@
+import os
+import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_csv('data/data.csv')
+df.plot(x='FeOT', y='SiO2', kind='scatter')
+plt.savefig('scatter.png')
+os.remove('data/data.csv')
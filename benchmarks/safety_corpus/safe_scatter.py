@@ -0,0 +1,9 @@
+import pandas as pd
+import plotly.express as px
+
+df = pd.read_csv('data/data.csv', header=0)
+df = df[df['Category'] == 'A']
+fig = px.scatter(df, x='FeOT', y='SiO2', color='MnO', color_continuous_scale='Viridis',
+                 title='SiO2 vs FeOT (Category A)')
+fig.update_layout(xaxis_title='FeOT', yaxis_title='SiO2')
+fig.write_html('sio2_vs_feot_category_a.html')
@@ -0,0 +1,23 @@
+import os
+import pandas as pd
+import plotly.express as px
+
+data_file = 'data/data.csv'
+if not os.path.exists(data_file):
+    raise FileNotFoundError(f"The file '{data_file}' was not found in the data folder.")
+df = pd.read_csv(data_file, header=0)
+
+for column in ['FeOT', 'SiO2', 'MnO', 'Category']:
+    if column not in df.columns:
+        raise KeyError(f"Column '{column}' does not exist in {data_file}.")
+
+df = df[df['Category'] == 'A']
+fig = px.scatter(df, x='FeOT', y='SiO2', color='MnO', title='SiO2 vs FeOT (Category A)')
+
+output_file = 'sio2_vs_feot_category_a.html'
+if os.path.exists(output_file):
+    answer = input(f"{output_file} already exists. Overwrite? (y/n) ")
+    if answer.lower() != 'y':
+        raise FileExistsError(f"Not overwriting {output_file}.")
+fig.write_html(output_file)
+print(f"Plot written to {output_file}")
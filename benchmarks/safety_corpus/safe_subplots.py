@@ -0,0 +1,11 @@
+import pandas as pd
+from plotly.subplots import make_subplots
+import plotly.graph_objects as go
+
+df = pd.read_csv('data/data.csv')
+fig = make_subplots(rows=1, cols=2, subplot_titles=('SiO2', 'MgO'))
+fig.add_trace(go.Box(y=df['SiO2'], name='SiO2'), row=1, col=1)
+fig.add_trace(go.Box(y=df['MgO'], name='MgO'), row=1, col=2)
+fig.update_layout(title_text='Oxide distributions')
+fig.write_image('oxide_boxplots.png', scale=3)
+fig.write_html('oxide_boxplots.html')
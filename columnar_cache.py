@@ -0,0 +1,90 @@
+import os
+import hashlib
+import logging
+
+from metadata_cache import CACHE_DIR
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+COLUMNAR_CACHE_DIR = CACHE_DIR / 'columnar'
+
+# Sidecar formats, and the pandas reader generated code should load them with.
+# Feather needs pyarrow; pickle works with plain pandas and loads about as fast.
+READERS = {
+    'feather': 'read_feather',
+    'parquet': 'read_parquet',
+    'pickle': 'read_pickle',
+}
+EXTENSIONS = {'feather': '.feather', 'parquet': '.parquet', 'pickle': '.pkl'}
+
+def default_format():
+    """The fastest sidecar format available with the installed packages"""
+    return 'feather' if pyarrow is not None else 'pickle'
+
+def sidecar_path(file, sheet_name, fmt, cache_dir=COLUMNAR_CACHE_DIR):
+    """Where the sidecar of a CSV file (sheet_name None) or an Excel sheet goes"""
+
+    source = str(os.path.abspath(file)) + ('' if sheet_name is None else f'\0{sheet_name}')
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    label = os.path.basename(file) if sheet_name is None else f'{os.path.basename(file)}-{sheet_name}'
+    label = ''.join(c if c.isalnum() or c in '.-_' else '_' for c in label)
+    return cache_dir / f'{label}-{digest}{EXTENSIONS[fmt]}'
+
+def write_sidecar(df, path, fmt):
+    """Write a DataFrame in a columnar format, atomically"""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    if fmt == 'feather':
+        df.to_feather(tmp_path)
+    elif fmt == 'parquet':
+        df.to_parquet(tmp_path)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+def convert(read, file, sheet_name, fmt, cache_dir=COLUMNAR_CACHE_DIR):
+    """
+    Parse a whole CSV file or Excel sheet once and save it as a sidecar.
+    :param read: callable returning the DataFrame, with the detected header row applied
+    :return: {'path': ..., 'reader': ...} for the summary, or None if the data cannot be stored in fmt
+    """
+    path = sidecar_path(file, sheet_name, fmt, cache_dir)
+    try:
+        df = read()
+        if fmt in ('feather', 'parquet'):
+            # Arrow formats need string column names; keep the labels generated code will use
+            if not all(isinstance(column, str) for column in df.columns):
+                return None
+        write_sidecar(df, path, fmt)
+    except Exception as err:
+        logging.error(f'Could not write a {fmt} copy of {file}{"" if sheet_name is None else f" ({sheet_name})"}: {err}')
+        return None
+    return {'path': path.as_posix(), 'reader': READERS[fmt]}
+
+def sidecars_present(summary, is_excel):
+    """Whether every sidecar a cached file summary points to still exists"""
+
+    sheets = summary.values() if is_excel else [summary]
+    return all(os.path.exists(sheet['fast path']['path']) for sheet in sheets if 'fast path' in sheet)
+
+def prune(summaries, cache_dir=COLUMNAR_CACHE_DIR):
+    """Delete sidecars that no summary points to any more"""
+
+    if not cache_dir.is_dir():
+        return
+    csv_summary, xlsx_summary = summaries
+    referenced = {os.path.normpath(summary['fast path']['path']) for summary in csv_summary.values() if 'fast path' in summary}
+    referenced |= {
+        os.path.normpath(sheet['fast path']['path'])
+        for sheets in xlsx_summary.values() for sheet in sheets.values() if 'fast path' in sheet
+    }
+    for path in cache_dir.iterdir():
+        if os.path.normpath(path.as_posix()) not in referenced:
+            try:
+                path.unlink()
+            except OSError as err:
+                logging.error(f'Could not remove stale columnar copy {path}: {err}')
@@ -0,0 +1,162 @@
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Context window of each model, in tokens
+CONTEXT_WINDOWS = {
+    'gpt-4': 8192,
+    'gpt-4-32k': 32768,
+    'gpt-3.5-turbo': 4096,
+    'gpt-3.5-turbo-16k': 16384,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+HISTORY_TOKEN_BUDGET = 2000  # tokens of previous messages sent with each request
+SUMMARY_TOKEN_BUDGET = 300   # part of the budget given to the summary of dropped turns
+RESPONSE_TOKEN_RESERVE = 1500  # room left in the context window for the answer
+MESSAGE_OVERHEAD = 4  # tokens the chat format adds per message
+SUMMARY_PROMPT_CHARS = 200  # earlier prompts are cut to this length in the summary
+
+SUPERSEDED_CODE = '[Code omitted: it was replaced by a later version below.]'
+
+_encodings = {}
+
+def count_tokens(text, model=None):
+    """
+    Count the tokens in a piece of text, with tiktoken if it is installed,
+    otherwise estimated at about four characters per token.
+    """
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding('cl100k_base')
+    return len(_encodings[model].encode(text))
+
+def count_message_tokens(messages, model=None):
+    """Count the tokens of a list of chat messages, including the per-message overhead"""
+    return sum(count_tokens(message['content'], model) + MESSAGE_OVERHEAD for message in messages)
+
+class ConversationManager:
+    """
+    Keeps the history of a conversation and decides which part of it is sent with each request.
+    Only the latest version of the generated code is sent in full; older versions are
+    replaced by a placeholder, since each follow-up rewrites the whole script.
+    Turns that do not fit in the token budget are dropped, oldest first, and their
+    prompts are listed in a short summary message instead, so the size of a request
+    stays flat however long the session gets.
+    """
+
+    def __init__(self, budget=HISTORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET):
+        """
+        :param budget: maximum number of tokens of history sent with a request
+        :param summary_budget: part of the budget that the summary of dropped turns may use
+        """
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.turns = []  # (user message, generated code)
+        self._lock = threading.Lock()
+
+    def add_turn(self, message, code):
+        """Record a finished exchange: the user's message and the code it produced"""
+        with self._lock:
+            self.turns.append((message, code))
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+
+    def recent_prompts(self, n=3):
+        """The user's last n messages, oldest first"""
+        with self._lock:
+            return [message for message, _ in self.turns[-n:]]
+
+    @property
+    def history(self):
+        """The full conversation, as chat messages"""
+        with self._lock:
+            turns = list(self.turns)
+        return [message for turn in turns for message in self.turn_messages(*turn)]
+
+    @staticmethod
+    def turn_messages(message, code):
+        return [
+            {"role": "user", "content": message},
+            {"role": "system", "content": code},
+        ]
+
+    def messages(self, model=None, system_description='', msg=''):
+        """
+        The previous messages to send with a request.
+        :param model: model the request goes to, for token counting and its context window
+        :param system_description: the system description sent with the request
+        :param msg: the new user message
+        :return: list of chat messages within the budget
+        """
+        with self._lock:
+            turns = list(self.turns)
+        if not turns:
+            return []
+
+        # Never go past what the context window leaves after the fixed parts of the request
+        window = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+        fixed = count_tokens(system_description, model) + count_tokens(msg, model) + 2 * MESSAGE_OVERHEAD
+        budget = max(0, min(self.budget, window - RESPONSE_TOKEN_RESERVE - fixed))
+
+        # Only the latest code is worth sending; older versions are superseded by it
+        latest = len(turns) - 1
+        sent = [self.turn_messages(message, code if i == latest else SUPERSEDED_CODE)
+                for i, (message, code) in enumerate(turns)]
+        sizes = [count_message_tokens(turn, model) for turn in sent]
+        if sum(sizes) <= budget:
+            return [message for turn in sent for message in turn]
+
+        # Keep the most recent turns that fit next to a summary of the others
+        kept, used, first_kept = [], 0, len(turns)
+        for i in range(latest, -1, -1):
+            if used + sizes[i] > budget - self.summary_budget:
+                break
+            kept[:0] = sent[i]
+            used += sizes[i]
+            first_kept = i
+
+        if not kept:
+            # Even the latest turn is too big: send its code alone, which follow-ups refer to
+            code_message = sent[latest][1:]
+            if count_message_tokens(code_message, model) <= budget - self.summary_budget:
+                kept = code_message
+                used = count_message_tokens(code_message, model)
+
+        summary = self.summarize([message for message, _ in turns[:first_kept]], budget - used, model)
+        return ([summary] if summary else []) + kept
+
+    @staticmethod
+    def summarize(prompts, budget, model=None):
+        """
+        A message listing the earlier prompts of the conversation, most recent first to be kept.
+        :return: the message, or None if not even one prompt fits in budget tokens
+        """
+        header = 'Earlier requests in this conversation (their code was replaced by later versions):'
+        lines = []
+        used = count_tokens(header, model) + MESSAGE_OVERHEAD
+        for prompt in reversed(prompts):
+            prompt = ' '.join(prompt.split())
+            if len(prompt) > SUMMARY_PROMPT_CHARS:
+                prompt = prompt[:SUMMARY_PROMPT_CHARS] + '...'
+            line = f'- {prompt}'
+            size = count_tokens(line, model) + 1
+            if used + size > budget:
+                break
+            lines.insert(0, line)
+            used += size
+        if not lines:
+            return None
+        omitted = len(prompts) - len(lines)
+        if omitted:
+            lines.insert(0, f'- ({omitted} earlier request(s) omitted)')
+        return {"role": "system", "content": '\n'.join([header] + lines)}
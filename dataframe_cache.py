@@ -0,0 +1,145 @@
+import os
+import inspect
+import threading
+import types
+from collections import OrderedDict
+
+DATAFRAME_CACHE_BYTES = 1024 ** 3  # memory the cached DataFrames may use
+CACHED_READERS = ('read_csv', 'read_table', 'read_excel', 'read_json', 'read_feather', 'read_parquet', 'read_pickle')
+
+class DataFrameCache:
+    """
+    Memory-bounded LRU of parsed DataFrames, for a process that runs many scripts on the same files.
+    Entries are keyed by reader, resolved path, the file's mtime and size, and every other
+    argument of the call (sheet_name, header, usecols, ...), so an edited file or a different
+    header row is parsed again. Callers get a copy, so a script modifying its DataFrame
+    does not change what the next script reads.
+    """
+
+    def __init__(self, max_bytes=DATAFRAME_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, size in bytes)
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def install(self, pandas=None):
+        """Replace the pandas readers with cached versions; calling it again does nothing"""
+
+        if pandas is None:
+            import pandas
+        for name in CACHED_READERS:
+            if name not in self._originals:
+                self._originals[name] = getattr(pandas, name)
+                setattr(pandas, name, self.cached_reader(name, self._originals[name]))
+        return self
+
+    def uninstall(self, pandas=None):
+        """Put the original pandas readers back"""
+
+        if pandas is None:
+            import pandas
+        for name, original in self._originals.items():
+            setattr(pandas, name, original)
+        self._originals.clear()
+
+    def cached_reader(self, name, original):
+        signature = inspect.signature(original)
+
+        def reader(*args, **kwargs):
+            key = self.key(name, signature, args, kwargs)
+            if key is None:
+                return original(*args, **kwargs)
+            value = self.get(key)
+            if value is None:
+                value = original(*args, **kwargs)
+                self.put(key, value)
+            return copy_frames(value)
+
+        reader.__name__ = name
+        reader.__doc__ = original.__doc__
+        reader.__wrapped__ = original
+        return reader
+
+    @staticmethod
+    def key(name, signature, args, kwargs):
+        """Cache key of a reader call, or None if the call cannot be cached (buffers, URLs, chunked reads, callables)"""
+
+        try:
+            bound = signature.bind(*args, **kwargs)
+        except TypeError:
+            return None  # let pandas raise its own error
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.update(arguments.pop('kwds', None) or {})
+
+        path = None
+        for parameter in ('filepath_or_buffer', 'io', 'path_or_buf', 'path'):
+            path = arguments.pop(parameter, path)
+        if not isinstance(path, (str, os.PathLike)) or '://' in str(path):
+            return None
+        if arguments.get('chunksize') is not None or arguments.get('iterator'):
+            return None
+        if any(has_function(value) for value in arguments.values()):
+            return None  # converters and the like would make every key different
+
+        try:
+            path = os.path.realpath(path)
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return name, path, stat.st_mtime_ns, stat.st_size, repr(sorted(arguments.items()))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = frame_bytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+def has_function(value):
+    """Whether a reader argument is or contains a function"""
+    if isinstance(value, (types.FunctionType, types.MethodType, types.BuiltinFunctionType)):
+        return True
+    if isinstance(value, dict):
+        return any(has_function(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return any(has_function(item) for item in value)
+    return False
+
+def frame_bytes(value):
+    """Memory used by a DataFrame, or by a dict of them (read_excel with several sheets)"""
+    if isinstance(value, dict):
+        return sum(frame_bytes(frame) for frame in value.values())
+    return int(value.memory_usage(deep=True).sum())
+
+def copy_frames(value):
+    if isinstance(value, dict):
+        return {name: frame.copy() for name, frame in value.items()}
+    return value.copy()
@@ -0,0 +1,443 @@
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import atexit
+import threading
+import subprocess
+from dataclasses import dataclass
+
+from dataframe_cache import DataFrameCache, DATAFRAME_CACHE_BYTES
+from tracing import span
+
+try:
+    import resource
+except ImportError:  # not available on Windows; scripts then run without CPU and memory limits
+    resource = None
+
+CPU_TIME_LIMIT = 300  # seconds of CPU time a script may use
+MEMORY_LIMIT = 4 * 1024 ** 3  # bytes of address space a script may use
+WALL_CLOCK_TIMEOUT = 600  # seconds before a script is killed
+PREWARM = True  # keep a spare worker process with the plotting libraries already imported
+PERSISTENT_KERNEL = True  # run scripts one after the other in a long-lived kernel that caches parsed DataFrames
+WARM_IMPORTS = ('numpy', 'pandas', 'matplotlib.pyplot', 'plotly.express', 'plotly.graph_objects', 'seaborn', 'scipy.stats', 'plot_helpers')
+# Answer given to input() prompts in scripts, e.g. "overwrite existing file?". Declining keeps the
+# safeguard such prompts are there for; set to 'y' to accept them, or None to make input() fail.
+INPUT_ANSWER = 'n'
+
+EXIT_MEMORY = 3  # exit status of a worker whose script ran out of memory
+JOB_END = '\x1e\x1eauto-plotter job end'  # written by a kernel after each job
+
+@dataclass
+class ExecutionResult:
+    """Outcome of running a script in a worker process"""
+    script: str
+    status: str  # 'ok', 'error', 'timeout', 'cpu limit', 'memory limit', 'killed' or 'cancelled'
+    returncode: int
+    duration: float
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+    def __str__(self):
+        name = os.path.basename(self.script)
+        if self.ok:
+            return f'Executed {name} in {self.duration:.1f} s.'
+        reasons = {
+            'error': f'failed with exit status {self.returncode}',
+            'timeout': 'was stopped at the time limit',
+            'cpu limit': 'was stopped after using up its CPU time',
+            'memory limit': 'ran out of memory',
+            'killed': f'was killed by signal {-self.returncode}',
+            'cancelled': 'was cancelled',
+        }
+        return f'{name} {reasons[self.status]} after {self.duration:.1f} s.'
+
+class KernelProcess:
+    """A kernel process and the threads that read its output and detect the end of each job"""
+
+    def __init__(self, process):
+        self.process = process
+        self.on_output = None
+        self.code = None
+        self.done = {'stdout': threading.Event(), 'stderr': threading.Event()}
+        for name in self.done:
+            threading.Thread(target=self._pump, args=(name,), name=f'kernel-{name}', daemon=True).start()
+
+    def start_job(self, job, on_output):
+        self.on_output = on_output
+        self.code = None
+        for event in self.done.values():
+            event.clear()
+        try:
+            self.process.stdin.write(json.dumps(job) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            pass  # the kernel died; the readers see its output end
+
+    def wait_job(self, timeout):
+        """
+        Wait for the current job to end.
+        :return: False on timeout
+        """
+        deadline = time.monotonic() + timeout
+        return all(event.wait(max(0, deadline - time.monotonic())) for event in self.done.values())
+
+    def _pump(self, name):
+        stream = getattr(self.process, name)
+        for line in stream:
+            if JOB_END in line:
+                before, _, rest = line.partition(JOB_END)
+                if before and self.on_output is not None:
+                    self.on_output(name, before)
+                if name == 'stdout':
+                    self.code = int(rest.split()[0])
+                self.done[name].set()
+            elif self.on_output is not None:
+                self.on_output(name, line)
+        stream.close()
+        # The kernel exited, so no job end will come
+        for event in self.done.values():
+            event.set()
+
+class ScriptExecutor:
+    """
+    Runs scripts in separate worker processes, with CPU time and memory limits and a wall-clock timeout,
+    so a heavy or broken script cannot block, crash or bloat the GUI.
+    By default, scripts run one after the other in a persistent kernel process, which serves
+    pd.read_csv/read_table/read_excel from a memory-bounded DataFrameCache, so iterating on a plot
+    does not parse the same files again. A kernel that crashes, times out or is cancelled is replaced,
+    losing its cache. With persistent=False, every script gets a fresh process instead.
+    With prewarm, the next process is started (and imports the plotting libraries) while
+    the user is still reading the last results.
+    Scripts use matplotlib's default backend, so plt.show() opens windows, unless mpl_backend
+    is set, e.g. to 'Agg' for runs without a display.
+    execute() runs in a background thread and puts events on the `events` queue:
+        ('output', stream, text)   a line the script wrote to 'stdout' or 'stderr'
+        ('executed', result)       the script ended, with an ExecutionResult
+    """
+
+    def __init__(self, prewarm=PREWARM, persistent=PERSISTENT_KERNEL, cpu_time_limit=CPU_TIME_LIMIT,
+                 memory_limit=MEMORY_LIMIT, timeout=WALL_CLOCK_TIMEOUT, cache_bytes=DATAFRAME_CACHE_BYTES,
+                 mpl_backend=None):
+        """
+        :param cache_bytes: memory the kernel's DataFrameCache may use; it counts towards memory_limit
+        :param mpl_backend: matplotlib backend of the scripts (MPLBACKEND), or None for the default
+        """
+        self.prewarm = prewarm
+        self.persistent = persistent
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        self.cache_bytes = cache_bytes
+        self.mpl_backend = mpl_backend
+        self.events = queue.Queue()
+        self._spare = None
+        self._kernel = None
+        self._running = set()
+        self._lock = threading.Lock()
+        self._kernel_lock = threading.Lock()  # the kernel runs one job at a time
+        if prewarm:
+            if persistent:
+                self._kernel = KernelProcess(self._spawn(kernel=True))
+            else:
+                self._spare = self._spawn()
+        atexit.register(self.shutdown)
+
+    def _spawn(self, kernel=False):
+        env = dict(os.environ, PYTHONUNBUFFERED='1')
+        if self.mpl_backend is not None:
+            env['MPLBACKEND'] = self.mpl_backend
+        return subprocess.Popen(
+            [sys.executable, '-u', os.path.abspath(__file__)] + (['--kernel'] if kernel else []),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, bufsize=1, env=env,
+            start_new_session=(os.name == 'posix'),
+        )
+
+    def _take_worker(self):
+        with self._lock:
+            worker, self._spare = self._spare, None
+            if worker is None or worker.poll() is not None:
+                worker = self._spawn()
+            if self.prewarm:
+                self._spare = self._spawn()
+            self._running.add(worker)
+        return worker
+
+    def job(self, script, cwd=None):
+        return {
+            'script': os.path.abspath(script),
+            'cwd': os.path.abspath(cwd or os.getcwd()),
+            'cpu_time_limit': self.cpu_time_limit,
+            'memory_limit': self.memory_limit,
+            'cache_bytes': self.cache_bytes,
+        }
+
+    def run(self, script, on_output=None, cwd=None):
+        """
+        Run a script in the kernel or a worker process and wait for it to end.
+        :param script: path of the python file to run
+        :param on_output: optional callable(stream, text), called from reader threads with each line of output
+        :param cwd: working directory of the script, the current one by default
+        :return: an ExecutionResult
+        """
+        with span('execute', script=os.path.basename(script), kernel=self.persistent) as execution:
+            if self.persistent:
+                result = self._run_in_kernel(script, on_output, cwd)
+            else:
+                result = self._run_in_worker(script, on_output, cwd)
+            execution.set(status=result.status)
+        return result
+
+    def _run_in_kernel(self, script, on_output, cwd):
+        with self._kernel_lock:
+            start = time.monotonic()
+            with self._lock:
+                kernel = self._kernel
+                if kernel is None or kernel.process.poll() is not None:
+                    kernel = self._kernel = KernelProcess(self._spawn(kernel=True))
+                self._running.add(kernel.process)
+
+            kernel.start_job(self.job(script, cwd), on_output)
+            timed_out = not kernel.wait_job(self.timeout)
+            if timed_out:
+                self._kill(kernel.process)
+
+            with self._lock:
+                cancelled = kernel.process not in self._running
+                self._running.discard(kernel.process)
+
+            if kernel.code is not None and not timed_out and not cancelled:
+                returncode = kernel.code
+            else:
+                # The kernel is gone: report how it ended, and start a new one for the next script
+                kernel.process.wait()
+                returncode = kernel.process.returncode
+                with self._lock:
+                    self._kernel = KernelProcess(self._spawn(kernel=True)) if self.prewarm else None
+
+        return ExecutionResult(script, self._status(returncode, timed_out, cancelled),
+                               returncode, time.monotonic() - start)
+
+    def _run_in_worker(self, script, on_output, cwd):
+        start = time.monotonic()
+        worker = self._take_worker()
+        job = self.job(script, cwd)
+
+        readers = [
+            threading.Thread(target=self._read, args=(worker.stdout, 'stdout', on_output), daemon=True),
+            threading.Thread(target=self._read, args=(worker.stderr, 'stderr', on_output), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        timed_out = False
+        try:
+            worker.stdin.write(json.dumps(job) + '\n')
+            worker.stdin.close()
+        except OSError:
+            pass  # the worker died before taking the job; its exit status says why
+        try:
+            worker.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            self._kill(worker)
+            worker.wait()
+        for reader in readers:
+            reader.join()
+
+        with self._lock:
+            cancelled = worker not in self._running
+            self._running.discard(worker)
+
+        return ExecutionResult(script, self._status(worker.returncode, timed_out, cancelled),
+                               worker.returncode, time.monotonic() - start)
+
+    def execute(self, script, cwd=None):
+        """Run a script in a background thread, reporting through the events queue"""
+
+        def target():
+            on_output = lambda stream, text: self.events.put(('output', stream, text))
+            self.events.put(('executed', self.run(script, on_output, cwd)))
+
+        thread = threading.Thread(target=target, name='script-executor', daemon=True)
+        thread.start()
+        return thread
+
+    def busy(self):
+        """Whether a script is running"""
+        with self._lock:
+            return bool(self._running)
+
+    def cancel(self):
+        """Kill every running script"""
+        with self._lock:
+            running, self._running = self._running, set()
+        for worker in running:
+            self._kill(worker)
+
+    def shutdown(self):
+        """Kill running scripts, the kernel and the spare worker"""
+        self.cancel()
+        with self._lock:
+            spare, self._spare = self._spare, None
+            kernel, self._kernel = self._kernel, None
+        for process in (spare, kernel.process if kernel is not None else None):
+            if process is not None:
+                self._kill(process)
+
+    @staticmethod
+    def _read(stream, name, on_output):
+        for line in stream:
+            if on_output is not None:
+                on_output(name, line)
+        stream.close()
+
+    @staticmethod
+    def _kill(worker):
+        if worker.poll() is not None:
+            return
+        try:
+            if os.name == 'posix':
+                os.killpg(worker.pid, signal.SIGKILL)
+            else:
+                worker.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @staticmethod
+    def _status(returncode, timed_out, cancelled):
+        if cancelled:
+            return 'cancelled'
+        if timed_out:
+            return 'timeout'
+        if returncode == 0:
+            return 'ok'
+        if returncode == EXIT_MEMORY:
+            return 'memory limit'
+        if hasattr(signal, 'SIGXCPU') and returncode == -signal.SIGXCPU:
+            return 'cpu limit'  # sent by the kernel at the soft CPU time limit
+        if returncode < 0:
+            return 'killed'
+        return 'error'
+
+def set_limits(cpu_time_limit, memory_limit, hard=True):
+    """
+    Limit the CPU time (on top of what the process already used) and address space of this process.
+    :param hard: also lower the hard limits; a kernel, which needs new limits for every script, only sets soft ones
+    """
+    if resource is None:
+        return
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = int(used.ru_utime + used.ru_stime) + cpu_time_limit
+    limits = {resource.RLIMIT_CPU: (cpu, cpu + 5), resource.RLIMIT_AS: (memory_limit, memory_limit)}
+    for limit, (soft, new_hard) in limits.items():
+        current_hard = resource.getrlimit(limit)[1]
+        if current_hard != resource.RLIM_INFINITY:
+            soft, new_hard = min(soft, current_hard), min(new_hard, current_hard)
+        try:
+            resource.setrlimit(limit, (soft, new_hard if hard else current_hard))
+        except ValueError:
+            pass
+
+def prepare_process():
+    """
+    Set up a worker or kernel process: import the plotting libraries,
+    and keep scripts from reading the job channel or waiting for a user
+    (input() gets INPUT_ANSWER).
+    :return: the job channel (the original stdin)
+    """
+    import builtins
+    import importlib
+
+    for module in WARM_IMPORTS:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+    jobs = sys.stdin
+    sys.stdin = open(os.devnull)
+
+    def answer_input(prompt=''):
+        if INPUT_ANSWER is None:
+            raise EOFError('scripts cannot read input')
+        print(f'{prompt}{INPUT_ANSWER}')
+        return INPUT_ANSWER
+    builtins.input = answer_input
+
+    return jobs
+
+def run_job(job, hard_limits=True):
+    """
+    Run a job's script under its limits with runpy, as if it were run with python.
+    :return: the exit status
+    """
+    import runpy
+    import traceback
+
+    os.chdir(job['cwd'])
+    script_dir = os.path.dirname(job['script'])
+    sys.path.insert(0, script_dir)
+    sys.argv = [job['script']]
+
+    set_limits(job['cpu_time_limit'], job['memory_limit'], hard_limits)
+    try:
+        runpy.run_path(job['script'], run_name='__main__')
+    except MemoryError:
+        traceback.print_exc()
+        return EXIT_MEMORY
+    except SystemExit as err:
+        if err.code is None or isinstance(err.code, int):
+            return err.code or 0
+        print(err.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.path.remove(script_dir)
+    return 0
+
+def worker_main():
+    """Entry point of a worker process: wait for one job on stdin and run it"""
+
+    jobs = prepare_process()
+    line = jobs.readline()
+    if not line:
+        return 0  # the executor shut down before using this worker
+    return run_job(json.loads(line))
+
+def kernel_main():
+    """
+    Entry point of a kernel process: run jobs from stdin one after the other, with pandas readers
+    served from a DataFrameCache. After each job, a JOB_END line with the exit status is written
+    to stdout and stderr.
+    """
+    jobs = prepare_process()
+    try:
+        cache = DataFrameCache().install()
+    except ImportError:  # no pandas; scripts still run, just without the cache
+        cache = None
+
+    for line in jobs:
+        job = json.loads(line)
+        if cache is not None:
+            cache.max_bytes = job.get('cache_bytes', cache.max_bytes)
+        code = run_job(job, hard_limits=False)
+        if 'matplotlib.pyplot' in sys.modules:
+            sys.modules['matplotlib.pyplot'].close('all')
+        if code == EXIT_MEMORY and cache is not None:
+            cache.clear()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        print(f'{JOB_END} {code}', flush=True)
+        print(JOB_END, file=sys.stderr, flush=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(kernel_main() if '--kernel' in sys.argv else worker_main())
@@ -1,33 +1,157 @@
+import io
+import os
+import csv
+import signal
+import numbers
+import threading
+import numpy as np
 import pandas as pd
 import logging
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
 
+from metadata_cache import MetadataCache
+from tracing import TRACER, span, count, traced, profiled
+import columnar_cache
+import streaming_profiler
+from summary_model import DataSummary
+
 DATA_FOLDER = Path('data')
 MAX_ROWS_SCAN = 16
 MAX_COLS_SUMMARY = 100
-
-def find_header_row_excel(file, max_rows_scan, sheet_name):
-    """Returns the 'best' header row for an Excel file"""
+USE_CONTENT_HASH = False
+INGEST_WORKERS = os.cpu_count() or 1
+FILE_TIMEOUT = 120  # seconds allowed to profile one file
+USE_COLUMNAR_CACHE = False  # also save each CSV and sheet, parsed with its header row, as a fast-loading sidecar
+INGEST_PROFILER = None  # 'cprofile' or 'pyinstrument' to profile summarize_data_folder, in-process (see tracing.profiled)
+COLUMN_STATS = True  # scan CSV, TSV and JSON files for column types, null counts and ranges (see streaming_profiler)
+STATS_MAX_ROWS = streaming_profiler.STATS_MAX_ROWS
+DELIMITED_EXTENSIONS = ('.csv', '.tsv', '.tab')
+JSON_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+
+# Cell kinds used to judge whether a column is type-consistent
+# Cells pandas reads as missing by default (na_values in the read_csv docs)
+NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+KIND_NA = 0
+KIND_NUMERIC = 1
+KIND_BOOL = 2
+KIND_NUMERIC_TEXT = 3
+KIND_TEXT = 4
+KIND_DATETIME = 5
+KIND_OTHER = 6
+
+def is_excel_file(file):
+    """Whether a path is an Excel workbook ingest should profile (skipping Office lock files)"""
+    return file.is_file() and file.name.endswith('.xlsx') and not file.name.startswith('~')
+
+def is_csv_file(file):
+    """Whether a path is a CSV file, or another delimited text file like TSV, ingest should profile"""
+    return file.is_file() and file.suffix.lower() in DELIMITED_EXTENSIONS
+
+def is_json_file(file):
+    """Whether a path is a JSON or JSON lines file ingest should profile"""
+    return file.is_file() and file.suffix.lower() in JSON_EXTENSIONS
+
+def stats_rows():
+    """Rows scanned per file for column statistics, or 0 if COLUMN_STATS is off"""
+    return STATS_MAX_ROWS if COLUMN_STATS else 0
+
+def scan_window(max_rows_scan):
+    """Number of raw rows needed to score every candidate header row"""
+
+    # Candidate i is followed by up to max_rows_scan + 1 data rows
+    return 2 * max_rows_scan + 2
+
+def cell_kind(value):
+    """Classifies a single parsed cell value"""
+
+    if pd.isna(value):
+        return KIND_NA
+    if isinstance(value, (bool, np.bool_)):
+        return KIND_BOOL
+    if isinstance(value, numbers.Number):
+        return KIND_NUMERIC
+    if isinstance(value, str):
+        try:
+            float(value)
+        except ValueError:
+            return KIND_TEXT
+        return KIND_NUMERIC_TEXT
+    if isinstance(value, datetime):
+        return KIND_DATETIME
+    return KIND_OTHER
+
+def cell_kinds_csv(block):
+    """Returns a matrix of cell kinds for a block of raw CSV strings"""
+
+    is_na = block.isna().to_numpy()
+    is_numeric = block.apply(pd.to_numeric, errors='coerce').notna().to_numpy()
+
+    return np.where(is_na, KIND_NA, np.where(is_numeric, KIND_NUMERIC, KIND_TEXT)).astype(np.int8)
+
+def cell_kinds_excel(block):
+    """Returns a matrix of cell kinds for a block of parsed Excel cells"""
+
+    kinds = np.empty(block.shape, dtype=np.int8)
+    for j, (_, col) in enumerate(block.items()):
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            kinds[:, j] = np.where(col.isna(), KIND_NA, KIND_NUMERIC)
+        else:
+            kinds[:, j] = [cell_kind(value) for value in col]
+
+    return kinds
+
+def count_type_consistent(kinds, mixed_is_uniform):
+    """
+    Counts the columns pandas would load with a single type per cell.
+    A column whose cells are all numbers, booleans or numeric text loads as numeric,
+    so it stays consistent even with missing values.
+    Any other column with missing values mixes in float NaNs.
+    CSV columns mixing text and numbers load as all strings (mixed_is_uniform=True),
+    while Excel cells keep their own types.
+    """
+
+    if len(kinds) == 0:
+        return 0
+
+    has_na = (kinds == KIND_NA).any(axis=0)
+    all_numeric = (kinds <= KIND_NUMERIC_TEXT).all(axis=0)
+    if mixed_is_uniform:
+        uniform = ~has_na
+    else:
+        kinds = np.where(kinds == KIND_NUMERIC_TEXT, KIND_TEXT, kinds)
+        uniform = ~has_na & (kinds.min(axis=0) == kinds.max(axis=0))
+
+    return int((all_numeric | uniform).sum())
+
+def is_empty_cell(value):
+    """Whether a raw header cell is empty, so that pandas names its column 'Unnamed: j'"""
+    return value is None or value == '' or (isinstance(value, float) and np.isnan(value))
+
+def find_best_header_row(block, kinds, max_rows_scan, mixed_is_uniform):
+    """
+    Scores every candidate header row of an un-headered block and returns the 'best' one.
+    :param block: the raw block, so header cells like 'NA' count as names, as they do for pandas
+    :param kinds: cell kinds of the block with missing values masked (see mask_missing)
+    """
 
     min_score = float('inf')
     best_header_row = None
 
-    try:
-        df = pd.read_excel(file, sheet_name)
-    except FileNotFoundError:
-        logging.error(f'Could not find {file}')
-        return None
-
-    n_rows_search = min(len(df)-1, max_rows_scan)
+    n_rows_search = min(len(block) - 2, max_rows_scan)
 
     for i in range(n_rows_search):
-        df = pd.read_excel(file, sheet_name, header=i, nrows=n_rows_search+1)
-
-        columns = df.columns.tolist()
-        num_unnamed = sum('unnamed' in str(name).lower() for name in columns)
-        num_unique = len(set(columns))
-        type_consistency = sum(df[col].apply(type).nunique() == 1 for col in df.columns)
+        columns = block.iloc[i].tolist()
+        num_unnamed = sum(is_empty_cell(name) or 'unnamed' in str(name).lower() for name in columns)
+        # pandas de-duplicates repeated names ('a', 'a.1'), so every column is unique
+        num_unique = len(columns)
+        type_consistency = count_type_consistent(kinds[i+1:i+n_rows_search+2], mixed_is_uniform)
 
         total_score = num_unnamed - num_unique - type_consistency
 
@@ -37,126 +161,513 @@ def find_header_row_excel(file, max_rows_scan, sheet_name):
 
     return best_header_row
 
-def summarize_excels(data_folder, max_rows_scan, max_cols_summary):
-    """Summarize all Excel files in the data folder"""
+def mask_missing(block):
+    """A raw block with the cells pandas reads as missing ('', 'NA', 'null', ...) set to NaN"""
+    return block.mask(block.isna() | block.isin(NA_VALUES))
+
+def header_columns(block, header_row):
+    """
+    Returns the column names pandas assigns when reading with header=header_row.
+    :param block: the raw block, so names like 'NA' stay names
+    """
+
+    columns = []
+    unnamed = []
+    for j, name in enumerate(block.iloc[header_row].tolist()):
+        if is_empty_cell(name):
+            name = f'Unnamed: {j}'
+            unnamed.append(j)
+        columns.append(name)
+
+    # Same de-duplication as pandas' parsers, named columns first:
+    # 'a', 'a', 'a.1' -> 'a', 'a.2', 'a.1'
+    counts = defaultdict(int)
+    for j in [j for j in range(len(columns)) if j not in unnamed] + unnamed:
+        name = original = columns[j]
+        count = counts[name]
+        while count > 0:
+            counts[original] = count + 1
+            name = f'{original}.{count}'
+            count = count + 1 if name in columns else counts[name]
+        columns[j] = name
+        counts[name] = count + 1
+
+    return columns
+
+def read_header_block_excel(xls, max_rows_scan, sheet_name):
+    """
+    Reads the un-headered scan block of an Excel sheet as raw cells (see mask_missing),
+    or None if the file is missing.
+    :param xls: path of the workbook, or a pd.ExcelFile already open on it
+    """
 
-    files = [file for file in data_folder.glob('*') if file.is_file() and file.name.endswith('.xlsx') and not file.name.startswith('~')]
+    try:
+        with span('ingest.header_scan', sheet=sheet_name):
+            return pd.read_excel(xls, sheet_name, header=None, nrows=scan_window(max_rows_scan), dtype=object,
+                                 keep_default_na=False)
+    except FileNotFoundError:
+        logging.error(f'Could not find {xls}')
+        return None
 
-    summary = defaultdict(dict)
-    for file in files:
+def find_header_row_excel(file, max_rows_scan, sheet_name):
+    """Returns the 'best' header row for an Excel file (a path or an open pd.ExcelFile)"""
+
+    block = read_header_block_excel(file, max_rows_scan, sheet_name)
+    if block is None:
+        return None
+
+    return find_best_header_row(block, cell_kinds_excel(mask_missing(block)), max_rows_scan, mixed_is_uniform=False)
+
+def profile_excel_sheet(xls, sheet_name, max_rows_scan, max_cols_summary, columnar=None, file=None):
+    """
+    Returns the header row and columns of one sheet in an Excel file (a path or an open pd.ExcelFile).
+    With columnar set to a columnar_cache format, the sheet is also saved as a sidecar ('fast path')
+    named after file, the workbook's path (defaults to xls).
+    """
 
-        xls = pd.ExcelFile(file)
-        for sheet_name in xls.sheet_names:
-            summary[file][sheet_name] = {}
+    summary = {}
 
-            summary[file][sheet_name]['header row'] = find_header_row_excel(file, max_rows_scan, sheet_name)
+    block = read_header_block_excel(xls, max_rows_scan, sheet_name)
+    if block is None:
+        summary['header row'] = None
+        return summary
 
-            if summary[file][sheet_name]['header row'] is not None:
+    cells = mask_missing(block)
+    summary['header row'] = find_best_header_row(block, cell_kinds_excel(cells), max_rows_scan, mixed_is_uniform=False)
+
+    if summary['header row'] is not None:
+        columns = header_columns(block, summary['header row'])
+        summary['columns'] = columns[:max_cols_summary] if len(columns) > max_cols_summary else columns
+
+        if columnar is not None:
+            header_row = summary['header row']
+            with span('ingest.columnar', sheet=sheet_name, format=columnar):
+                fast_path = columnar_cache.convert(
+                    lambda: pd.read_excel(xls, sheet_name, header=header_row), file if file is not None else xls, sheet_name, columnar)
+            if fast_path is not None:
+                summary['fast path'] = fast_path
+
+    return summary
+
+def profile_excel(file, max_rows_scan, max_cols_summary, columnar=None):
+    """
+    Returns the header row and columns of every sheet in an Excel file.
+    The workbook is opened once (read-only) and shared by every sheet.
+    """
+
+    with CountingFile(file) as handle, pd.ExcelFile(handle) as xls:
+        summary = {
+            sheet_name: profile_excel_sheet(xls, sheet_name, max_rows_scan, max_cols_summary, columnar, file)
+            for sheet_name in xls.sheet_names
+        }
+        count(bytes=handle.bytes_read)
+        return summary
+
+class ProfileTimeout(Exception):
+    """Raised inside a worker when profiling one file takes too long"""
+
+def _raise_profile_timeout(signum, frame):
+    raise ProfileTimeout('Profiling timed out')
+
+def file_bytes(file):
+    try:
+        return os.path.getsize(file)
+    except OSError:
+        return 0
+
+class CountingFile(io.FileIO):
+    """A binary file that counts the bytes read from it, for readers that seek around, like openpyxl"""
+
+    def __init__(self, file):
+        super().__init__(file, 'rb')
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data or b'')
+        return data
+
+    def readall(self):
+        data = super().readall()
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        read = super().readinto(buffer)
+        self.bytes_read += read or 0
+        return read
+
+def can_use_alarm():
+    """Whether this thread can enforce a timeout with SIGALRM: only the main thread, and not on Windows"""
+    return hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread()
+
+def run_profile_task(label, func, args, timeout):
+    """
+    Runs one profiling task, returning (result, error message, spans).
+    The timeout is enforced with SIGALRM, so only when can_use_alarm(); elsewhere the task runs
+    without one (run_profile_tasks sends such tasks to a worker process, where it can be enforced).
+    The task's tracing spans are returned rather than recorded, since it may run in a worker process;
+    its 'ingest.file' span adds up the bytes its stages read from the file.
+    """
+
+    use_alarm = timeout is not None and can_use_alarm()
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_profile_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    with TRACER.capture() as spans:
+        try:
+            with span('ingest.file', file=label) as file_span:
+                result = func(*args)
+                file_span.add(bytes=sum(record.get('bytes', 0) for record in spans))
+                return result, None, spans
+        except Exception as err:
+            return None, f'{type(err).__name__}: {err}', spans
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+
+def run_profile_tasks(tasks, workers, timeout, progress=None):
+    """
+    Runs profiling tasks, in a process pool when workers > 1 and there are several tasks,
+    or when this thread cannot enforce the timeout (see can_use_alarm), e.g. in the summary
+    provider's threads. Results come back in task order; a failed task is logged and yields None.
+    :param tasks: list of (label, func, args) tuples
+    :param workers: number of worker processes, or 0 to run every task in this process, where
+        the timeout is only enforced on the main thread, and never on Windows
+    :param timeout: per-task timeout in seconds, or None
+    :param progress: optional callable(done, total) called as tasks finish
+    """
+
+    outcomes = [None] * len(tasks)
+
+    needs_worker = timeout is not None and not can_use_alarm() and hasattr(signal, 'SIGALRM')
+    if tasks and workers > 0 and (len(tasks) > 1 and workers > 1 or needs_worker):
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = {
+                executor.submit(run_profile_task, label, func, args, timeout): i
+                for i, (label, func, args) in enumerate(tasks)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
                 try:
-                    df = pd.read_excel(file, sheet_name, header=summary[file][sheet_name]['header row'])
-                    columns = df.columns.to_list()
-                    del df
+                    outcomes[futures[future]] = future.result()
+                except Exception as err:  # e.g. a worker process died
+                    outcomes[futures[future]] = (None, f'{type(err).__name__}: {err}', [])
+                if progress is not None:
+                    progress(done, len(tasks))
+    else:
+        for i, (label, func, args) in enumerate(tasks):
+            outcomes[i] = run_profile_task(label, func, args, timeout)
+            if progress is not None:
+                progress(i + 1, len(tasks))
+
+    results = []
+    for (label, _, _), (result, error, spans) in zip(tasks, outcomes):
+        TRACER.adopt(spans)
+        if error is not None:
+            logging.error(f'Skipping {label}: {error}')
+        results.append(result)
+
+    return results
+
+@traced('ingest.xlsx')
+def summarize_excels(data_folder, max_rows_scan, max_cols_summary, cache=None, workers=1, progress=None, columnar=None):
+    """Summarize all Excel files in the data folder, reusing cached summaries of unchanged files"""
+
+    files = sorted(file for file in data_folder.glob('*') if is_excel_file(file))
+    settings = (max_rows_scan, max_cols_summary, columnar)
 
-                    summary[file][sheet_name]['columns'] = columns[:max_cols_summary] if len(columns) > max_cols_summary else columns
+    summary = defaultdict(dict)
+    tasks = []
+    for file in files:
+        cached = cache.get(file, settings) if cache is not None else None
+        if cached is not None and columnar_cache.sidecars_present(cached, is_excel=True):
+            summary[file] = cached
+            count(cache_hits=1)
+            continue
+        count(cache_misses=1)
+
+        summary[file] = {}
+        tasks.append((str(file), profile_excel, (file, max_rows_scan, max_cols_summary, columnar)))
 
-                except pd.errors.ParserError as err:
-                    logging.error(f'Error parsing {file}: {err}')
+    for (_, _, (file, *_)), result in zip(tasks, run_profile_tasks(tasks, workers, FILE_TIMEOUT, progress)):
+        if result is None:
+            del summary[file]
+            continue
+
+        summary[file] = result
+        if cache is not None:
+            cache.put(file, settings, result)
 
     return summary
 
-def find_header_row_csv(file, max_rows_scan):
-    """Returns the 'best' header row for a CSV file"""
-    
-    min_score = float('inf')
-    best_header_row = None
+def read_header_block_csv(file, max_rows_scan, delimiter=','):
+    """
+    Reads the un-headered scan block of a CSV file as raw strings (see mask_missing),
+    or None if the file is missing.
+    Rows are padded to the widest one, so title lines above the header (with fewer fields than it)
+    do not fail the read, and blank lines are skipped like pandas does, so row i is header=i.
+    """
 
+    rows = []
     try:
-        df = pd.read_csv(file)
+        with span('ingest.header_scan'):
+            with open(file, 'r', newline='', encoding='utf-8-sig', errors='replace') as handle:
+                for row in csv.reader(handle, delimiter=delimiter):
+                    if len(row) > 1 or (row and row[0].strip()):
+                        rows.append(row)
+                    if len(rows) == scan_window(max_rows_scan):
+                        break
+                count(bytes=handle.buffer.tell())
     except FileNotFoundError:
         logging.error(f'Could not find {file}')
         return None
 
-    n_rows_search = min(len(df)-1, max_rows_scan)
+    width = max((len(row) for row in rows), default=0)
+    return pd.DataFrame([row + [None] * (width - len(row)) for row in rows], dtype=object)
 
-    for i in range(n_rows_search):
-        df = pd.read_csv(file, header=i, nrows=n_rows_search+1)
+def find_header_row_csv(file, max_rows_scan):
+    """Returns the 'best' header row for a CSV file"""
 
-        columns = df.columns.tolist()
-        num_unnamed = sum('unnamed' in str(name).lower() for name in columns)
-        num_unique = len(set(columns))
-        type_consistency = sum(df[col].apply(type).nunique() == 1 for col in df.columns)
+    block = read_header_block_csv(file, max_rows_scan, streaming_profiler.sniff_delimiter(file, default_delimiter(file)))
+    if block is None:
+        return None
 
-        total_score = num_unnamed - num_unique - type_consistency
+    return find_best_header_row(block, cell_kinds_csv(mask_missing(block)), max_rows_scan, mixed_is_uniform=True)
 
-        if total_score < min_score:
-            min_score = total_score
-            best_header_row = i
+def default_delimiter(file):
+    return ',' if Path(file).suffix.lower() == '.csv' else '\t'
 
-    return best_header_row
+def profile_csv(file, max_rows_scan, max_cols_summary, columnar=None, stats_rows=0):
+    """
+    Returns the header row and columns of a CSV or other delimited text file, and its delimiter if not a comma.
+    With columnar set to a columnar_cache format, the file is also saved as a sidecar ('fast path').
+    With stats_rows, up to that many rows are scanned in chunks for column statistics ('stats').
+    """
+
+    summary = {}
+
+    delimiter = streaming_profiler.sniff_delimiter(file, default_delimiter(file))
+    if delimiter != ',':
+        summary['delimiter'] = delimiter
+
+    block = read_header_block_csv(file, max_rows_scan, delimiter)
+    if block is None:
+        summary['header row'] = None
+        return summary
 
-def summarize_csvs(data_folder, max_rows_scan, max_cols_summary):
+    cells = mask_missing(block)
+    summary['header row'] = find_best_header_row(block, cell_kinds_csv(cells), max_rows_scan, mixed_is_uniform=True)
 
-    files = [file for file in data_folder.glob('*') if file.is_file() and file.name.endswith('.csv')]
+    if summary['header row'] is not None:
+        columns = header_columns(block, summary['header row'])
+        summary['columns'] = columns[:max_cols_summary] if len(columns) > max_cols_summary else columns
+
+        header_row = summary['header row']
+        if stats_rows:
+            with span('ingest.stats'):
+                stats = streaming_profiler.profile_delimited(file, header_row, delimiter, stats_rows, max_cols_summary)
+            if stats is not None:
+                summary['stats'] = stats
+
+        if columnar is not None:
+            with span('ingest.columnar', format=columnar):
+                fast_path = columnar_cache.convert(lambda: pd.read_csv(file, header=header_row, sep=delimiter), file, None, columnar)
+                count(bytes=file_bytes(file))
+            if fast_path is not None:
+                summary['fast path'] = fast_path
+
+    return summary
+
+def profile_json(file, max_rows_scan, max_cols_summary, columnar=None, stats_rows=0):
+    """
+    Returns the format ('json lines' or 'json') and columns of a JSON file, in the same form as profile_csv.
+    JSON has no header row to find, so the columns come from the statistics scan, which runs
+    even with stats_rows 0 (over the first max_rows_scan records) but is only kept with stats_rows.
+    """
+
+    try:
+        with span('ingest.stats'):
+            lines, stats = streaming_profiler.profile_json(file, stats_rows or max_rows_scan, max_cols_summary)
+    except FileNotFoundError:
+        logging.error(f'Could not find {file}')
+        return None
+    if stats is None:
+        return None
+
+    summary = {'format': 'json lines' if lines else 'json', 'columns': list(stats['columns'])}
+    if stats_rows:
+        summary['stats'] = stats
+
+    if columnar is not None:
+        with span('ingest.columnar', format=columnar):
+            fast_path = columnar_cache.convert(lambda: pd.read_json(file, lines=lines), file, None, columnar)
+            count(bytes=file_bytes(file))
+        if fast_path is not None:
+            summary['fast path'] = fast_path
+
+    return summary
+
+def profile_text_file(file, max_rows_scan, max_cols_summary, columnar=None, stats_rows=0):
+    """profile_json or profile_csv, depending on the file's extension"""
+    profile = profile_json if is_json_file(file) else profile_csv
+    return profile(file, max_rows_scan, max_cols_summary, columnar, stats_rows)
+
+@traced('ingest.csv')
+def summarize_csvs(data_folder, max_rows_scan, max_cols_summary, cache=None, workers=1, progress=None, columnar=None,
+                   stats_rows=0):
+    """Summarize all CSV, TSV and JSON files in the data folder, reusing cached summaries of unchanged files"""
+
+    files = sorted(file for file in data_folder.glob('*') if is_csv_file(file) or is_json_file(file))
+    settings = (max_rows_scan, max_cols_summary, columnar, stats_rows)
 
     summary = defaultdict(dict)
+    tasks = []
     for file in files:
-        summary[file]['header row'] = find_header_row_csv(file, max_rows_scan)
+        cached = cache.get(file, settings) if cache is not None else None
+        if cached is not None and columnar_cache.sidecars_present(cached, is_excel=False):
+            summary[file] = cached
+            count(cache_hits=1)
+            continue
+        count(cache_misses=1)
 
-        if summary[file]['header row'] is not None:
-            try:
-                df = pd.read_csv(file, header=summary[file]['header row'])
-                columns = df.columns.to_list()
-                del df
+        summary[file] = {}
+        tasks.append((str(file), profile_text_file, (file, max_rows_scan, max_cols_summary, columnar, stats_rows)))
+
+    for (_, _, (file, *_)), result in zip(tasks, run_profile_tasks(tasks, workers, FILE_TIMEOUT, progress)):
+        if result is None:
+            del summary[file]
+            continue
 
-                summary[file]['columns'] = columns[:max_cols_summary] if len(columns) > max_cols_summary else columns
+        summary[file] = result
+        if cache is not None:
+            cache.put(file, settings, result)
 
-            except pd.errors.ParserError as e:
-                logging.error(f'Error parsing {file}: {e}')
-                
     return summary
 
-def get_summary():
-    logging.basicConfig(filename='summary.log', level=logging.INFO)
+@traced('ingest')
+def summarize_data_folder(progress=None):
+    """
+    Summarizes the CSV, TSV, JSON and Excel files in DATA_FOLDER through the metadata cache.
+    TSV and JSON files are part of csv_summary.
+    :param progress: optional callable(kind, done, total), kind being 'CSV' or 'XLSX'
+    :return: (csv_summary, xlsx_summary)
+    """
+
+    cache = MetadataCache(use_content_hash=USE_CONTENT_HASH)
+    columnar = columnar_format()
+    # A profiler only sees its own process, so profiled runs parse the files here, without timeouts
+    # when called from a thread (see run_profile_tasks)
+    workers = INGEST_WORKERS if INGEST_PROFILER is None else 0
+
+    csv_progress = (lambda done, total: progress('CSV', done, total)) if progress is not None else None
+    xlsx_progress = (lambda done, total: progress('XLSX', done, total)) if progress is not None else None
+
+    with profiled('ingest', INGEST_PROFILER):
+        csv_summary = summarize_csvs(DATA_FOLDER, MAX_ROWS_SCAN, MAX_COLS_SUMMARY, cache, workers, csv_progress, columnar,
+                                     stats_rows())
+        xlsx_summary = summarize_excels(DATA_FOLDER, MAX_ROWS_SCAN, MAX_COLS_SUMMARY, cache, workers, xlsx_progress, columnar)
+
+    cache.evict_missing()
+    try:
+        cache.save()
+    except OSError as err:
+        logging.error(f'Could not write metadata cache: {err}')
+    columnar_cache.prune((csv_summary, xlsx_summary))
 
-    _csv_summary = summarize_csvs(DATA_FOLDER, MAX_ROWS_SCAN, MAX_COLS_SUMMARY)
-    csv_summary = ''
-    for i, (key, val) in enumerate(dict(_csv_summary).items()):
-        if i != len(dict(_csv_summary)) - 1:
-            csv_summary += f"'{str(key)}'" + ': ' + str(val) + ', '
-        else:
-            csv_summary += f"'{str(key)}'" + ': ' + str(val)
-    csv_summary = '{' + csv_summary + '}'
-
-    _xlsx_summary = summarize_excels(DATA_FOLDER, MAX_ROWS_SCAN, MAX_COLS_SUMMARY)
-    xlsx_summary = ''
-    for i, (key, val) in enumerate(dict(_xlsx_summary).items()):
-        if i != len(dict(_xlsx_summary)) - 1:
-            xlsx_summary += f"'{str(key)}'" + ': ' + str(val) + ', '
-        else:
-            xlsx_summary += f"'{str(key)}'" + ': ' + str(val)
-    xlsx_summary = '{' + xlsx_summary + '}'
+    return csv_summary, xlsx_summary
 
-    summary = "{'CSV': " + csv_summary + ', ' + "'XLSX': " + xlsx_summary + '}'
-    summary = eval(summary)
+def columnar_format():
+    """The sidecar format ingest writes, or None if USE_COLUMNAR_CACHE is off"""
+    return columnar_cache.default_format() if USE_COLUMNAR_CACHE else None
 
-    return summary
+def snapshot_data_folder(data_folder=DATA_FOLDER):
+    """Returns {file: (size, mtime_ns)} for every file ingest profiles in the data folder"""
 
-def get_natural_language_summary():
-    _csv_summary = summarize_csvs(DATA_FOLDER, MAX_ROWS_SCAN, MAX_COLS_SUMMARY)
-    csv_summary = ''
-    for key, val in dict(_csv_summary).items():
-        csv_summary += f"The file {key} has columns {val['columns']}. For this file, {key}, use header = {val['header row']}.\n"
-        csv_summary += '\n'
-    
-    _xlsx_summary = summarize_excels(DATA_FOLDER, MAX_ROWS_SCAN, MAX_COLS_SUMMARY)
-    xlsx_summary = ''
-    for key, val in dict(_xlsx_summary).items():
-        if len(val.keys()) > 1: # More than one sheet
-            xlsx_summary += f'The file {key} has sheets named {list(val.keys())}.\n'
-        else:
-            xlsx_summary += f'The file {key} has a sheet named {val.keys()[0]}'
-        for sheet_name, subdict in val.items():
-            xlsx_summary += f"The sheet called {sheet_name} has columns {subdict['columns']}. For sheet {sheet_name}, use header = {subdict['header row']}.\n"
-        xlsx_summary += '\n'
-    
-    return csv_summary + xlsx_summary
+    snapshot = {}
+    for file in data_folder.glob('*'):
+        if is_csv_file(file) or is_json_file(file) or is_excel_file(file):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:  # removed since listing
+                continue
+            snapshot[file] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+@traced('ingest.update')
+def update_data_folder_summary(summaries, changed, removed):
+    """
+    Re-profiles only the changed files and drops the removed ones.
+    :param summaries: (csv_summary, xlsx_summary) from summarize_data_folder
+    :param changed: files that were added or modified
+    :param removed: files that no longer exist
+    :return: new (csv_summary, xlsx_summary), leaving the given ones untouched
+    """
+
+    csv_summary = dict(summaries[0])
+    xlsx_summary = dict(summaries[1])
+
+    for file in removed:
+        csv_summary.pop(file, None)
+        xlsx_summary.pop(file, None)
+
+    columnar = columnar_format()
+    text_settings = (MAX_ROWS_SCAN, MAX_COLS_SUMMARY, columnar, stats_rows())
+    excel_settings = (MAX_ROWS_SCAN, MAX_COLS_SUMMARY, columnar)
+    tasks = []
+    for file in sorted(changed):
+        if is_csv_file(file) or is_json_file(file):
+            tasks.append((str(file), profile_text_file, (file, *text_settings)))
+        elif is_excel_file(file):
+            tasks.append((str(file), profile_excel, (file, *excel_settings)))
+
+    cache = MetadataCache(use_content_hash=USE_CONTENT_HASH)
+    for (_, func, (file, *settings)), result in zip(tasks, run_profile_tasks(tasks, INGEST_WORKERS, FILE_TIMEOUT)):
+        summary = csv_summary if func is profile_text_file else xlsx_summary
+        if result is None:
+            summary.pop(file, None)
+            continue
+
+        summary[file] = result
+        try:
+            cache.put(file, settings, result)
+        except FileNotFoundError:  # removed while being profiled
+            pass
+
+    cache.evict_missing()
+    try:
+        cache.save()
+    except OSError as err:
+        logging.error(f'Could not write metadata cache: {err}')
+    columnar_cache.prune((csv_summary, xlsx_summary))
+
+    return (
+        defaultdict(dict, sorted(csv_summary.items())),
+        defaultdict(dict, sorted(xlsx_summary.items())),
+    )
+
+def build_summary(summaries=None):
+    """
+    Returns the typed DataSummary of the data folder, which every summary format is serialized from.
+    :param summaries: (csv_summary, xlsx_summary) already computed by summarize_data_folder,
+        or None to compute them now
+    """
+    return DataSummary.from_summaries(summaries if summaries is not None else summarize_data_folder())
+
+def get_summary(summaries=None):
+    """
+    Returns the structured summary {'CSV': {...}, 'XLSX': {...}}.
+    :param summaries: (csv_summary, xlsx_summary) already computed by summarize_data_folder,
+        or None to compute them now
+    """
+    logging.basicConfig(filename='summary.log', level=logging.INFO)
+    return build_summary(summaries).to_dict()
+
+def get_natural_language_summary(summaries=None):
+    """
+    Returns the summary as prose for the data viz system description.
+    :param summaries: (csv_summary, xlsx_summary) already computed by summarize_data_folder,
+        or None to compute them now
+    """
+    return build_summary(summaries).to_prompt()
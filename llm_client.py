@@ -0,0 +1,205 @@
+import os
+import time
+import random
+import threading
+from dataclasses import dataclass
+
+import openai
+from dotenv import load_dotenv
+
+import tracing
+
+# (requests per minute, tokens per minute) per model; tune these to your account's quota
+RATE_LIMITS = {
+    'gpt-4': (200, 40000),
+    'gpt-3.5-turbo': (3500, 90000),
+}
+DEFAULT_RATE_LIMIT = (200, 40000)
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0  # seconds before the first retry, doubled for every further retry
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = 120  # seconds
+COMPLETION_TOKEN_ESTIMATE = 800  # tokens reserved for the answer before its real size is known
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+def configure_openai():
+    """Set the OpenAI API key from the environment or the .env file"""
+    load_dotenv()
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+
+@dataclass
+class CompletionFailure:
+    """Returned instead of a response when an API call could not be completed"""
+    model: str
+    reason: str
+    attempts: int
+    cancelled: bool = False
+
+    def __str__(self):
+        if self.cancelled:
+            return f'Request to {self.model} was cancelled.'
+        return f'Could not access the API at this time ({self.model}: {self.reason}, after {self.attempts} attempt(s)).'
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self, amount, now):
+        """
+        Takes amount from the bucket, possibly going into debt.
+        :return: seconds to wait before the reservation may be used
+        """
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= min(amount, self.capacity)
+        wait = -self.level / self.rate if self.level < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def refund(self, amount):
+        """Gives back (or, if negative, takes) tokens after the real cost is known"""
+        self.level = min(self.capacity, self.level + amount)
+
+class RateLimiter:
+    """
+    Per-model request and token rate limiting shared by every thread in the process.
+    A 429 from the API blocks the model for everyone, so concurrent sessions back off together.
+    """
+
+    def __init__(self, limits=RATE_LIMITS, default=DEFAULT_RATE_LIMIT):
+        self.limits = limits
+        self.default = default
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _model_buckets(self, model):
+        if model not in self._buckets:
+            requests_per_minute, tokens_per_minute = self.limits.get(model, self.default)
+            self._buckets[model] = (TokenBucket(requests_per_minute), TokenBucket(tokens_per_minute))
+        return self._buckets[model]
+
+    def acquire(self, model, tokens, cancel=None):
+        """
+        Waits until a request of the given size may be sent.
+        :return: False if cancel was set while waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            requests, token_bucket = self._model_buckets(model)
+            wait = max(requests.reserve(1, now), token_bucket.reserve(tokens, now))
+        return wait_or_cancel(wait, cancel)
+
+    def record_usage(self, model, estimated, actual):
+        """Corrects the token bucket once the API reports how many tokens a request used"""
+        with self._lock:
+            self._model_buckets(model)[1].refund(estimated - actual)
+
+    def penalize(self, model, delay):
+        """Blocks every request to a model for delay seconds"""
+        with self._lock:
+            until = time.monotonic() + delay
+            for bucket in self._model_buckets(model):
+                bucket.blocked_until = max(bucket.blocked_until, until)
+
+RATE_LIMITER = RateLimiter()
+
+def wait_or_cancel(delay, cancel=None):
+    """
+    Sleeps for delay seconds, waking up early if cancel is set.
+    :return: False if cancelled
+    """
+    if delay <= 0:
+        return cancel is None or not cancel.is_set()
+    if cancel is None:
+        time.sleep(delay)
+        return True
+    return not cancel.wait(delay)
+
+def estimate_tokens(messages):
+    """Rough token count of a request: about four characters per token, plus room for the answer"""
+    return sum(len(message['content']) for message in messages) // 4 + COMPLETION_TOKEN_ESTIMATE
+
+def is_retryable(err):
+    """Whether an API error is worth retrying (rate limits, timeouts, connection and server errors)"""
+    if isinstance(err, openai.error.APIError):
+        return err.http_status is None or err.http_status >= 500
+    return isinstance(err, RETRYABLE_ERRORS)
+
+def retry_after(err):
+    """Seconds the API asked us to wait, if it said so"""
+    headers = getattr(err, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after', headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, err=None):
+    """Exponential backoff with jitter for the given (1-based) retry, honouring Retry-After"""
+    cap = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    delay = cap / 2 + random.uniform(0, cap / 2)
+    requested = retry_after(err) if err is not None else None
+    return max(delay, requested) if requested is not None else delay
+
+def describe_error(err):
+    return f'{type(err).__name__}: {err}'
+
+def create_completion(model, messages, stream=False, cancel=None, limiter=RATE_LIMITER, attempts=0):
+    """
+    Call openai.ChatCompletion.create within the rate limits, retrying transient errors
+    with jittered exponential backoff.
+    :param model: model to use in API call
+    :param messages: the chat messages
+    :param stream: whether to stream the answer
+    :param cancel: optional threading.Event that aborts waiting and retrying
+    :param limiter: the RateLimiter to go through
+    :param attempts: attempts already spent on this request, e.g. by a stream that broke off
+    :return: the response (an iterator of chunks if streaming), or a CompletionFailure
+    """
+    estimated = estimate_tokens(messages)
+    while True:
+        waited = time.perf_counter()
+        acquired = limiter.acquire(model, estimated, cancel)
+        tracing.count(rate_limit_wait=round(time.perf_counter() - waited, 6))
+        if not acquired:
+            return CompletionFailure(model, 'cancelled', attempts, cancelled=True)
+
+        attempts += 1
+        tracing.count(api_calls=1)
+        try:
+            response = openai.ChatCompletion.create(
+                model=model,
+                messages=messages,
+                stream=stream,
+                request_timeout=REQUEST_TIMEOUT,
+            )
+        except openai.error.OpenAIError as err:
+            if not is_retryable(err) or attempts > MAX_RETRIES:
+                print(f'Could not access the API at this time. {describe_error(err)}')
+                return CompletionFailure(model, describe_error(err), attempts)
+
+            delay = backoff_delay(attempts, err)
+            if isinstance(err, openai.error.RateLimitError):
+                limiter.penalize(model, delay)
+            print(f'Encountered a {type(err).__name__}. Retrying in {delay:.1f} seconds.')
+            if not wait_or_cancel(delay, cancel):
+                return CompletionFailure(model, 'cancelled', attempts, cancelled=True)
+            continue
+
+        if not stream and 'usage' in response:
+            limiter.record_usage(model, estimated, response['usage']['total_tokens'])
+            tracing.count(prompt_tokens=response['usage']['prompt_tokens'],
+                          completion_tokens=response['usage']['completion_tokens'])
+        return response
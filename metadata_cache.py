@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+
+CACHE_DIR = Path('.cache')
+METADATA_CACHE_FILE = CACHE_DIR / 'metadata.json'
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+def file_hash(file):
+    """Returns the sha256 hex digest of a file's contents"""
+
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MetadataCache:
+    """
+    On-disk cache of per-file ingest summaries (header rows, columns, sheet names).
+    Entries are keyed by path and validated against the file's size and mtime.
+    With use_content_hash=True, a file whose size or mtime changed is hashed,
+    and its entry is kept if the contents are the same.
+    """
+
+    def __init__(self, path=METADATA_CACHE_FILE, use_content_hash=False):
+        self.path = Path(path)
+        self.use_content_hash = use_content_hash
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Loads the cache from disk, starting empty if it is missing or unreadable"""
+
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            logging.error(f'Could not read metadata cache {self.path}: {err}')
+            return
+
+        if data.get('version') == CACHE_VERSION:
+            self.entries = data.get('entries', {})
+
+    def save(self):
+        """Writes the cache to disk if anything changed"""
+
+        if not self.dirty:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': self.entries}, f, default=str)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def get(self, file, settings):
+        """
+        Returns the cached summary for a file, or None if it is missing or stale.
+        :param file: path of the data file
+        :param settings: ingest settings the summary was computed with
+        """
+
+        entry = self.entries.get(str(file))
+        if entry is None or entry['settings'] != list(settings):
+            return None
+
+        stat = os.stat(file)
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['summary']
+
+        if self.use_content_hash and entry.get('sha256') == file_hash(file):
+            entry['size'] = stat.st_size
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self.dirty = True
+            return entry['summary']
+
+        return None
+
+    def put(self, file, settings, summary):
+        """
+        Stores the summary for a file under its current fingerprint.
+        :param file: path of the data file
+        :param settings: ingest settings the summary was computed with
+        :param summary: JSON-serializable summary of the file
+        """
+
+        stat = os.stat(file)
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'settings': list(settings),
+            'summary': summary,
+        }
+        if self.use_content_hash:
+            entry['sha256'] = file_hash(file)
+
+        self.entries[str(file)] = entry
+        self.dirty = True
+
+    def evict_missing(self):
+        """Drops entries for files that no longer exist"""
+
+        missing = [key for key in self.entries if not os.path.exists(key)]
+        for key in missing:
+            del self.entries[key]
+        if missing:
+            self.dirty = True
@@ -0,0 +1,114 @@
+import re
+import math
+from collections import Counter, defaultdict
+
+TOP_K = 8  # files and sheets described in full in each prompt
+MAX_LISTED_FILES = 50  # other files only named, so the agent knows they exist
+NAME_BOOST = 2  # file and sheet names count this many times as much as column names
+MIN_SCORE = 0.5  # best search score below which a query is taken not to name any file, sheet or column
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens, also splitting camelCase and snake_case names.
+    A trailing plural 's' is dropped, so 'samples' matches 'Sample'.
+    """
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', str(text)).lower()
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class MetadataIndex:
+    """
+    TF-IDF index over the data folder summary, with one document per CSV file and
+    one per Excel sheet, made of the file name, sheet name and column names.
+    Queries go through an inverted index, so their cost depends on the query's
+    tokens rather than on the number of files.
+    """
+
+    def __init__(self, summaries):
+        """
+        :param summaries: (csv_summary, xlsx_summary) as returned by summarize_data_folder
+        """
+        csv_summary, xlsx_summary = summaries
+        self.summaries = summaries
+        self.documents = []  # (file, sheet name or None)
+        self.postings = defaultdict(list)  # token -> [(document, weight)]
+
+        term_counts = []
+        for file, summary in csv_summary.items():
+            term_counts.append(self.document_terms(file, None, summary))
+            self.documents.append((file, None))
+        for file, sheets in xlsx_summary.items():
+            for sheet_name, summary in sheets.items():
+                term_counts.append(self.document_terms(file, sheet_name, summary))
+                self.documents.append((file, sheet_name))
+
+        document_frequency = Counter(token for counts in term_counts for token in counts)
+        total = len(self.documents)
+        self.idf = {token: math.log((1 + total) / (1 + count)) + 1 for token, count in document_frequency.items()}
+
+        for document, counts in enumerate(term_counts):
+            weights = {token: (1 + math.log(count)) * self.idf[token] for token, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for token, weight in weights.items():
+                self.postings[token].append((document, weight / norm))
+
+    @staticmethod
+    def document_terms(file, sheet_name, summary):
+        stem = getattr(file, 'stem', str(file))
+        counts = Counter(tokenize(stem) * NAME_BOOST)
+        if sheet_name is not None:
+            counts.update(tokenize(sheet_name) * NAME_BOOST)
+        for column in summary.get('columns', []):
+            counts.update(tokenize(column))
+        return counts
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query, k=TOP_K):
+        """
+        Rank files and sheets by their relevance to a query.
+        :param query: free text, e.g. the user's message
+        :param k: number of results to return
+        :return: [(score, file, sheet name or None)], best first, only those with a positive score
+        """
+        counts = Counter(token for token in tokenize(query) if token in self.postings)
+        scores = defaultdict(float)
+        for token, count in counts.items():
+            query_weight = (1 + math.log(count)) * self.idf[token]
+            for document, weight in self.postings[token]:
+                scores[document] += query_weight * weight
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(score, *self.documents[document]) for document, score in best]
+
+def select_summaries(summaries, results):
+    """
+    Restrict summaries to the files and sheets in search results.
+    :return: (csv_summary, xlsx_summary) in the format of summarize_data_folder
+    """
+    csv_summary, xlsx_summary = summaries
+    selected_csv, selected_xlsx = {}, {}
+    for _, file, sheet_name in results:
+        if sheet_name is None:
+            selected_csv[file] = csv_summary[file]
+        else:
+            selected_xlsx.setdefault(file, {})[sheet_name] = xlsx_summary[file][sheet_name]
+    return selected_csv, selected_xlsx
+
+def list_other_files(summaries, selected, max_listed=MAX_LISTED_FILES):
+    """A sentence naming the files in summaries that are not in selected, so the agent can ask about them"""
+
+    selected_files = set(selected[0]) | set(selected[1])
+    others = sorted(str(file) for part in summaries for file in part if file not in selected_files)
+    if not others:
+        return ''
+    listed = ', '.join(others[:max_listed])
+    more = f', and {len(others) - max_listed} more' if len(others) > max_listed else ''
+    return f'The data folder also has these files, not described here: {listed}{more}.\n'
@@ -0,0 +1,487 @@
+import os
+import time
+import queue
+import threading
+import openai
+
+from llm_client import CompletionFailure, MAX_RETRIES, create_completion, describe_error, is_retryable
+from response_cache import ResponseCache, response_key, RESPONSE_CACHE_FILE
+from safety import analyze_code
+from conversation import ConversationManager, count_message_tokens, count_tokens
+from tracing import span, annotate, count
+
+def read_file_contents(filename):
+    """
+    Read the content of a file and return it as a string.
+    :param filename: The name of the file to read.
+    :return: The content of the file.
+    """
+    with open(filename, 'r') as file:
+        content = file.read().strip()  # strip() removes any leading/trailing whitespace including newline chars
+    return content
+
+# define the file paths
+AGENTS_DIR = 'agents'
+DATA_VIZ_SYSTEM_DESCRIPTION_FILE = os.path.join(
+    AGENTS_DIR, 'data_viz_agent.txt')
+ERROR_HANDLING_SYSTEM_DESCRIPTION_FILE =  os.path.join(
+    AGENTS_DIR, 'error_handling_agent.txt')
+CODE_SAFETY_SYSTEM_DESCRIPTION_FILE =  os.path.join(
+    AGENTS_DIR, 'code_safety_agent.txt')
+
+# read the descriptions from the files
+DATA_VIZ_SYSTEM_DESCRIPTION = read_file_contents(
+    DATA_VIZ_SYSTEM_DESCRIPTION_FILE)
+ERROR_HANDLING_SYSTEM_DESCRIPTION = read_file_contents(
+    ERROR_HANDLING_SYSTEM_DESCRIPTION_FILE)
+CODE_SAFETY_SYSTEM_DESCRIPTION = read_file_contents(
+    CODE_SAFETY_SYSTEM_DESCRIPTION_FILE)
+
+DATA_VIZ_MODEL = 'gpt-4'
+ERROR_HANDLING_MODEL = 'gpt-3.5-turbo'
+CODE_SAFETY_MODEL = 'gpt-3.5-turbo'
+
+STREAM = True
+
+# Classify code with the local static analyzer first; the code safety agent is only asked about ambiguous code
+STATIC_SAFETY_CHECK = True
+
+USE_RESPONSE_CACHE = True
+PERSIST_RESPONSE_CACHE = True
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+class PipelineCancelled(Exception):
+    """Raised inside the pipeline when the in-flight request is cancelled"""
+
+class AgentCallFailed(Exception):
+    """Raised inside the pipeline when an agent could not be reached"""
+
+    def __init__(self, failure):
+        super().__init__(str(failure))
+        self.failure = failure
+
+def check_completion(result):
+    """
+    Turn a CompletionFailure into the matching exception.
+    :param result: What get_response or stream_response returned.
+    :return: The result, if it is not a failure.
+    """
+    if isinstance(result, CompletionFailure):
+        if result.cancelled:
+            raise PipelineCancelled()
+        raise AgentCallFailed(result)
+    return result
+
+def trim_code(assistant_response):
+    """
+    Trim an assistant response down to its python code.
+    :param assistant_response: The text of the assistant's response.
+    :return: The code, without any leading preamble or trailing commentary.
+    """
+    assistant_lines = assistant_response.split('\n')
+
+    # Strip any leading preamble before import statements
+    idx = 0
+    for i, line in enumerate(assistant_lines):
+        if line.startswith('import ') or line.startswith('from '):
+            idx = i
+            break
+    assistant_lines = assistant_lines[idx:]
+
+    # Strip any trailing commentary after the ``` markdown closer
+    try:
+        end = assistant_lines.index('```')
+    except ValueError:
+        end = -1
+    if end != -1:
+        assistant_lines = assistant_lines[:end]
+
+    # Reassemble the content
+    assistant_response = '\n'.join(assistant_lines)
+
+    return assistant_response
+
+def process_openai_response(response):
+    """
+    Process the OpenAI response and return the assistant's response as a string.
+    :param response: The response from OpenAI API.
+    :return: The content from the assistant's response.
+    """
+    return trim_code(response.choices[0].message["content"])
+
+class CodeBlockTrimmer:
+    """
+    Follow a streamed assistant response and detect when its code block closes,
+    i.e. when a line that is exactly ``` arrives after the first import statement.
+    Everything after that point would be dropped by trim_code anyway.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.closed = False
+        self._code_started = False
+        self._scanned = 0  # offset of the first line not inspected yet
+
+    def feed(self, token):
+        """
+        Add a streamed piece of the response.
+        :param token: The new text.
+        :return: Whether the code block is now closed.
+        """
+        self.text += token
+        while not self.closed:
+            end = self.text.find('\n', self._scanned)
+            if end == -1:
+                break
+            line = self.text[self._scanned:end]
+            self._scanned = end + 1
+            if line.startswith('import ') or line.startswith('from '):
+                self._code_started = True
+            elif self._code_started and line == '```':
+                self.closed = True
+        return self.closed
+
+    def code(self):
+        """
+        :return: The code received so far, trimmed like process_openai_response.
+        """
+        return trim_code(self.text)
+
+def write_file(filename, content):
+    """
+    Write a given content to a file.
+    :param filename: The name of the file to write to.
+    :param content: The content to write to the file.
+    """
+    
+    with open(filename, 'w') as file:
+        file.write(content)
+
+def delete_files(*filenames):
+    """
+    Delete specified files.
+    :param filenames: File names to delete.
+    """
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except FileNotFoundError as err:
+            print(err)
+
+def build_messages(system_description: str, prev_msgs: list, msg: str):
+    """
+    Assemble the chat messages for an API call.
+    :param system_description: description to use in model configuration
+    :param prev_msgs: list of previous messages
+    :param msg: message to send as user this time
+    """
+    return [
+        {'role':'system', 'content':system_description},
+        *prev_msgs,
+        {'role':'user', 'content':msg}
+    ]
+
+def get_response(model: str, system_description: str, prev_msgs: list, msg: str, cancel=None):
+    """
+    Get a response from the openai API, within the rate limits and with retries (see llm_client)
+    :param model: model to use in API call
+    :param system_description: description to use in model configuration
+    :param prev_msgs: list of previous messages
+    :param msg: message to send as user this time
+    :param cancel: optional threading.Event that aborts waiting for the rate limiter or a retry
+    :return: the response, or a CompletionFailure
+    """
+    return create_completion(model, build_messages(system_description, prev_msgs, msg), cancel=cancel)
+
+def stream_response(model: str, system_description: str, prev_msgs: list, msg: str, on_token, trimmer=None, cancel=None):
+    """
+    Stream a response from the openai API, passing each piece of content to on_token as it arrives.
+    A stream that breaks off before its first token is retried like any other request.
+    :param model: model to use in API call
+    :param system_description: description to use in model configuration
+    :param prev_msgs: list of previous messages
+    :param msg: message to send as user this time
+    :param on_token: called with each new piece of the response
+    :param trimmer: optional CodeBlockTrimmer; the stream is abandoned as soon as its code block closes
+    :param cancel: optional threading.Event; the stream is abandoned and PipelineCancelled raised once it is set
+    :return: the text of the response, or a CompletionFailure
+    """
+    messages = build_messages(system_description, prev_msgs, msg)
+    for restarts in range(MAX_RETRIES + 1):
+        # Restarts count against the retry budget of the request itself
+        chunks = create_completion(model, messages, stream=True, cancel=cancel, attempts=restarts)
+        if isinstance(chunks, CompletionFailure):
+            return chunks
+
+        text = ''
+        started = time.perf_counter()
+        try:
+            for chunk in chunks:
+                if cancel is not None and cancel.is_set():
+                    chunks.close()
+                    raise PipelineCancelled()
+                token = chunk.choices[0].delta.get('content', '')
+                if not token:
+                    continue
+                if not text:
+                    annotate(first_token_seconds=round(time.perf_counter() - started, 6))
+                text += token
+                on_token(token)
+                if trimmer is not None and trimmer.feed(token):
+                    chunks.close()
+                    break
+            # Streamed responses carry no usage figures, so count the tokens ourselves
+            count(prompt_tokens=count_message_tokens(messages, model), completion_tokens=count_tokens(text, model))
+            annotate(tokens_estimated=True)
+            return text
+        except openai.error.OpenAIError as err:
+            # Tokens already shown cannot be taken back, so only retry a stream that produced nothing
+            if text or not is_retryable(err) or restarts == MAX_RETRIES:
+                return CompletionFailure(model, describe_error(err), restarts + 1)
+            print(f'Stream broke off with a {type(err).__name__}. Retrying.')
+
+def get_response_cache():
+    """
+    Return the shared response cache, creating it on first use.
+    :return: The ResponseCache, or None if USE_RESPONSE_CACHE is off.
+    """
+    global _response_cache
+    if not USE_RESPONSE_CACHE:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(path=RESPONSE_CACHE_FILE if PERSIST_RESPONSE_CACHE else None)
+        return _response_cache
+
+def ask_for_code(model: str, system_description: str, prev_msgs: list, msg: str, on_token, cancel=None):
+    """
+    Get python code from an agent, streaming it to on_token if STREAM is set.
+    Identical calls (same model, system description, conversation and message) are answered
+    from the response cache; for the error handling stage this means identical input code.
+    :return: The trimmed code.
+    """
+    cache = get_response_cache()
+    key = response_key(model, system_description, prev_msgs, msg)
+    if cache is not None:
+        code = cache.get(key)
+        if code is not None:
+            count(cache_hits=1)
+            on_token(code)
+            return code
+        count(cache_misses=1)
+
+    if STREAM:
+        trimmer = CodeBlockTrimmer()
+        check_completion(stream_response(model, system_description, prev_msgs, msg, on_token, trimmer, cancel))
+        with span('code.trim'):
+            code = trimmer.code()
+    else:
+        response = check_completion(get_response(model, system_description, prev_msgs, msg, cancel))
+        if cancel is not None and cancel.is_set():
+            raise PipelineCancelled()
+        with span('code.trim'):
+            code = process_openai_response(response)
+
+    if cache is not None and code:
+        cache.put(key, code)
+    return code
+
+def ask_for_text(model: str, system_description: str, prev_msgs: list, msg: str, on_token, cancel=None):
+    """
+    Get a plain text answer from an agent, streaming it to on_token if STREAM is set.
+    Identical calls are answered from the response cache, like ask_for_code.
+    :return: The text of the answer.
+    """
+    cache = get_response_cache()
+    key = response_key(model, system_description, prev_msgs, msg)
+    if cache is not None:
+        text = cache.get(key)
+        if text is not None:
+            count(cache_hits=1)
+            on_token(text)
+            return text
+        count(cache_misses=1)
+
+    if STREAM:
+        text = check_completion(stream_response(model, system_description, prev_msgs, msg, on_token, None, cancel))
+    else:
+        response = check_completion(get_response(model, system_description, prev_msgs, msg, cancel))
+        if cancel is not None and cancel.is_set():
+            raise PipelineCancelled()
+        text = response.choices[0].message["content"]
+
+    if cache is not None and text:
+        cache.put(key, text)
+    return text
+
+def build_data_viz_system_description(metadata_summary):
+    """
+    Fill the metadata summary into the data viz system description.
+    :param metadata_summary: The natural language summary of the data folder.
+    :return: The system description.
+    """
+    return DATA_VIZ_SYSTEM_DESCRIPTION.replace('[METADATA_SUMMARY]', str(metadata_summary))
+
+def check_code_safety(code: str, on_token, cancel=None):
+    """
+    Decide whether code is safe to run, with the static analyzer if STATIC_SAFETY_CHECK is set,
+    falling back to the code safety agent when its verdict is ambiguous.
+    :param code: The code to check.
+    :param on_token: Called with the code safety agent's answer as it streams in, if it is asked.
+    :param cancel: Optional threading.Event, passed on to the agent call.
+    :return: (safe, answer)
+    """
+    if STATIC_SAFETY_CHECK:
+        with span('safety.static') as static:
+            verdict = analyze_code(code)
+            static.set(verdict='ambiguous' if verdict.ambiguous else 'safe' if verdict.safe else 'dangerous')
+        if not verdict.ambiguous:
+            return verdict.safe, verdict.describe()
+        print(verdict.describe())
+
+    # Pass error-handling code to safety analyst
+    safety_response = ask_for_text(
+        CODE_SAFETY_MODEL, CODE_SAFETY_SYSTEM_DESCRIPTION, [], code, on_token, cancel)
+    return safety_response.startswith('All clear'), safety_response
+
+def run_pipeline(message: str, previous_messages: list, system_description: str, emit, cancel=None, output_dir=None):
+    """
+    Run one message through the data viz, error handling and code safety agents.
+    Progress is reported through emit(kind, *args):
+        ('status', speaker, text)        a new agent stage started
+        ('token', text)                  a streamed piece of the current stage's answer
+        ('data_viz_done', code)          preliminary code was written to output.py
+        ('error_handling_done', code)    polished code was written to error-handling-output.py
+        ('safety_done', safe, answer)    the code safety verdict
+    :param message: The user's message.
+    :param previous_messages: The conversation so far, not including this message.
+    :param system_description: The data viz system description, with the metadata summary filled in.
+    :param emit: Callback receiving progress events.
+    :param cancel: Optional threading.Event; PipelineCancelled is raised once it is set.
+    :param output_dir: Folder to write output.py and error-handling-output.py to, the current one by default.
+    :return: The preliminary code written by the data viz agent.
+    """
+    on_token = lambda token: emit('token', token)
+    output_file = os.path.join(output_dir or '', 'output.py')
+    error_handling_file = os.path.join(output_dir or '', 'error-handling-output.py')
+
+    emit('status', 'Data Viz Assistant', 'Thinking...')
+    print('Thinking...')
+
+    # Pass message to data viz assistant and get response, writing to output.py
+    with span('agent.data_viz', model=DATA_VIZ_MODEL):
+        assistant_response = ask_for_code(
+            DATA_VIZ_MODEL, system_description, previous_messages, message, on_token, cancel)
+    write_file(output_file, assistant_response)
+    print('Done thinking. Preliminary code written to output.py.')
+    emit('data_viz_done', assistant_response)
+
+    emit('status', 'Error Handling Assistant', 'Now polishing code with error handling...')
+    print('Now polishing code with error handling...')
+
+    # Pass data viz code to error handling code
+    with span('agent.error_handling', model=ERROR_HANDLING_MODEL):
+        error_handling_response = ask_for_code(
+            ERROR_HANDLING_MODEL, ERROR_HANDLING_SYSTEM_DESCRIPTION, [], assistant_response, on_token, cancel)
+    write_file(error_handling_file, error_handling_response)
+    print('Done adding error handling. Polished code was written to error-handling-output.py.')
+    emit('error_handling_done', error_handling_response)
+
+    emit('status', 'Code Safety Assistant', 'Now analyzing code safety...')
+    print('Now analyzing code safety...')
+
+    with span('agent.code_safety', model=CODE_SAFETY_MODEL):
+        safe, safety_response = check_code_safety(error_handling_response, on_token, cancel)
+
+    # Dangerous case
+    if not safe:
+        print('WARNING: Code deemed dangerous. Removing python files from disk.')
+        delete_files(output_file, error_handling_file)
+        emit('safety_done', False, safety_response)
+
+    # All clear case
+    else:
+        print('All clear.')
+        emit('safety_done', True, safety_response)
+
+    return assistant_response
+
+class PipelineWorker:
+    """
+    Runs pipelines one at a time on a background thread.
+    Messages submitted while a pipeline is running wait in a queue.
+    Events are put on the `events` queue as (kind, *args) tuples: those of run_pipeline, plus
+        ('started', message)      a queued message started running
+        ('finished', message)     the message went through all three agents
+        ('cancelled', message)    the message was cancelled
+        ('failed', message, err)  the pipeline raised an exception
+    """
+
+    def __init__(self, get_system_description):
+        """
+        :param get_system_description: Callable taking the text of the request (the message and the
+            user's recent messages) and returning the data viz system description for it;
+            called on the worker thread, so it may block (e.g. waiting for the data summary).
+        """
+        self.get_system_description = get_system_description
+        self.conversation = ConversationManager()
+        self.events = queue.Queue()
+        self._messages = queue.Queue()
+        self._cancel = threading.Event()
+        self._busy = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='pipeline-worker', daemon=True)
+        self._thread.start()
+
+    @property
+    def previous_messages(self):
+        """The whole conversation so far; requests only carry the part that fits the conversation's token budget"""
+        return self.conversation.history
+
+    def submit(self, message):
+        """Queue a message; it runs once the messages before it are done"""
+        self._messages.put(message)
+
+    def busy(self):
+        """Whether a pipeline is running or waiting to run"""
+        return self._busy.is_set() or not self._messages.empty()
+
+    def pending(self):
+        """Number of messages waiting behind the running one"""
+        return self._messages.qsize()
+
+    def cancel(self):
+        """Cancel the running pipeline; queued messages still run"""
+        self._cancel.set()
+
+    def _emit(self, kind, *args):
+        self.events.put((kind, *args))
+
+    def _run(self):
+        while True:
+            message = self._messages.get()
+            self._busy.set()
+            self._cancel.clear()
+            self._emit('started', message)
+            try:
+                with span('pipeline'):
+                    with span('prompt.build') as build:
+                        # Follow-ups like "make it bigger" name no files, so the recent messages are part of the query
+                        query = '\n'.join(self.conversation.recent_prompts() + [message])
+                        system_description = self.get_system_description(query)
+                        previous_messages = self.conversation.messages(DATA_VIZ_MODEL, system_description, message)
+                        build.set(system_chars=len(system_description), history_messages=len(previous_messages))
+                    assistant_response = run_pipeline(
+                        message, previous_messages, system_description, self._emit, self._cancel)
+            except PipelineCancelled:
+                print('Cancelled.')
+                self._emit('cancelled', message)
+            except Exception as err:
+                print('Halting process due to error: ', err)
+                self._emit('failed', message, err)
+            else:
+                # Update previous messages
+                self.conversation.add_turn(message, assistant_response)
+                self._emit('finished', message)
+            finally:
+                self._busy.clear()
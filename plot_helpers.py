@@ -0,0 +1,227 @@
+"""
+Data reduction for plotting large DataFrames, imported by generated scripts.
+
+Each helper returns a DataFrame that plots the same way as the original with matplotlib,
+seaborn or plotly, and returns its input unchanged when it is already small enough.
+"""
+
+import numpy as np
+import pandas as pd
+
+LINE_POINT_THRESHOLD = 5000  # points kept per line series
+SCATTER_POINT_THRESHOLD = 20000  # points above which a scatter plot is binned
+HISTOGRAM_BINS = 200  # bins per axis for binned scatter plots and 2D histograms
+BAR_CATEGORY_LIMIT = 50  # bars kept before the smallest categories are merged into OTHER_CATEGORY
+OTHER_CATEGORY = 'Other'
+
+def as_numeric(series):
+    """
+    Float values of a numeric or datetime column, and a function converting floats back.
+    :return: (values, restore), or (None, None) for other columns
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        tz = getattr(series.dtype, 'tz', None)
+        naive = series.dt.tz_convert(None) if tz is not None else series
+        values = naive.astype('datetime64[ns]').to_numpy().astype('int64').astype(float)
+        values[series.isna().to_numpy()] = np.nan
+
+        def restore(floats):
+            restored = pd.to_datetime(np.asarray(floats).astype('int64'), unit='ns')
+            return restored.tz_localize('UTC').tz_convert(tz) if tz is not None else restored
+        return values, restore
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=float, na_value=np.nan), lambda floats: floats
+    return None, None
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line sorted by x.
+    Keeps the first and last points, and from each bucket in between the point forming the
+    largest triangle with the point kept before it and the average of the next bucket,
+    which preserves peaks and the visual shape of the line.
+    :return: sorted indices of the points to keep
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    # Average of each bucket, and the last point standing in for the bucket after the last one
+    mean_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / sizes, x[n - 1])
+    mean_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / sizes, y[n - 1])
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(areas))
+        kept[bucket + 1] = a
+    return kept
+
+def minmax_decimate(x, y, n_out):
+    """
+    Min/max decimation of a line sorted by x: splits it into n_out / 2 buckets and keeps
+    the lowest and highest point of each, so no spike disappears. Faster than LTTB,
+    and better for noisy signals where the envelope matters.
+    :return: sorted indices of the points to keep
+    """
+    n = len(y)
+    buckets = n_out // 2
+    if n_out >= n or buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    kept = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            kept.append(start + int(np.argmin(y[start:end])))
+            kept.append(start + int(np.argmax(y[start:end])))
+    return np.unique(kept)
+
+DECIMATORS = {'lttb': lttb, 'minmax': minmax_decimate}
+
+def reduce_line(df, x, y, by=None, max_points=LINE_POINT_THRESHOLD, method='lttb'):
+    """
+    Downsample line series to at most max_points points each, keeping their shape.
+    :param df: DataFrame in long or wide format
+    :param x: column on the horizontal axis (numeric or datetime)
+    :param y: column, or list of columns, plotted against x
+    :param by: column (or list) splitting the rows into separate lines, e.g. the plot's hue or color
+    :param method: 'lttb' (keeps the visual shape) or 'minmax' (keeps every spike)
+    :return: a subset of the rows of df, sorted by x within each line, with all its columns;
+        with several y columns, the rows kept for any of them
+    """
+    ys = [y] if isinstance(y, str) else list(y)
+    if len(df) <= max_points:
+        return df
+
+    decimate = DECIMATORS[method]
+    groups = df.groupby(by, sort=False, dropna=False) if by is not None else [(None, df)]
+    reduced = []
+    for _, group in groups:
+        if len(group) <= max_points:
+            reduced.append(group)
+            continue
+        group = group if group[x].is_monotonic_increasing else group.sort_values(x, kind='stable')
+        x_values, _ = as_numeric(group[x])
+        if x_values is None:
+            x_values = np.arange(len(group), dtype=float)  # categorical x: reduce by position
+        kept = set()
+        for column in ys:
+            y_values, _ = as_numeric(group[column])
+            if y_values is None:
+                return df  # nothing sensible to reduce on
+            valid = np.flatnonzero(~(np.isnan(x_values) | np.isnan(y_values)))
+            kept.update(valid[decimate(x_values[valid], y_values[valid], max_points)].tolist())
+        reduced.append(group.iloc[sorted(kept)])
+    return pd.concat(reduced) if reduced else df
+
+def bin_edges(values, bins):
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return np.linspace(0, 1, bins + 1)
+    low, high = finite.min(), finite.max()
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+def reduce_scatter(df, x, y, by=None, value=None, agg='mean', max_points=SCATTER_POINT_THRESHOLD, bins=HISTOGRAM_BINS):
+    """
+    Bin a large scatter plot into a grid of bins x bins cells, one point per non-empty cell.
+    Plot the result like the original scatter, sizing or coloring the points by 'count'
+    (or by value), e.g. px.scatter(reduced, x=x, y=y, color='count').
+    :param x: numeric or datetime column on the horizontal axis
+    :param y: numeric or datetime column on the vertical axis
+    :param by: column (or list) whose groups are binned separately and kept, e.g. the plot's hue
+    :param value: column aggregated over the points in each cell with agg, e.g. a color scale
+    :return: df unchanged if it has at most max_points rows, else the cells with columns
+        x, y, 'count', the by columns and value
+    """
+    if len(df) <= max_points:
+        return df
+
+    x_values, x_restore = as_numeric(df[x])
+    y_values, y_restore = as_numeric(df[y])
+    if x_values is None or y_values is None:
+        return df
+
+    x_edges, y_edges = bin_edges(x_values, bins), bin_edges(y_values, bins)
+    valid = np.isfinite(x_values) & np.isfinite(y_values)
+    cells = pd.DataFrame({
+        '_x': np.clip(np.searchsorted(x_edges, x_values[valid], side='right') - 1, 0, bins - 1),
+        '_y': np.clip(np.searchsorted(y_edges, y_values[valid], side='right') - 1, 0, bins - 1),
+    }, index=df.index[valid])
+
+    keys = ['_x', '_y']
+    by_columns = [] if by is None else [by] if isinstance(by, str) else list(by)
+    for column in by_columns:
+        cells[column] = df.loc[valid, column]
+    keys = by_columns + keys
+    aggregations = {'count': ('_x', 'size')}
+    if value is not None and value not in (x, y):  # coloring by x or y needs only the cell centers
+        cells[value] = df.loc[valid, value]
+        aggregations[value] = (value, agg)
+
+    binned = cells.groupby(keys, sort=False, dropna=False, observed=True).agg(**aggregations).reset_index()
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    binned.insert(0, x, x_restore(x_centers[binned.pop('_x').to_numpy()]))
+    binned.insert(1, y, y_restore(y_centers[binned.pop('_y').to_numpy()]))
+    return binned
+
+def histogram2d(df, x, y, bins=HISTOGRAM_BINS):
+    """
+    Counts of points in a bins x bins grid, for a density heatmap instead of a scatter plot,
+    e.g. px.imshow(grid, origin='lower') or sns.heatmap(grid).
+    :param x: numeric column on the horizontal axis
+    :param y: numeric column on the vertical axis
+    :return: DataFrame of counts indexed by the y bin centers, with the x bin centers as columns
+    """
+    x_values, _ = as_numeric(df[x])
+    y_values, _ = as_numeric(df[y])
+    valid = np.isfinite(x_values) & np.isfinite(y_values)
+    x_edges, y_edges = bin_edges(x_values, bins), bin_edges(y_values, bins)
+    counts, _, _ = np.histogram2d(y_values[valid], x_values[valid], bins=[y_edges, x_edges])
+    grid = pd.DataFrame(
+        counts.astype(np.int64),
+        index=pd.Index(np.round((y_edges[:-1] + y_edges[1:]) / 2, 6), name=y),
+        columns=pd.Index(np.round((x_edges[:-1] + x_edges[1:]) / 2, 6), name=x),
+    )
+    return grid
+
+def aggregate_bars(df, category, value=None, agg='sum', by=None, max_categories=BAR_CATEGORY_LIMIT):
+    """
+    Aggregate rows into one bar per category (and per by group), instead of letting the plotting
+    library aggregate millions of rows (seaborn also bootstraps confidence intervals over them).
+    Categories beyond the max_categories largest are merged into OTHER_CATEGORY.
+    :param category: column on the categorical axis
+    :param value: column aggregated with agg, or None to count rows
+    :param by: column (or list) to keep as a separate grouping, e.g. the plot's hue
+    :return: DataFrame with the category column, the by columns, and value (or 'count'),
+        largest categories first
+    """
+    value_column = value if value is not None else 'count'
+    by_columns = [] if by is None else [by] if isinstance(by, str) else list(by)
+    columns = [category] + by_columns + ([value] if value is not None else [])
+    data = df[columns]
+
+    if value is None:
+        sizes = data[category].value_counts(dropna=False)
+    else:
+        sizes = data.groupby(category, dropna=False, observed=True)[value].agg(agg).abs().sort_values(ascending=False)
+    if len(sizes) > max_categories:
+        others = ~data[category].isin(sizes.index[:max_categories - 1])
+        labels = data[category].astype(object).where(~others, OTHER_CATEGORY)
+        data = data.assign(**{category: labels})
+
+    grouped = data.groupby([category] + by_columns, dropna=False, observed=True)
+    bars = grouped.size() if value is None else grouped[value].agg(agg)
+    bars = bars.rename(value_column).reset_index()
+
+    order = {label: rank for rank, label in enumerate(sizes.index)}
+    order[OTHER_CATEGORY] = len(order)
+    return bars.sort_values(category, key=lambda labels: labels.map(order), kind='stable').reset_index(drop=True)
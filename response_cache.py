@@ -0,0 +1,153 @@
+import os
+import json
+import atexit
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from metadata_cache import CACHE_DIR
+
+RESPONSE_CACHE_FILE = CACHE_DIR / 'responses.json'
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+RESPONSE_CACHE_SAVE_DELAY = 5.0  # seconds between a put and the write to disk, so a burst of answers is saved once
+
+def text_hash(text):
+    """Returns the sha256 hex digest of a string"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def response_key(model, system_description, prev_msgs, msg):
+    """
+    Content-addressed key for an agent call.
+    :param model: model used in the API call
+    :param system_description: system description of the agent
+    :param prev_msgs: list of previous messages
+    :param msg: message sent as user
+    """
+    payload = json.dumps([model, text_hash(system_description), prev_msgs, msg], sort_keys=True)
+    return text_hash(payload)
+
+class ResponseCache:
+    """
+    LRU cache of agent answers with a time-to-live, optionally persisted as JSON.
+    New entries are written to disk save_delay seconds after they are put, and at exit.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, path=None,
+                 save_delay=RESPONSE_CACHE_SAVE_DELAY):
+        """
+        :param max_entries: least recently used entries are dropped beyond this size
+        :param ttl: seconds an entry stays valid, or None for no expiry
+        :param path: JSON file to load from and save to, or None to keep the cache in memory
+        :param save_delay: seconds to wait after a put before saving, or 0 to save on every put
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # concurrent pipelines must not write the temporary file at the same time
+        self._save_timer = None  # pending save after a put
+        self.load()
+        if path is not None:
+            atexit.register(self.flush)
+
+    def load(self):
+        """Loads persisted entries, skipping expired ones"""
+
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            logging.error(f'Could not read response cache {self.path}: {err}')
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, (created, value) in entries:
+                if self.ttl is None or now - created < self.ttl:
+                    self._entries[key] = (created, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """Writes the entries to disk, if the cache is persistent"""
+
+        if self.path is None:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            entries = list(self._entries.items())
+
+        with self._save_lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                tmp_path = f'{self.path}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+            except OSError as err:
+                logging.error(f'Could not write response cache {self.path}: {err}')
+
+    def get(self, key):
+        """Returns the cached value for a key, or None if it is missing or expired"""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[0] >= self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entries beyond max_entries"""
+
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.save_delay:
+                self._schedule_save()
+                return
+        self.save()
+
+    def _schedule_save(self):
+        """Save save_delay seconds from now, unless a save is already pending; call with _lock held"""
+        if self.path is not None and self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write a pending save now"""
+        with self._lock:
+            pending = self._save_timer is not None
+        if pending:
+            self.save()
+
+    def clear(self):
+        """Drops every entry"""
+
+        with self._lock:
+            self._entries.clear()
+        self.save()
@@ -0,0 +1,502 @@
+import os
+import ast
+from dataclasses import dataclass, field
+
+from ingest import DATA_FOLDER
+
+SAFE = 'safe'
+DANGEROUS = 'dangerous'
+AMBIGUOUS = 'ambiguous'
+
+# Modules a data visualization script is expected to use
+ALLOWED_MODULES = {
+    'pandas', 'numpy', 'plotly', 'seaborn', 'scipy', 'matplotlib',
+    'math', 'statistics', 'datetime', 're', 'warnings', 'collections', 'itertools', 'functools',
+    'string', 'calendar', 'typing', 'os', 'pathlib', 'plot_helpers',
+}
+# Modules that give a script network access, a shell or control over other processes
+DANGEROUS_MODULES = {
+    'subprocess', 'socket', 'ssl', 'requests', 'urllib', 'urllib3', 'http', 'httpx', 'aiohttp',
+    'ftplib', 'smtplib', 'poplib', 'imaplib', 'telnetlib', 'paramiko', 'webbrowser',
+    'shutil', 'ctypes', 'multiprocessing', 'signal', 'pty', 'importlib', 'builtins',
+    'pickle', 'marshal', 'shelve', 'openai',
+}
+# The only os functions allowed
+ALLOWED_OS_ATTRIBUTES = {'path', 'getcwd', 'listdir', 'makedirs', 'mkdir', 'sep', 'linesep', 'scandir'}
+# The os.path functions and constants (os.path also exposes the os, sys and stat modules, which are not allowed)
+OS_PATH_ATTRIBUTES = {
+    'abspath', 'basename', 'commonpath', 'commonprefix', 'dirname', 'exists', 'lexists', 'expanduser',
+    'expandvars', 'getatime', 'getctime', 'getmtime', 'getsize', 'isabs', 'isdir', 'isfile', 'islink',
+    'ismount', 'isjunction', 'isdevdrive', 'isreserved', 'join', 'normcase', 'normpath', 'realpath', 'relpath',
+    'samefile', 'sameopenfile', 'samestat', 'split', 'splitdrive', 'splitext', 'splitroot',
+    'sep', 'altsep', 'extsep', 'pathsep', 'curdir', 'pardir', 'defpath', 'devnull', 'supports_unicode_filenames',
+}
+OS_DELETING_FUNCTIONS = {'remove', 'unlink', 'rmdir', 'removedirs'}
+# Methods that delete files whatever they are called on (list.remove is fine, Path.unlink is not)
+DELETING_METHODS = {'unlink', 'rmdir', 'rmtree', 'removedirs'}
+DANGEROUS_BUILTINS = {'eval', 'exec', 'compile', '__import__', 'globals', 'breakpoint'}
+SUSPICIOUS_BUILTINS = {'getattr', 'setattr', 'delattr', 'vars', 'locals'}
+DANGEROUS_DUNDERS = {
+    '__builtins__', '__globals__', '__subclasses__', '__class__', '__bases__', '__mro__',
+    '__code__', '__closure__', '__dict__', '__loader__', '__import__',
+}
+NETWORK_PREFIXES = ('http://', 'https://', 'ftp://', 's3://', 'gs://', 'file://')
+# Attributes and methods giving column, index or sheet names, which a loop may use to name its output files
+NAME_ITERABLES = {'columns', 'index', 'sheet_names', 'keys', 'unique'}
+# Objects that write to the file they were created with (df.to_excel(writer), pdf.savefig())
+WRITER_CLASSES = {'ExcelWriter', 'PdfPages', 'HDFStore'}
+
+# Methods that write a file, and the keyword their path may be passed as
+WRITE_METHODS = {
+    'to_csv': 'path_or_buf', 'to_excel': 'excel_writer', 'to_json': 'path_or_buf', 'to_html': 'buf',
+    'to_parquet': 'path', 'to_feather': 'path', 'to_pickle': 'path', 'to_hdf': 'path_or_buf',
+    'to_latex': 'buf', 'to_markdown': 'buf', 'to_string': 'buf', 'to_xml': 'path_or_buffer',
+    'to_stata': 'path', 'savefig': 'fname', 'write_html': 'file', 'write_image': 'file',
+    'write_json': 'file', 'ExcelWriter': 'path', 'makedirs': 'name', 'tofile': 'fid',
+}
+# Module functions that write a file, and the position and keyword of their path argument
+# (no position when the path may only be passed by keyword and defaults to a file in the current directory)
+WRITE_FUNCTIONS = {
+    'numpy.save': (0, 'file'), 'numpy.savez': (0, 'file'), 'numpy.savez_compressed': (0, 'file'),
+    'numpy.savetxt': (0, 'fname'), 'scipy.io.savemat': (0, 'file_name'), 'scipy.io.mmwrite': (0, 'target'),
+    'scipy.io.wavfile.write': (0, 'filename'), 'matplotlib.pyplot.imsave': (0, 'fname'),
+    'plotly.offline.plot': (None, 'filename'), 'plotly.io.write_html': (1, 'file'),
+    'plotly.io.write_image': (1, 'file'), 'plotly.io.write_json': (1, 'file'),
+    'matplotlib.backends.backend_pdf.PdfPages': (0, 'filename'),
+}
+# Functions that write a file depending on their mode: (path position, path keyword, mode position, mode keyword, default mode)
+MODE_WRITE_FUNCTIONS = {
+    'numpy.memmap': (0, 'filename', 2, 'mode', 'r+'),
+    'numpy.lib.format.open_memmap': (0, 'filename', 1, 'mode', 'r+'),
+    'pandas.HDFStore': (0, 'path', 1, 'mode', 'a'),
+    'scipy.io.netcdf_file': (0, 'filename', 1, 'mode', 'r'),
+}
+# Methods that move the file they are called on to the path they are given (str.replace takes two arguments)
+MOVING_METHODS = {'rename', 'replace'}
+# Methods that write to a database rather than a file
+DATABASE_METHODS = {'to_sql'}
+# pathlib methods that write to the path they are called on
+RECEIVER_WRITE_METHODS = {'write_text', 'write_bytes', 'mkdir', 'touch', 'chmod', 'symlink_to', 'hardlink_to'}
+# Methods that create a directory, which has no file extension
+DIRECTORY_METHODS = {'mkdir', 'makedirs'}
+# Methods that add the extension of their format to a path without one, e.g. savefig('plot') writes plot.png
+EXTENSION_METHODS = {'savefig', 'save', 'savez', 'savez_compressed', 'savemat'}
+# Files generated code is expected to write; other files (.txt, .md, ...) may be the app's own and need review
+OUTPUT_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.svg', '.pdf', '.eps', '.ps', '.tif', '.tiff', '.gif', '.webp', '.bmp',
+    '.html', '.htm', '.csv', '.tsv', '.xlsx', '.xls', '.json', '.npy', '.npz', '.mat', '.h5', '.hdf5', '.nc',
+}
+# Files generated code may never write: code the app runs
+CODE_EXTENSIONS = {'.py', '.pyc', '.pyw', '.pth', '.so', '.sh', '.bat', '.ps1'}
+# Methods that return a string instead of writing a file when given no path
+STRING_METHODS = {'to_csv', 'to_json', 'to_html', 'to_latex', 'to_markdown', 'to_string', 'to_xml'}
+# Functions that read or fetch data, and whose paths are checked for network URLs
+READ_FUNCTIONS = {
+    'read_csv', 'read_table', 'read_excel', 'read_json', 'read_html', 'read_xml', 'read_parquet',
+    'read_feather', 'read_pickle', 'read_fwf', 'read_sql', 'read_stata', 'read_sas', 'read_spss',
+    'open', 'ExcelFile', 'loadtxt', 'genfromtxt', 'load',
+}
+
+@dataclass(frozen=True)
+class Finding:
+    """Something the analyzer noticed about a line of code"""
+    line: int
+    severity: str  # DANGEROUS or AMBIGUOUS
+    message: str
+
+    def __str__(self):
+        return f'line {self.line}: {self.message}'
+
+@dataclass
+class SafetyVerdict:
+    """Result of analyze_code: SAFE, DANGEROUS, or AMBIGUOUS when a human (or the LLM) should decide"""
+    verdict: str
+    findings: list = field(default_factory=list)
+
+    @property
+    def safe(self):
+        return self.verdict == SAFE
+
+    @property
+    def ambiguous(self):
+        return self.verdict == AMBIGUOUS
+
+    def describe(self):
+        """Text in the same form as the code safety agent's answer, followed by the findings"""
+
+        if self.verdict == SAFE:
+            return 'All clear (static analysis).'
+        heading = 'Dangerous. Do not proceed' if self.verdict == DANGEROUS else 'Needs review'
+        return '\n'.join([f'{heading} (static analysis):'] + [f'  {finding}' for finding in self.findings])
+
+def is_allowed_write_path(path, data_folder=DATA_FOLDER):
+    """
+    Whether a script may write to path: somewhere inside the current directory, but not into
+    the data folder, which holds the user's input files, nor over code or hidden files and
+    folders (.env, .cache, ...), which hold the app's settings and caches.
+    """
+    if os.path.isabs(path) or path.startswith('~') or '\0' in path:
+        return False
+    normalized = os.path.normpath(path)
+    if normalized == os.pardir or normalized.startswith(os.pardir + os.sep):
+        return False
+    parts = normalized.split(os.sep)
+    if any(part.startswith('.') and part != os.curdir for part in parts):
+        return False
+    if os.path.splitext(normalized)[1].lower() in CODE_EXTENSIONS:
+        return False
+    data_folder = os.path.normpath(data_folder)
+    return normalized != data_folder and not normalized.startswith(data_folder + os.sep)
+
+def is_output_file(path, method):
+    """Whether path is a plot or data file of a kind generated code is expected to write with method"""
+    extension = os.path.splitext(path)[1].lower()
+    if method in DIRECTORY_METHODS:
+        return True
+    return extension in OUTPUT_EXTENSIONS or (not extension and method in EXTENSION_METHODS)
+
+def literal_elements(node):
+    """
+    The elements of the literal list, tuple or set an iterable is made from, e.g. sorted(['b.png', 'a.png'])[1:]
+    :return: a list of nodes, or None if the iterable is computed
+    """
+    while True:
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Slice):
+            node = node.value
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1
+              and node.func.id in ('sorted', 'reversed', 'list', 'tuple', 'set')):
+            node = node.args[0]
+        else:
+            return node.elts if isinstance(node, (ast.List, ast.Tuple, ast.Set)) else None
+
+def is_name_iterable(node):
+    """Whether an iterable gives column, index or sheet names, e.g. df.columns[1:] or df['kind'].unique()"""
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Slice):
+        node = node.value
+    if isinstance(node, ast.Call):
+        node = node.func
+    return isinstance(node, ast.Attribute) and node.attr in NAME_ITERABLES
+
+class SafetyAnalyzer(ast.NodeVisitor):
+    """Walks the syntax tree of a script and collects Findings"""
+
+    def __init__(self):
+        self.findings = []
+        self.aliases = {}    # local name -> dotted module or function it refers to
+        self.constants = {}  # variable name -> set of string values assigned to it, None if any was not a constant
+        self.writers = set()  # names bound to WRITER_CLASSES objects, whose path is checked where they are created
+        self.loop_variables = set()  # names bound by for loops over column, index or sheet names
+        self.attribute_bases = set()  # ids of the nodes attributes are looked up on
+
+    def flag(self, node, severity, message):
+        self.findings.append(Finding(getattr(node, 'lineno', 0), severity, message))
+
+    # Names and values
+
+    def collect_constants(self, tree):
+        """Records the string values assigned to every variable, so paths held in variables can be checked"""
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign):
+                targets, values = node.targets, [node.value]
+            elif isinstance(node, (ast.AnnAssign, ast.AugAssign)) and node.value is not None:
+                targets, values = [node.target], [None if isinstance(node, ast.AugAssign) else node.value]
+            elif isinstance(node, (ast.For, ast.comprehension)):
+                # for name in ['a.png', 'b.png'] takes each of the listed values
+                elements = literal_elements(node.iter)
+                targets, values = [node.target], elements if elements is not None else [None]
+                if is_name_iterable(node.iter) and isinstance(node.target, ast.Name):
+                    self.loop_variables.add(node.target.id)
+            elif isinstance(node, ast.withitem) and node.optional_vars is not None:
+                targets, values = [node.optional_vars], [node.context_expr]
+            else:
+                continue
+
+            for target in targets:
+                if not isinstance(target, ast.Name):
+                    continue
+                if any(self.is_writer(value) for value in values):
+                    self.writers.add(target.id)
+                strings = [value.value if isinstance(value, ast.Constant) and isinstance(value.value, str) else None
+                           for value in values]
+                known = self.constants.setdefault(target.id, set())
+                if known is None or None in strings:
+                    self.constants[target.id] = None
+                else:
+                    known.update(strings)
+
+    @staticmethod
+    def is_writer(node):
+        if not isinstance(node, ast.Call):
+            return False
+        func = node.func
+        return getattr(func, 'attr', getattr(func, 'id', None)) in WRITER_CLASSES
+
+    def qualified_name(self, node):
+        """Dotted name of a Name/Attribute chain with import aliases resolved, e.g. 'os.path.join'"""
+
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        parts.append(self.aliases.get(node.id, node.id))
+        return '.'.join(reversed(parts))
+
+    def string_values(self, node):
+        """
+        The possible string values of an expression.
+        :return: a set of strings, or None if they cannot be determined statically
+        """
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return {node.value}
+        if isinstance(node, ast.Name):
+            values = self.constants.get(node.id)
+            if values is None and node.id in self.loop_variables:
+                # Column or sheet names used to name the output files of a loop; loops over
+                # anything else, e.g. the files of a folder, could take any path
+                return {'x'}
+            return values
+        if isinstance(node, ast.JoinedStr):
+            # Unknown parts after the first stand for a plain name, which is enough to see where it points
+            values = {''}
+            for i, part in enumerate(node.values):
+                part_values = self.string_values(part.value) if isinstance(part, ast.FormattedValue) else self.string_values(part)
+                if part_values is None:
+                    if i == 0:
+                        return None  # an unknown prefix could be an absolute path
+                    part_values = {'x'}
+                values = {value + part_value for value in values for part_value in part_values}
+            return values
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            left, right = self.string_values(node.left), self.string_values(node.right)
+            if left is None or right is None:
+                return None
+            return {a + b for a in left for b in right}
+        if isinstance(node, ast.Call) and self.qualified_name(node.func) in ('os.path.join', 'pathlib.Path', 'pathlib.PurePath'):
+            values = {''}
+            for arg in node.args:
+                arg_values = self.string_values(arg)
+                if arg_values is None:
+                    return None
+                values = {os.path.join(value, arg_value) for value in values for arg_value in arg_values}
+            return values
+        return None
+
+    # Visitors
+
+    def check_module(self, node, module):
+        top = module.split('.')[0]
+        if top in DANGEROUS_MODULES:
+            self.flag(node, DANGEROUS, f'imports {module}')
+        elif top not in ALLOWED_MODULES:
+            self.flag(node, AMBIGUOUS, f'imports {module}, which is not on the allowlist')
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.check_module(node, alias.name)
+            if alias.asname:
+                self.aliases[alias.asname] = alias.name
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node):
+        module = node.module or ''
+        if node.level:
+            self.flag(node, AMBIGUOUS, 'uses a relative import')
+        self.check_module(node, module)
+        for alias in node.names:
+            if alias.name == '*':
+                self.flag(node, AMBIGUOUS, f'imports * from {module}')
+                continue
+            name = f'{module}.{alias.name}'
+            if module == 'os':
+                self.check_os_attribute(node, name)
+            self.aliases[alias.asname or alias.name] = name
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        if node.attr in DANGEROUS_DUNDERS:
+            self.flag(node, DANGEROUS, f'accesses {node.attr}')
+        self.attribute_bases.add(id(node.value))
+        name = self.qualified_name(node)
+        if name is not None and name.startswith('os.'):
+            self.check_os_attribute(node, name)
+        if node.attr == 'os':
+            # Modules that import os expose it, e.g. pd.io.common.os or os.path.os
+            self.flag(node, DANGEROUS, f'reaches the os module through {name or node.attr}')
+        self.generic_visit(node)
+
+    def check_os_attribute(self, node, name):
+        parts = name.split('.')
+        while parts[1:3] == ['path', 'os']:
+            parts = parts[2:]  # os.path.os is the os module again
+        if len(parts) == 1:
+            self.check_os_reference(node, name)
+            return
+        attribute = parts[1]
+        if attribute == 'path':
+            if len(parts) == 2:
+                self.check_os_reference(node, name)
+            elif parts[2] not in OS_PATH_ATTRIBUTES:
+                self.flag(node, DANGEROUS, f'uses {name}')
+            return
+        if attribute in ALLOWED_OS_ATTRIBUTES:
+            return
+        if attribute in OS_DELETING_FUNCTIONS:
+            self.flag(node, DANGEROUS, f'deletes files with {name}')
+        elif attribute in ('environ', 'getenv', 'putenv', 'rename', 'replace', 'chmod', 'chown', 'chdir', 'symlink', 'link'):
+            self.flag(node, AMBIGUOUS, f'uses {name}')
+        else:
+            self.flag(node, DANGEROUS, f'uses {name}')
+
+    def check_os_reference(self, node, name):
+        """
+        The os and os.path modules may only be used to look up attributes, which are checked,
+        not be assigned to variables or passed around, where their attributes are not
+        """
+        if id(node) not in self.attribute_bases:
+            self.flag(node, AMBIGUOUS, f'uses the {name} module as a value')
+
+    def visit_Name(self, node):
+        if node.id in DANGEROUS_DUNDERS:
+            self.flag(node, DANGEROUS, f'accesses {node.id}')
+        module = self.aliases.get(node.id, node.id)
+        if module in ('os', 'os.path', 'os.path.os'):
+            self.check_os_reference(node, module)
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        name = self.qualified_name(node.func)
+        short = name.split('.')[-1] if name else getattr(node.func, 'attr', None)
+
+        if name in DANGEROUS_BUILTINS:
+            self.flag(node, DANGEROUS, f'calls {name}()')
+        elif name in SUSPICIOUS_BUILTINS:
+            self.flag(node, AMBIGUOUS, f'calls {name}()')
+        elif short in DELETING_METHODS and not (name or '').startswith('os.'):
+            self.flag(node, DANGEROUS, f'deletes files with {short}()')
+
+        if name == 'open' or name == 'os.mkdir':
+            mode = node.args[1] if len(node.args) > 1 else self.keyword(node, 'mode')
+            if name == 'os.mkdir' or self.is_write_mode(mode):
+                self.check_write(node, short)
+        elif name in WRITE_FUNCTIONS:
+            position, keyword = WRITE_FUNCTIONS[name]
+            has_position = position is not None and len(node.args) > position
+            path = node.args[position] if has_position else self.keyword(node, keyword)
+            if path is not None or position is not None:
+                self.check_write(node, short, path)
+        elif name in MODE_WRITE_FUNCTIONS:
+            path_position, path_keyword, mode_position, mode_keyword, default_mode = MODE_WRITE_FUNCTIONS[name]
+            mode = node.args[mode_position] if len(node.args) > mode_position else self.keyword(node, mode_keyword)
+            if self.is_write_mode(mode if mode is not None else ast.Constant(default_mode)):
+                path = node.args[path_position] if len(node.args) > path_position else self.keyword(node, path_keyword)
+                self.check_write(node, short, path)
+        elif isinstance(node.func, ast.Attribute) and (short in RECEIVER_WRITE_METHODS or short == 'open'):
+            # Path('x').write_text(...), Path('x').open('w'): the path is what the method is called on,
+            # known only when it is Path(...) itself, not a path derived from it (joinpath, with_name, /)
+            mode = node.args[0] if node.args else self.keyword(node, 'mode')
+            if short != 'open' or self.is_write_mode(mode):
+                self.check_write(node, short, node.func.value)
+        elif isinstance(node.func, ast.Attribute) and short in MOVING_METHODS and self.is_path_argument(node):
+            # Path('x').rename('y') removes x and writes y
+            self.check_write(node, short, node.func.value)
+            self.check_write(node, short, node.args[0])
+        elif short in DATABASE_METHODS:
+            self.flag(node, AMBIGUOUS, f'writes to a database with {short}()')
+        elif short in WRITE_METHODS:
+            self.check_write(node, short)
+        elif node.args and self.is_write_mode(self.keyword(node, 'mode')):
+            # Any other call opening its first argument for writing
+            self.check_write(node, short or 'call', node.args[0])
+
+        if short in READ_FUNCTIONS:
+            self.check_read(node, short)
+
+        self.generic_visit(node)
+
+    @staticmethod
+    def keyword(node, name):
+        return next((kw.value for kw in node.keywords if kw.arg == name), None)
+
+    def call_path(self, node, keyword):
+        """The node passed as the path of a call, positionally or by keyword"""
+        if node.args:
+            return node.args[0]
+        for name in (keyword, 'path', 'file', 'filename', 'fname', 'name'):
+            value = self.keyword(node, name)
+            if value is not None:
+                return value
+        return None
+
+    def is_path_argument(self, node):
+        """Whether a call has a single argument, a path (df.rename(columns=...) and str.replace(a, b) do not)"""
+        if len(node.args) != 1 or node.keywords:
+            return False
+        argument = node.args[0]
+        if isinstance(argument, ast.Call):
+            return (self.qualified_name(argument.func) or '').endswith('Path')
+        return self.string_values(argument) is not None or isinstance(argument, ast.JoinedStr)
+
+    def is_write_mode(self, mode):
+        """Whether an open() mode argument may open the file for writing"""
+        if mode is None:
+            return False
+        modes = self.string_values(mode)
+        return modes is None or any(set(value) & set('wax+') for value in modes)
+
+    def check_write(self, node, method, path=None):
+        if path is None:
+            path = self.call_path(node, WRITE_METHODS.get(method))
+        receiver = getattr(node.func, 'value', None)
+        if path is None and isinstance(receiver, ast.Name) and receiver.id in self.writers:
+            return  # pdf.savefig() writes to the file of the PdfPages
+        if path is None:
+            if method not in STRING_METHODS:
+                self.flag(node, AMBIGUOUS, f'{method}() without a file name')
+            return
+        if isinstance(path, ast.Name) and path.id in self.writers:
+            return  # checked where the writer was created
+
+        values = self.string_values(path)
+        if values is None:
+            self.flag(node, AMBIGUOUS, f'{method}() writes to a path that cannot be determined statically')
+            return
+        for value in sorted(values):
+            if value.startswith(NETWORK_PREFIXES):
+                self.flag(node, DANGEROUS, f'{method}() writes to {value!r} over the network')
+            elif not is_allowed_write_path(value):
+                self.flag(node, DANGEROUS, f'{method}() writes to {value!r}, outside the allowed paths')
+            elif not is_output_file(value, method):
+                self.flag(node, AMBIGUOUS, f'{method}() writes to {value!r}, which is not a plot or data file')
+
+    def check_read(self, node, function):
+        path = self.call_path(node, 'filepath_or_buffer')
+        values = self.string_values(path) if path is not None else None
+        for value in sorted(values or ()):
+            if value.startswith(NETWORK_PREFIXES):
+                self.flag(node, DANGEROUS, f'{function}() fetches {value!r} over the network')
+
+def analyze_code(code):
+    """
+    Statically classify a generated script without running it.
+    :param code: The python source.
+    :return: A SafetyVerdict: DANGEROUS if anything is clearly harmful, AMBIGUOUS if something
+        could not be verified (unknown imports, paths computed at runtime, unparsable code), SAFE otherwise.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError) as err:
+        return SafetyVerdict(AMBIGUOUS, [Finding(getattr(err, 'lineno', 0) or 0, AMBIGUOUS, f'could not parse the code: {err}')])
+
+    analyzer = SafetyAnalyzer()
+    analyzer.collect_constants(tree)
+    analyzer.visit(tree)
+
+    findings = sorted(set(analyzer.findings), key=lambda finding: (finding.line, finding.message))
+    if any(finding.severity == DANGEROUS for finding in findings):
+        return SafetyVerdict(DANGEROUS, findings)
+    if findings:
+        return SafetyVerdict(AMBIGUOUS, findings)
+    return SafetyVerdict(SAFE, findings)
@@ -0,0 +1,297 @@
+"""
+Column statistics of large text data files, computed in one bounded-memory pass.
+
+Delimited files (CSV, TSV, ...) are read with pandas CHUNK_ROWS rows at a time, and JSON lines
+files a block of lines at a time, so memory stays proportional to one chunk whatever the file size.
+A scan stops after max_rows rows, and the row count of the rest of the file is then estimated
+from the bytes read so far.
+"""
+
+import io
+import os
+import csv
+import json
+import logging
+import warnings
+import itertools
+import numpy as np
+import pandas as pd
+
+from tracing import count
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+SNIFF_BYTES = 64 * 1024  # read to guess the delimiter, or whether a JSON file has one record per line
+DELIMITERS = ',\t;|'
+CHUNK_ROWS = 100_000
+STATS_MAX_ROWS = 1_000_000  # rows scanned per file; the row count of larger files is estimated
+JSON_LOAD_LIMIT = 50 * 1024 ** 2  # JSON documents (not lines) are parsed whole, up to this size
+MAX_CATEGORIES = 20  # distinct values listed for a text column
+MAX_CATEGORY_LENGTH = 50  # text columns with longer values are free text, not categories
+DATETIME_SAMPLE = 100  # values of a text column tried as dates
+DATETIME_MIN_PARSED = 0.9  # share of them that must parse for the column to count as dates
+
+def sniff_delimiter(file, default=','):
+    """The delimiter of a text table, guessed from its first SNIFF_BYTES bytes, or default"""
+
+    try:
+        with open(file, 'r', newline='', encoding='utf-8', errors='replace') as handle:
+            sample = handle.read(SNIFF_BYTES)
+            count(bytes=handle.buffer.tell())
+    except OSError:
+        return default
+    if len(sample) == SNIFF_BYTES and '\n' in sample:
+        sample = sample[:sample.rfind('\n')]  # drop the cut-off last line
+
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:  # a single column, or no consistent delimiter
+        return default
+
+def is_json_lines(file):
+    """Whether a JSON file holds one object per line (JSON lines) rather than a single document"""
+
+    with open(file, 'r', encoding='utf-8', errors='replace') as handle:
+        sample = handle.read(SNIFF_BYTES)
+        count(bytes=handle.buffer.tell())
+    # Two objects on their own lines; a single line is as likely a document of columns
+    lines = [line for line in sample.splitlines() if line.strip()][:2]
+    try:
+        return len(lines) == 2 and all(isinstance(json.loads(line), dict) for line in lines)
+    except ValueError:
+        return False
+
+def value_type(values):
+    """Type of a chunk of non-null values: 'integer', 'float', 'boolean', 'datetime' or 'text'"""
+
+    if pd.api.types.is_bool_dtype(values):
+        return 'boolean'
+    if pd.api.types.is_integer_dtype(values):
+        return 'integer'
+    if pd.api.types.is_float_dtype(values):
+        return 'float'
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'datetime'
+    return 'text'
+
+def merge_types(current, new):
+    if current is None or current == new:
+        return new
+    if {current, new} == {'integer', 'float'}:
+        return 'float'
+    return 'text'
+
+def date_format(values):
+    """The strftime format the text values are dates in, or None if they are not dates"""
+
+    sample = values.iloc[:DATETIME_SAMPLE].astype(str)
+    fmt = guess_datetime_format(sample.iloc[0])
+    if fmt is None:
+        return None
+    parsed = pd.to_datetime(sample, format=fmt, errors='coerce')
+    return fmt if parsed.notna().mean() >= DATETIME_MIN_PARSED else None
+
+class ColumnStats:
+    """Running statistics of one column, updated a chunk at a time"""
+
+    def __init__(self):
+        self.type = None
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.values = set()  # distinct text values while there are at most MAX_CATEGORIES, else None
+        self.date_format = None  # set while the column's text values are dates
+
+    def add_missing(self, rows):
+        """Count rows where the column is absent (JSON records without the key) as nulls"""
+        self.nulls += rows
+
+    def update(self, series):
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if not len(values):
+            return
+
+        new_type = value_type(values)
+        if new_type == 'text' and self.type in (None, 'datetime'):
+            if self.type is None:
+                self.date_format = date_format(values)
+            if self.date_format is not None:
+                parsed = pd.to_datetime(values.astype(str), format=self.date_format, errors='coerce')
+                if parsed.notna().mean() >= DATETIME_MIN_PARSED:
+                    values, new_type = parsed.dropna(), 'datetime'
+                else:
+                    self.date_format = None
+
+        merged = merge_types(self.type, new_type)
+        if merged == 'text' and self.type not in (None, 'text'):
+            # Earlier chunks were not text, so their values are not in the categories
+            self.min = self.max = self.values = None
+        self.type = merged
+
+        if merged == 'text':
+            self.update_categories(values)
+        elif merged != 'boolean':
+            self.update_range(values)
+
+    def update_range(self, values):
+        if self.type == 'datetime':
+            if values.dt.tz is not None:
+                values = values.dt.tz_convert(None)
+        else:
+            values = values[np.isfinite(values.to_numpy(dtype=float))]
+            if not len(values):
+                return
+        low, high = values.min(), values.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def update_categories(self, values):
+        if self.values is None:
+            return
+        try:
+            self.values.update(list(values.unique()[:MAX_CATEGORIES + 1]))
+        except TypeError:  # lists or dicts in JSON records
+            self.values = None
+            return
+        if len(self.values) > MAX_CATEGORIES or any(len(str(value)) > MAX_CATEGORY_LENGTH for value in self.values):
+            self.values = None
+
+    def result(self):
+        """The statistics as plain JSON-serializable values"""
+
+        stats = {'type': self.type or 'empty', 'nulls': int(self.nulls)}
+        if self.min is not None:
+            stats['min'], stats['max'] = plain(self.min), plain(self.max)
+        if self.type == 'text' and self.values is not None:
+            stats['values'] = sorted(str(value) for value in self.values)
+        return stats
+
+def plain(value):
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def update_columns(columns, chunk, rows_before, max_cols):
+    """Add a chunk to the statistics {name: ColumnStats}, starting new columns as they appear"""
+
+    for name in chunk.columns:
+        key = str(name)
+        if key not in columns:
+            if max_cols is not None and len(columns) >= max_cols:
+                continue
+            columns[key] = ColumnStats()
+            columns[key].add_missing(rows_before)
+        columns[key].update(chunk[name])
+    present = {str(name) for name in chunk.columns}
+    for key, stats in columns.items():
+        if key not in present:
+            stats.add_missing(len(chunk))
+
+def stats_result(columns, rows, consumed, size, complete):
+    """
+    :return: {'rows': ..., 'rows exact': ..., 'columns': {name: stats}}, the row count being
+        extrapolated from the share of the file read when the scan stopped early
+    """
+    if not complete and consumed:
+        rows = int(round(rows * size / consumed, -2))
+    return {
+        'rows': rows,
+        'rows exact': complete,
+        'columns': {name: stats.result() for name, stats in columns.items()},
+    }
+
+def profile_delimited(file, header_row, delimiter=',', max_rows=STATS_MAX_ROWS, max_cols=None, chunk_rows=CHUNK_ROWS):
+    """
+    Scan a delimited text file in chunks, read the way generated code reads it.
+    :param header_row: header row found by ingest
+    :param max_rows: rows to scan before estimating the rest
+    :param max_cols: columns to keep statistics of, or None for all
+    :return: see stats_result, or None if the file could not be parsed
+    """
+    columns = {}
+    rows = 0
+    consumed = 0
+    complete = True
+    size = os.path.getsize(file)
+    with open(file, 'rb') as handle:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')  # mixed types across chunks are expected
+                for chunk in pd.read_csv(handle, sep=delimiter, header=header_row, chunksize=chunk_rows,
+                                         encoding_errors='replace'):
+                    update_columns(columns, chunk, rows, max_cols)
+                    rows += len(chunk)
+                    consumed = handle.tell()  # bytes pandas has read, about those of the rows so far
+                    if rows >= max_rows:
+                        complete = False
+                        break
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, ValueError) as err:
+            logging.error(f'Could not scan {file} past row {rows}: {err}')
+            if not rows:
+                return None
+            complete = False
+    count(bytes=consumed)
+    return stats_result(columns, rows, consumed, size, complete)
+
+def profile_json_lines(file, max_rows=STATS_MAX_ROWS, max_cols=None, chunk_rows=CHUNK_ROWS):
+    """
+    Scan a JSON lines file (one object per line) in blocks of lines, parsed like pd.read_json(file, lines=True).
+    :return: see stats_result, or None if the file could not be parsed
+    """
+    columns = {}
+    rows = 0
+    consumed = 0
+    size = os.path.getsize(file)
+    with open(file, 'rb') as handle:
+        while rows < max_rows:
+            lines = list(itertools.islice(handle, min(chunk_rows, max_rows - rows)))
+            if not lines:
+                break
+            consumed += sum(len(line) for line in lines)
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                continue
+            try:
+                chunk = pd.read_json(io.BytesIO(b''.join(lines)), lines=True)
+            except ValueError as err:
+                logging.error(f'Could not scan {file} past record {rows}: {err}')
+                if not rows:
+                    return None
+                break
+            update_columns(columns, chunk, rows, max_cols)
+            rows += len(chunk)
+    count(bytes=consumed)
+    return stats_result(columns, rows, consumed, size, consumed >= size)
+
+def profile_json(file, max_rows=STATS_MAX_ROWS, max_cols=None, chunk_rows=CHUNK_ROWS):
+    """
+    Statistics of a JSON file: streamed if it has one record per line, otherwise parsed
+    whole with pd.read_json if it is at most JSON_LOAD_LIMIT bytes.
+    :return: (lines, stats), where lines tells how to read the file and stats is None
+        if it could not be profiled
+    """
+    if is_json_lines(file):
+        return True, profile_json_lines(file, max_rows, max_cols, chunk_rows)
+
+    size = os.path.getsize(file)
+    if size > JSON_LOAD_LIMIT:
+        logging.error(f'Skipping {file}: JSON documents over {JSON_LOAD_LIMIT} bytes are only profiled as JSON lines')
+        return False, None
+    try:
+        df = pd.read_json(file)
+    except ValueError as err:
+        logging.error(f'Could not parse {file}: {err}')
+        return False, None
+    count(bytes=size)
+
+    columns = {}
+    scanned = df.iloc[:max_rows]
+    for start in range(0, len(scanned), chunk_rows):
+        update_columns(columns, scanned.iloc[start:start + chunk_rows], start, max_cols)
+    return False, stats_result(columns, len(df), len(df), len(df), True)
@@ -0,0 +1,260 @@
+"""
+Typed model of the data folder summary.
+
+DataSummary is built once from the (csv_summary, xlsx_summary) dicts ingest profiles and caches,
+and serializes to the get_summary dict, JSON, the natural-language prompt, and a compact prompt
+encoding that spends fewer tokens per file and column.
+"""
+
+import re
+import json
+from dataclasses import dataclass
+
+COMPACT_LEGEND = (
+    "Files, one per paragraph: path, [sheet name] for Excel, then how to read it (header=N is the header row "
+    "to pass to pandas, sep=... the delimiter to pass to read_csv, read_json for JSON), the row count (~ when "
+    "estimated) and the fast path, a pre-parsed copy to load with the reader given instead of the original. "
+    "Then the columns as name:type[min..max]{categories}?missing, or just the names.\n"
+)
+PLAIN_NAME = re.compile(r'[\w.\-]+')
+
+def format_stat(value):
+    return f'{value:.6g}' if isinstance(value, float) else str(value)
+
+def compact_name(name):
+    """A column name as is if it is a plain word, else quoted"""
+    return name if PLAIN_NAME.fullmatch(name) else repr(name)
+
+@dataclass(slots=True)
+class FastPath:
+    """A columnar sidecar of a file or sheet (see columnar_cache)"""
+    path: str
+    reader: str  # pandas reader to load it with, e.g. 'read_feather'
+
+    def to_dict(self):
+        return {'path': self.path, 'reader': self.reader}
+
+    def describe(self):
+        """Tells the agent where the sidecar is and how to load it"""
+        return (f"A pre-parsed copy with this header already applied is at {self.path}; "
+                f"load it with pd.{self.reader}('{self.path}') instead of parsing the original.\n")
+
+    def compact(self):
+        return f"fast=pd.{self.reader}('{self.path}')"
+
+@dataclass(slots=True)
+class ColumnProfile:
+    """Statistics of one column from the streaming scan (see streaming_profiler)"""
+    name: str
+    type: str  # 'integer', 'float', 'boolean', 'datetime', 'text' or 'empty'
+    nulls: int
+    min: object = None
+    max: object = None
+    values: list = None  # categories of a text column with few distinct values
+
+    @classmethod
+    def from_dict(cls, name, stats):
+        return cls(name, stats['type'], stats['nulls'], stats.get('min'), stats.get('max'), stats.get('values'))
+
+    def to_dict(self):
+        stats = {'type': self.type, 'nulls': self.nulls}
+        if self.min is not None:
+            stats['min'], stats['max'] = self.min, self.max
+        if self.values is not None:
+            stats['values'] = self.values
+        return stats
+
+    def range(self):
+        """(low, high) as text, dropping midnight times from a range of dates"""
+        low, high = format_stat(self.min), format_stat(self.max)
+        if self.type == 'datetime' and low.endswith(' 00:00:00') and high.endswith(' 00:00:00'):
+            low, high = low[:-len(' 00:00:00')], high[:-len(' 00:00:00')]
+        return low, high
+
+    def describe(self):
+        """e.g. "price (float, 0.5 to 120, 3 missing)" """
+
+        details = [self.type]
+        if self.min is not None:
+            details.append('{} to {}'.format(*self.range()))
+        if self.values is not None:
+            details.append(f'values {self.values}')
+        if self.nulls:
+            details.append(f'{self.nulls} missing')
+        return f"{self.name} ({', '.join(details)})"
+
+    def compact(self):
+        """e.g. "price:float[0.5..120]?3" """
+
+        text = f'{compact_name(self.name)}:{self.type}'
+        if self.min is not None:
+            text += '[{}..{}]'.format(*self.range())
+        if self.values is not None:
+            text += '{' + '|'.join(self.values) + '}'
+        if self.nulls:
+            text += f'?{self.nulls}'
+        return text
+
+@dataclass(slots=True)
+class TableStats:
+    """Size and column statistics of a CSV, TSV or JSON file"""
+    rows: int
+    rows_exact: bool  # False when rows was estimated from the part of the file scanned
+    columns: list  # ColumnProfile of each column, in file order
+
+    @classmethod
+    def from_dict(cls, stats):
+        columns = [ColumnProfile.from_dict(name, column) for name, column in stats['columns'].items()]
+        return cls(stats['rows'], stats['rows exact'], columns)
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'rows exact': self.rows_exact,
+            'columns': {column.name: column.to_dict() for column in self.columns},
+        }
+
+    def describe(self):
+        """Tells the agent the size of a file and the type and range of each of its columns"""
+        rows = f'{self.rows:,} rows' if self.rows_exact else f'about {self.rows:,} rows'
+        return f"It has {rows}. Its columns are: {'; '.join(column.describe() for column in self.columns)}.\n"
+
+@dataclass(slots=True)
+class TableSummary:
+    """What ingest found out about a CSV, TSV or JSON file, or about one sheet of a workbook"""
+    header_row: int = None  # None if no header row was found, and for JSON
+    columns: list = None  # column names, None if no header row was found
+    delimiter: str = None  # of a delimited file, when not a comma
+    format: str = None  # 'json lines' or 'json' for JSON files
+    stats: TableStats = None
+    fast_path: FastPath = None
+
+    @classmethod
+    def from_dict(cls, summary):
+        """From the dict profile_csv, profile_json or profile_excel_sheet returns"""
+        return cls(
+            summary.get('header row'),
+            summary.get('columns'),
+            summary.get('delimiter'),
+            summary.get('format'),
+            TableStats.from_dict(summary['stats']) if 'stats' in summary else None,
+            FastPath(**summary['fast path']) if 'fast path' in summary else None,
+        )
+
+    def to_dict(self):
+        """The dict it was built from"""
+
+        summary = {}
+        if self.delimiter is not None:
+            summary['delimiter'] = self.delimiter
+        if self.format is not None:
+            summary['format'] = self.format
+        else:
+            summary['header row'] = self.header_row
+        if self.columns is not None:
+            summary['columns'] = self.columns
+        if self.stats is not None:
+            summary['stats'] = self.stats.to_dict()
+        if self.fast_path is not None:
+            summary['fast path'] = self.fast_path.to_dict()
+        return summary
+
+    def describe_file(self, file):
+        """How to read a CSV, TSV or JSON file, its columns and where its sidecar is"""
+
+        if self.format == 'json lines':
+            text = f"The file {file} is JSON lines with columns {self.columns}. Read it with pd.read_json('{file}', lines=True).\n"
+        elif self.format == 'json':
+            text = f"The file {file} is JSON with columns {self.columns}. Read it with pd.read_json('{file}').\n"
+        else:
+            text = f"The file {file} has columns {self.columns or []}. For this file, {file}, use header = {self.header_row}.\n"
+            if self.delimiter is not None:
+                text += f"Its values are separated by {self.delimiter!r}, so pass sep={self.delimiter!r} to pd.read_csv.\n"
+        if self.stats is not None:
+            text += self.stats.describe()
+        if self.fast_path is not None:
+            text += self.fast_path.describe()
+        return text
+
+    def describe_sheet(self, sheet_name):
+        text = f"The sheet called {sheet_name} has columns {self.columns or []}. For sheet {sheet_name}, use header = {self.header_row}.\n"
+        if self.fast_path is not None:
+            text += self.fast_path.describe()
+        return text
+
+    def compact(self, label):
+        """Two lines: label, how to read the file and its size; then its columns"""
+
+        if self.format is not None:
+            fields = [label, 'read_json(lines=True)' if self.format == 'json lines' else 'read_json']
+        else:
+            fields = [label, f'header={self.header_row}']
+            if self.delimiter is not None:
+                fields.append(f'sep={self.delimiter!r}')
+        if self.stats is not None:
+            fields.append(f"rows={'' if self.stats.rows_exact else '~'}{self.stats.rows}")
+        if self.fast_path is not None:
+            fields.append(self.fast_path.compact())
+
+        if self.stats is not None:
+            columns = ' '.join(column.compact() for column in self.stats.columns)
+        else:
+            columns = ' '.join(compact_name(str(name)) for name in self.columns or [])
+        return ' | '.join(fields) + '\n' + columns + '\n'
+
+@dataclass(slots=True)
+class DataSummary:
+    """Everything ingest found in the data folder, keyed by file path"""
+    tables: dict  # file -> TableSummary, for CSV, TSV and JSON files
+    workbooks: dict  # Excel file -> {sheet name: TableSummary}
+
+    @classmethod
+    def from_summaries(cls, summaries):
+        """
+        :param summaries: (csv_summary, xlsx_summary) as returned by summarize_data_folder
+        """
+        csv_summary, xlsx_summary = summaries
+        return cls(
+            {str(file): TableSummary.from_dict(summary) for file, summary in csv_summary.items()},
+            {str(file): {sheet_name: TableSummary.from_dict(summary) for sheet_name, summary in sheets.items()}
+             for file, sheets in xlsx_summary.items()},
+        )
+
+    def __len__(self):
+        return len(self.tables) + len(self.workbooks)
+
+    def to_dict(self):
+        """The summary as {'CSV': {file: {...}}, 'XLSX': {file: {sheet name: {...}}}}"""
+        return {
+            'CSV': {file: table.to_dict() for file, table in self.tables.items()},
+            'XLSX': {file: {sheet_name: sheet.to_dict() for sheet_name, sheet in sheets.items()}
+                     for file, sheets in self.workbooks.items()},
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prompt(self):
+        """The summary as prose for the data viz system description"""
+
+        parts = [table.describe_file(file) + '\n' for file, table in self.tables.items()]
+        for file, sheets in self.workbooks.items():
+            if len(sheets) > 1:
+                text = f'The file {file} has sheets named {list(sheets)}.\n'
+            elif sheets:
+                text = f'The file {file} has a sheet named {next(iter(sheets))}.\n'
+            else:
+                text = ''
+            parts.append(text + ''.join(sheet.describe_sheet(sheet_name) for sheet_name, sheet in sheets.items()) + '\n')
+        return ''.join(parts)
+
+    def to_compact(self):
+        """The summary in the terse format COMPACT_LEGEND explains, which it starts with"""
+
+        parts = [table.compact(file) for file, table in self.tables.items()]
+        for file, sheets in self.workbooks.items():
+            parts.extend(sheet.compact(f'{file} [{sheet_name}]') for sheet_name, sheet in sheets.items())
+        return COMPACT_LEGEND + '\n' + ''.join(part + '\n' for part in parts) if parts else ''
+
+# Prompt encodings of a DataSummary, by name
+PROMPT_FORMATS = {'prose': DataSummary.to_prompt, 'compact': DataSummary.to_compact}
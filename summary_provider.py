@@ -0,0 +1,197 @@
+import logging
+import threading
+
+from ingest import summarize_data_folder, snapshot_data_folder, update_data_folder_summary, build_summary
+from metadata_index import MetadataIndex, TOP_K, MIN_SCORE, select_summaries, list_other_files
+from summary_model import DataSummary, PROMPT_FORMATS
+
+WATCH_INTERVAL = 2.0  # seconds between polls of the data folder
+PROMPT_FORMAT = 'prose'  # how relevant() describes the files to the agent: 'prose', or 'compact' for fewer tokens
+
+class SummaryProvider:
+    """
+    Profiles the data folder in a background thread and hands out the result lazily.
+    The folder is profiled once, into a single DataSummary that the structured, natural
+    language and compact summaries are all serialized from.
+    With watch(), the folder is polled and only added or modified files are re-profiled.
+    For large folders, relevant() describes only the files and sheets that match a query.
+    """
+
+    def __init__(self):
+        self._summaries = None
+        self._model = None
+        self._structured = None
+        self._rendered = {}  # prompt format -> text
+        self._index = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watch_thread = None
+        self._stop_watching = threading.Event()
+        self._snapshot = {}
+        self.progress = {}
+        self.version = 0
+
+    def start(self):
+        """Starts profiling in a daemon thread; calling it again does nothing"""
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='summary-provider', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            # Snapshot first so that files changing while we profile are picked up by the watcher
+            self._snapshot = snapshot_data_folder()
+            self._summaries = summarize_data_folder(progress=self._on_progress)
+        except Exception as err:
+            logging.error(f'Could not summarize the data folder: {err}')
+            self._summaries = ({}, {})
+        finally:
+            self._done.set()
+
+    def _on_progress(self, kind, done, total):
+        self.progress[kind] = (done, total)
+
+    def ready(self):
+        """Whether profiling has finished"""
+        return self._done.is_set()
+
+    def status(self):
+        """Short human-readable description of the profiling progress"""
+
+        if self.ready():
+            csv_summary, xlsx_summary = self._summaries
+            return f'Data summary ready ({len(csv_summary) + len(xlsx_summary)} files).'
+        if not self.progress:
+            return 'Profiling data files...'
+        parts = [f'{kind} {done}/{total}' for kind, (done, total) in self.progress.items()]
+        return 'Profiling data files: ' + ', '.join(parts)
+
+    def wait(self, timeout=None):
+        """
+        Blocks until profiling has finished, starting it if needed.
+        :return: (csv_summary, xlsx_summary), or None if the timeout expired
+        """
+
+        self.start()
+        if not self._done.wait(timeout):
+            return None
+        return self._summaries
+
+    def model(self):
+        """Returns the DataSummary of the folder, waiting for profiling if needed"""
+
+        self.wait()
+        with self._lock:
+            if self._model is None:
+                self._model = build_summary(self._summaries)
+            return self._model
+
+    def structured(self):
+        """Returns the summary in the get_summary format, waiting for profiling if needed"""
+
+        model = self.model()
+        with self._lock:
+            if self._structured is None or self._model is not model:
+                structured = model.to_dict()
+                if self._model is model:  # not updated by poll() in the meantime
+                    self._structured = structured
+                return structured
+            return self._structured
+
+    def render(self, fmt=None):
+        """
+        Returns the whole summary in a prompt format, waiting for profiling if needed.
+        :param fmt: a key of PROMPT_FORMATS, PROMPT_FORMAT by default
+        """
+        fmt = fmt or PROMPT_FORMAT
+        model = self.model()
+        with self._lock:
+            if fmt not in self._rendered or self._model is not model:
+                text = PROMPT_FORMATS[fmt](model)
+                if self._model is model:
+                    self._rendered[fmt] = text
+                return text
+            return self._rendered[fmt]
+
+    def natural_language(self):
+        """Returns the summary in the get_natural_language_summary format, waiting for profiling if needed"""
+        return self.render('prose')
+
+    def index(self):
+        """Returns the MetadataIndex of the summary, waiting for profiling if needed"""
+
+        self.wait()
+        with self._lock:
+            if self._index is None:
+                self._index = MetadataIndex(self._summaries)
+            return self._index
+
+    def relevant(self, query, k=TOP_K):
+        """
+        Returns the summary, in PROMPT_FORMAT, of the k files and sheets most relevant to query,
+        followed by the names of the other files. If the folder has no more than k of them,
+        or the query matches none of them well (e.g. "make it bigger"), this is the full summary.
+        """
+
+        index = self.index()
+        if len(index) <= k:
+            return self.render()
+
+        results = index.search(query, k)
+        if not results or results[0][0] < MIN_SCORE:
+            return self.render()
+
+        selected = select_summaries(index.summaries, results)
+        text = PROMPT_FORMATS[PROMPT_FORMAT](DataSummary.from_summaries(selected))
+        return text + list_other_files(index.summaries, selected)
+
+    def watch(self, interval=WATCH_INTERVAL):
+        """Starts polling the data folder in a daemon thread; calling it again does nothing"""
+
+        self.start()
+        if self._watch_thread is None:
+            self._watch_thread = threading.Thread(
+                target=self._watch, args=(interval,), name='summary-watcher', daemon=True)
+            self._watch_thread.start()
+        return self
+
+    def stop_watching(self):
+        """Stops the polling thread started by watch()"""
+        self._stop_watching.set()
+
+    def _watch(self, interval):
+        self._done.wait()
+        while not self._stop_watching.wait(interval):
+            try:
+                self.poll()
+            except Exception as err:
+                logging.error(f'Could not update the data summary: {err}')
+
+    def poll(self):
+        """
+        Compares the data folder with the last snapshot and re-profiles what changed.
+        :return: whether the summary changed
+        """
+
+        snapshot = snapshot_data_folder()
+        changed = [file for file, fingerprint in snapshot.items() if self._snapshot.get(file) != fingerprint]
+        removed = [file for file in self._snapshot if file not in snapshot]
+        if not changed and not removed:
+            return False
+
+        logging.info(f'Data folder changed: {len(changed)} added or modified, {len(removed)} removed')
+        summaries = update_data_folder_summary(self._summaries, changed, removed)
+
+        with self._lock:
+            self._summaries = summaries
+            self._snapshot = snapshot
+            self._model = None
+            self._structured = None
+            self._rendered = {}
+            self._index = None
+            self.version += 1
+
+        return True
@@ -0,0 +1,302 @@
+import os
+import io
+import json
+import time
+import uuid
+import pstats
+import logging
+import functools
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from metadata_cache import CACHE_DIR
+
+EXPORT_TRACE = True  # append every finished span to TRACE_FILE
+TRACE_FILE = CACHE_DIR / 'trace.jsonl'
+TRACE_FILE_MAX_BYTES = 10 * 1024 ** 2  # the trace file is rotated to trace.jsonl.1 beyond this size
+TRACE_SIZE_CHECK_INTERVAL = 1000  # spans written between checks of the trace file's size
+MAX_SPANS = 10000  # finished spans kept in memory for summaries
+PROFILE_DIR = Path('profiles')
+PROFILE_TOP_FUNCTIONS = 25  # functions logged from a cProfile run
+
+# Numeric span attributes the summary table adds up
+SUMMED_ATTRIBUTES = ('prompt_tokens', 'completion_tokens', 'cache_hits', 'cache_misses', 'bytes')
+
+class Span:
+    """
+    A timed stage of the work, with attributes describing it. Spans opened while another
+    is open on the same thread are its children and share its trace id.
+    """
+
+    __slots__ = ('name', 'trace', 'id', 'parent', 'start', 'duration', 'attributes', '_began')
+
+    def __init__(self, name, trace, parent, attributes):
+        self.name = name
+        self.trace = trace
+        self.id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+        self._began = time.perf_counter()
+
+    def set(self, **attributes):
+        """Add or replace attributes"""
+        self.attributes.update(attributes)
+
+    def add(self, **amounts):
+        """Add to numeric attributes, e.g. span.add(cache_hits=1)"""
+        for key, amount in amounts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record(self):
+        return {
+            'name': self.name,
+            'trace': self.trace,
+            'span': self.id,
+            'parent': self.parent,
+            'start': datetime.fromtimestamp(self.start).isoformat(timespec='milliseconds'),
+            'duration': round(self.duration, 6),
+            'thread': threading.current_thread().name,
+            'pid': os.getpid(),
+            **self.attributes,
+        }
+
+class Tracer:
+    """
+    Collects spans from every thread, keeps the last MAX_SPANS of them in memory
+    and appends each one to a JSONL file as it finishes, through a handle kept open
+    until path changes.
+    Spans finished in another process (e.g. an ingest worker) are captured there with capture()
+    and handed to adopt() in this one.
+    """
+
+    def __init__(self, path=TRACE_FILE if EXPORT_TRACE else None, max_spans=MAX_SPANS):
+        self.path = path
+        self.finished = 0
+        self._file = None
+        self._file_path = None
+        self._unchecked = 0  # spans written since the file size was last checked
+        self._records = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        """The innermost open span on this thread, or None"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time a block of code as a span, a child of the span open on this thread if any.
+        An exception leaving the block is recorded in the span's 'error' attribute.
+        """
+        parent = self.current()
+        span = Span(name, parent.trace if parent else uuid.uuid4().hex[:16], parent.id if parent else None, attributes)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as err:
+            span.set(error=type(err).__name__)
+            raise
+        finally:
+            stack.pop()
+            span.duration = time.perf_counter() - span._began
+            self._finish(span.record())
+
+    def annotate(self, **attributes):
+        """Set attributes on the current span, if there is one"""
+        span = self.current()
+        if span is not None:
+            span.set(**attributes)
+
+    def count(self, **amounts):
+        """Add to numeric attributes of the current span, if there is one"""
+        span = self.current()
+        if span is not None:
+            span.add(**amounts)
+
+    @contextmanager
+    def capture(self):
+        """Collect the spans finished on this thread in a list instead of recording them"""
+        captured = []
+        previous = getattr(self._local, 'captured', None)
+        self._local.captured = captured
+        try:
+            yield captured
+        finally:
+            self._local.captured = previous
+
+    def adopt(self, records):
+        """Record spans captured elsewhere; their root spans become children of the current span"""
+        parent = self.current()
+        for record in records:
+            if parent is not None:
+                record = dict(record, trace=parent.trace)
+                if record['parent'] is None:
+                    record['parent'] = parent.id
+            self._finish(record)
+
+    def _finish(self, record):
+        captured = getattr(self._local, 'captured', None)
+        if captured is not None:
+            captured.append(record)
+            return
+        with self._lock:
+            self._records.append(record)
+            self.finished += 1
+            if self.path is not None:
+                self._export(record)
+
+    def _export(self, record):
+        try:
+            if self._file is None or self._file_path != self.path:
+                self._open()
+            elif self._unchecked >= TRACE_SIZE_CHECK_INTERVAL:
+                self._unchecked = 0
+                if self._file.tell() > TRACE_FILE_MAX_BYTES:
+                    self._open()
+            self._file.write(json.dumps(record, default=str) + '\n')
+            self._unchecked += 1
+        except OSError as err:
+            logging.error(f'Could not write trace {self.path}: {err}')
+            self._close()
+            self.path = None  # do not fail on every span
+
+    def _open(self):
+        """(Re)open the trace file at self.path for appending, first rotating it if it is too large"""
+        self._close()
+        path = Path(self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists() and path.stat().st_size > TRACE_FILE_MAX_BYTES:
+            os.replace(path, path.with_name(path.name + '.1'))
+        self._file = open(path, 'a', buffering=1)  # line-buffered, so the file is readable while running
+        self._file_path = self.path
+        self._unchecked = 0
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def spans(self, trace=None, since=0):
+        """
+        Finished spans still held in memory, oldest first.
+        :param trace: only those of this trace id
+        :param since: only those finished after the first `since` spans (a previous value of self.finished)
+        """
+        with self._lock:
+            records = list(self._records)[max(0, len(self._records) - (self.finished - since)):]
+        return [record for record in records if trace is None or record['trace'] == trace]
+
+TRACER = Tracer()
+
+def span(name, **attributes):
+    return TRACER.span(name, **attributes)
+
+def annotate(**attributes):
+    TRACER.annotate(**attributes)
+
+def count(**amounts):
+    TRACER.count(**amounts)
+
+def traced(name):
+    """Decorator timing every call of a function as a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def summarize(records):
+    """
+    Aggregate spans by name.
+    :return: {name: {'calls', 'total', 'mean', 'max', and the sums of SUMMED_ATTRIBUTES}}, in order of first appearance
+    """
+    stages = defaultdict(lambda: {'calls': 0, 'total': 0.0, 'max': 0.0})
+    for record in records:
+        stage = stages[record['name']]
+        stage['calls'] += 1
+        stage['total'] += record['duration']
+        stage['max'] = max(stage['max'], record['duration'])
+        for key in SUMMED_ATTRIBUTES:
+            if isinstance(record.get(key), (int, float)):
+                stage[key] = stage.get(key, 0) + record[key]
+    for stage in stages.values():
+        stage['mean'] = round(stage['total'] / stage['calls'], 6)
+        stage['total'] = round(stage['total'], 6)
+    return dict(stages)
+
+def format_table(records):
+    """A plain text table of the spans' summary, one row per span name"""
+
+    stages = summarize(records)
+    if not stages:
+        return 'No stages recorded.\n'
+    width = max(len('stage'), *(len(name) for name in stages))
+    lines = [f'{"stage":<{width}} {"calls":>5} {"total s":>8} {"mean s":>8} {"max s":>8} {"tokens":>8} {"cache":>6} {"MB read":>8}']
+    for name, stage in stages.items():
+        tokens = stage.get('prompt_tokens', 0) + stage.get('completion_tokens', 0)
+        lookups = stage.get('cache_hits', 0) + stage.get('cache_misses', 0)
+        hit_rate = f'{stage.get("cache_hits", 0) / lookups:.0%}' if lookups else '-'
+        megabytes = f'{stage["bytes"] / 1e6:.2f}' if 'bytes' in stage else '-'
+        lines.append(
+            f'{name:<{width}} {stage["calls"]:>5} {stage["total"]:>8.3f} {stage["mean"]:>8.3f} {stage["max"]:>8.3f} '
+            f'{tokens or "-":>8} {hit_rate:>6} {megabytes:>8}'
+        )
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def profiled(name, profiler=None):
+    """
+    Profile a block of code with 'cprofile' or 'pyinstrument' (if installed), or not at all with None.
+    cProfile stats are written to PROFILE_DIR/<name>-<timestamp>.prof and the top functions logged;
+    pyinstrument writes an HTML report there instead.
+    """
+    if profiler is None:
+        yield
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = PROFILE_DIR / f'{name}-{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logging.error('pyinstrument is not installed; running without a profiler')
+            yield
+            return
+        session = Profiler()
+        session.start()
+        try:
+            yield
+        finally:
+            session.stop()
+            stem.with_suffix('.html').write_text(session.output_html())
+            logging.info(f'Profile of {name} written to {stem.with_suffix(".html")}')
+        return
+
+    import cProfile
+    session = cProfile.Profile()
+    session.enable()
+    try:
+        yield
+    finally:
+        session.disable()
+        session.dump_stats(stem.with_suffix('.prof'))
+        report = io.StringIO()
+        pstats.Stats(session, stream=report).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        logging.info(f'Profile of {name} written to {stem.with_suffix(".prof")}\n{report.getvalue()}')